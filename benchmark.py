@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+
+from minitopsim.benchmark import (NODES, THRESHOLD, run_benchmarks,
+                                  write_results, read_results,
+                                  append_history, find_regressions,
+                                  format_results)
+from minitopsim.timing import machine_info
+
+
+parser = argparse.ArgumentParser(
+    description='Benchmarks the kernels of miniTopSim and compares the '
+                'times against a baseline.')
+parser.add_argument('-n', '--nodes', type=int, nargs='+', default=NODES,
+                    help='numbers of points (default: %(default)s)')
+parser.add_argument('-k', '--kernels', nargs='+', default=None,
+                    help='benchmarks to run (default: all)')
+parser.add_argument('-c', '--configs', nargs='+', default=None,
+                    help='configurations of advance and minitopsim '
+                         '(default: all)')
+parser.add_argument('-t', '--min-time', type=float, default=0.2,
+                    help='minimum time of a measurement in s')
+parser.add_argument('-o', '--output', default='benchmark.json',
+                    help='JSON file of the results')
+parser.add_argument('--history', default='benchmark_history.jsonl',
+                    help='file the results are appended to')
+parser.add_argument('-b', '--baseline', default=None,
+                    help='JSON file of the baseline, written from the '
+                         'results if it does not exist')
+parser.add_argument('--update-baseline', action='store_true',
+                    help='replace the baseline by the results')
+parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                    help='relative slowdown counted as regression')
+args = parser.parse_args()
+
+results = run_benchmarks(tuple(args.nodes), args.kernels, args.configs,
+                         args.min_time)
+write_results(args.output, results)
+append_history(args.history, results)
+
+if args.baseline is None:
+    sys.exit(0)
+if args.update_baseline or not os.path.isfile(args.baseline):
+    write_results(args.baseline, results)
+    print(f'Baseline written to {args.baseline}')
+    sys.exit(0)
+
+baseline = read_results(args.baseline)
+if baseline['machine'] != machine_info():
+    print(f'Warning: the baseline was measured on another machine or with '
+          f'other versions: {baseline["machine"]}')
+regressions = find_regressions(results, baseline['results'], args.threshold)
+if regressions:
+    print(f'{len(regressions)} regressions against {args.baseline}:')
+    print(format_results(regressions), end='')
+    sys.exit(1)
+print(f'No regressions against {args.baseline}')
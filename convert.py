@@ -0,0 +1,6 @@
+import sys
+
+from minitopsim.io_surface import convert_trajectory
+
+
+convert_trajectory(sys.argv[1], sys.argv[2])
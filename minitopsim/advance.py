@@ -2,19 +2,53 @@
 Module containing functions for moving the surface over time.
 """
 
+import contextvars
+
 import numpy as np
-from scipy.constants import elementary_charge
-from minitopsim.surface import Surface
+from minitopsim.surface import Surface, Shadow_Error
 from . import parameters as par
 from . import sputtering as sput
+from . import redeposition as redep
 from . import beam
+from . import timing
+
+# Butcher tableaus (a, b, b_embedded, order of b_embedded) of the time
+# integrators. a holds the rows of the lower triangle, b_embedded gives a
+# lower order solution from the same stages for the error estimate.
+_TABLEAUS = {
+    'Euler': ((), (1.,), None, None),
+    'Heun': (((1.,),),
+             (1/2, 1/2), (1., 0.), 1),
+    'SSPRK3': (((1.,), (1/4, 1/4)),
+               (1/6, 1/6, 2/3), (1/2, 1/2, 0.), 2),
+    'RK4': (((1/2,), (0., 1/2), (0., 0., 1.)),
+            (1/6, 1/3, 1/3, 1/6), (0., 1., 0., 0.), 2),
+}
+
+# time step proposed by the error estimate of the last step (one per
+# context, see parameters.activate())
+_error_timestep = contextvars.ContextVar('error_timestep', default=np.inf)
+
+# segments shorter than this part of the point distance (DELTA_X, or
+# SEGMENT_LENGTH_MIN with REMESH) do not limit the CFL time step
+CFL_MIN_LENGTH = 0.1
+
 
 def advance(surface, dtime):
     """
     Calculates the new surface after a time step.
 
-    If INTERPLATION is set, the function recursively calls itself,
-    with half dtime, until the new_surface has no shadows.
+    The points are moved with the integrator TIME_INTEGRATOR (see
+    _TABLEAUS) and delooped. If REMESH is set and INTERPOLATION is
+    not, points are then inserted and removed (see Surface.remesh()).
+    If INTERPOLATION is set, dtime is reduced until the
+    new_surface has no shadows: halved, or multiplied by
+    TIME_STEP_SHRINK if ADAPTIVE_TIME_STEP is set. The velocities at
+    the surface are only calculated once for all tries.
+    If ADAPTIVE_TIME_STEP is set, dtime is also limited by the CFL
+    condition (see cfl_timestep()) and, for integrators with an error
+    estimate, reduced until the estimated error is below
+    INTEGRATOR_TOLERANCE.
 
     Args:
         surface (Surface): The surface to be moved.
@@ -23,30 +57,181 @@ def advance(surface, dtime):
     Returns:
         new_surface (Surface): The new, moved surface.
         dtime (float): The actually used time step size
-                       (can differ from arg when using interpolation).
-    """
-    x = np.copy(surface.x)
-    y = np.copy(surface.y)
+                       (can differ from arg when using interpolation
+                       or adaptive time steps).
 
+    Raises:
+        Shadow_Error: The new surface still has shadows at the minimum
+            time step TIME_STEP_MIN.
+    """
     velocity = get_velocities(surface)
 
-    x += velocity[0] * dtime
-    y += velocity[1] * dtime
+    order = _TABLEAUS[par.TIME_INTEGRATOR][3]
+    control_error = par.ADAPTIVE_TIME_STEP and order is not None
+    if par.ADAPTIVE_TIME_STEP:
+        dtime = min(dtime, max(cfl_timestep(surface, velocity, dtime),
+                               par.TIME_STEP_MIN))
+        shrink = par.TIME_STEP_SHRINK
+    else:
+        shrink = 0.5
+
+    tries = 0
+    while True:
+        tries += 1
+        with timing.stage('integrate'):
+            x, y, error = integrate(surface, velocity, dtime)
 
-    surface.x = np.copy(x)
-    surface.y = np.copy(y)
-    x, y = surface.deloop()
+        if (control_error and error > par.INTEGRATOR_TOLERANCE
+                and dtime > par.TIME_STEP_MIN):
+            factor = max(_error_factor(error, order), shrink)
+            dtime = max(dtime * factor, par.TIME_STEP_MIN)
+            continue
 
-    new_surface = Surface(x, y)
+        with timing.stage('deloop'):
+            x, y = Surface(x, y).deloop()
+        if par.REMESH and not par.INTERPOLATION:
+            with timing.stage('remesh'):
+                x, y = Surface(x, y).remesh(par.SEGMENT_LENGTH_MIN,
+                                            par.SEGMENT_LENGTH_MAX,
+                                            np.radians(par.REMESH_ANGLE))
 
-    if par.INTERPOLATION:
-        if new_surface.has_shadows():
-            return advance(surface, dtime/2)
-        else:
-            new_surface.interpolate(surface.x)
+        new_surface = Surface(x, y)
+
+        if not par.INTERPOLATION:
+            break
+        with timing.stage('shadows'):
+            shadows = new_surface.has_shadows()
+        if not shadows:
+            with timing.stage('interpolate'):
+                new_surface.interpolate(surface.x)
+            break
+        if dtime <= par.TIME_STEP_MIN:
+            msg = (f"Surface still has shadows at the minimum time step "
+                   f"{dtime}.")
+            raise Shadow_Error(msg)
+        dtime = max(dtime * shrink, par.TIME_STEP_MIN)
+
+    # number of integrations of the step (rejected by the error estimate
+    # or by shadows after interpolation, see stage()/count())
+    timing.count('advance tries', tries)
+    if control_error:
+        _error_timestep.set(dtime * _error_factor(error, order))
+    else:
+        _error_timestep.set(np.inf)
 
     return new_surface, dtime
 
+
+def integrate(surface, velocity, dtime, velocities=None):
+    """
+    Moves the points of the surface by one step of TIME_INTEGRATOR.
+
+    The stages are evaluated on the moved, but not delooped points.
+
+    Args:
+        surface (Surface): The surface to be moved.
+        velocity (array-like (2xn)): velocities at the surface points.
+        dtime (float): The time step size.
+        velocities (callable): Calculates the velocities of the stages
+            from a Surface (default: get_velocities()).
+
+    Returns:
+        x (array(float)): The moved x-coordinates.
+        y (array(float)): The moved y-coordinates.
+        error (float): Estimated error (nm) of the step, the largest
+            distance between the points moved with b and b_embedded
+            (None for integrators without error estimate).
+    """
+    a, b, b_embedded, _ = _TABLEAUS[par.TIME_INTEGRATOR]
+    if velocities is None:
+        velocities = get_velocities
+
+    stages = [velocity]
+    for a_row in a:
+        dx = sum(a_ij * k[0] for a_ij, k in zip(a_row, stages)) * dtime
+        dy = sum(a_ij * k[1] for a_ij, k in zip(a_row, stages)) * dtime
+        stages.append(velocities(Surface(surface.x + dx, surface.y + dy)))
+
+    x = surface.x + sum(b_i * k[0] for b_i, k in zip(b, stages)) * dtime
+    y = surface.y + sum(b_i * k[1] for b_i, k in zip(b, stages)) * dtime
+
+    if b_embedded is None:
+        return x, y, None
+
+    db = [b_i - b_hat for b_i, b_hat in zip(b, b_embedded)]
+    error_x = sum(db_i * k[0] for db_i, k in zip(db, stages)) * dtime
+    error_y = sum(db_i * k[1] for db_i, k in zip(db, stages)) * dtime
+
+    return x, y, np.max(np.hypot(error_x, error_y))
+
+
+def _error_factor(error, order):
+    """Factor for the time step to reach INTEGRATOR_TOLERANCE."""
+    if error == 0:
+        return np.inf
+    return 0.9 * (par.INTEGRATOR_TOLERANCE / error)**(1 / (order + 1))
+
+
+def cfl_timestep(surface, velocity, dtime=0.):
+    """
+    Calculates the largest time step allowed by the CFL condition.
+
+    The end points of a segment may not move relative to each other by
+    more than CFL_NUMBER times the segment length, otherwise segments
+    can rotate too far in one step. Regions moving as a whole, like flat
+    parts of the surface, thus do not limit the time step. Neither do
+    segments collapsing within dtime (at their current rate of
+    shrinking) and segments shorter than CFL_MIN_LENGTH times the point
+    distance: there, loops form, which are removed by deloop(). Limiting
+    the time step by them would make it tend to zero there.
+
+    Args:
+        surface (Surface): The surface to be moved.
+        velocity (array-like (2xn)): velocities of the points.
+        dtime (float): The proposed time step size.
+
+    Returns:
+        float: The time step size (inf if no segment is deformed).
+    """
+    dx = np.diff(surface.x)
+    dy = np.diff(surface.y)
+    dvx = np.diff(velocity[0])
+    dvy = np.diff(velocity[1])
+    segment_lengths = np.hypot(dx, dy)
+    relative_speed = np.hypot(dvx, dvy)
+
+    # the length of a segment shrinks at -(dx*dvx + dy*dvy) / length
+    collapsing = -(dx * dvx + dy * dvy) * dtime >= segment_lengths**2
+
+    min_length = par.SEGMENT_LENGTH_MIN if par.REMESH else par.DELTA_X
+    deformed = ((relative_speed > 0) & ~collapsing &
+                (segment_lengths >= CFL_MIN_LENGTH * min_length))
+    if not np.any(deformed):
+        return np.inf
+
+    return par.CFL_NUMBER * np.min(segment_lengths[deformed] /
+                                   relative_speed[deformed])
+
+
+def next_timestep(dt):
+    """
+    Proposes the time step size following a step of size dt.
+
+    Args:
+        dt (float): The size of the previous time step.
+
+    Returns:
+        float: TIME_STEP, or if ADAPTIVE_TIME_STEP is set, dt increased by
+            TIME_STEP_GROWTH but at most TIME_STEP_MAX and at most the
+            time step proposed by the error estimate of the last step.
+    """
+    if par.ADAPTIVE_TIME_STEP:
+        return min(dt * par.TIME_STEP_GROWTH, par.TIME_STEP_MAX,
+                   _error_timestep.get())
+
+    return par.TIME_STEP
+
+
 def timestep(dt, time, tend):
     """
     Calculates the time step at a given time.
@@ -67,6 +252,7 @@ def timestep(dt, time, tend):
 
     return dt
 
+
 def get_velocities(surface):
     """ Calculates the velocities used for advancing the surface.
 
@@ -79,29 +265,39 @@ def get_velocities(surface):
     Returns:
         array-like (2xn): velocities in x- & y-direction (row 1/2)
     """
-    normal_vec = surface.normal_vector()
+    with timing.stage('velocities'):
+        return _get_velocities(surface)
+
+
+def _get_velocities(surface):
+    """Calculates the velocities in the stage 'velocities'."""
+    with timing.stage('normal_vector'):
+        normal_vec = surface.normal_vector()
     
     if par.ETCHING:
         v_normal = np.full_like(surface.x, par.ETCH_RATE) #normal velocity [nm/s]
     else:
         cos_theta = -normal_vec[1]
-        Y_s = sput.get_sputter_yield(cos_theta)
-        Y_s = np.nan_to_num(Y_s)    #prevents wierd behavoir from loops
-        F_beam = par.BEAM_CURRENT_DENSITY / elementary_charge
+        with timing.stage('sputter_yield'):
+            Y_s = sput.get_sputter_yield(cos_theta)
+        with timing.stage('beam_flux'):
+            F_beam = beam.get_flux(surface.x)
         F_sput = F_beam * Y_s * cos_theta
         
         v_normal = F_sput/ par.DENSITY                          #[cm/s]
         
         if par.REDEP:
-            F_redep = np.matmul(surface.view_factor(), F_sput)
+            with timing.stage('redeposition'):
+                F_redep = redep.get_redep_flux(surface, F_sput)
             v_normal_redep = F_redep/ par.DENSITY               #[cm/s]      
             v_normal -= v_normal_redep                          #[cm/s]       
         
-    v_normal *= 1e7  #[nm/s]   
+        v_normal *= 1e7  #[nm/s]   
                                    
     if not par.INTERPOLATION: 
-        if surface.has_shadows():
-            msk = surface.get_shadows()
-            v_normal[msk] = 0
+        with timing.stage('shadows'):
+            if surface.has_shadows():
+                msk = surface.get_shadows()
+                v_normal[msk] = 0
 
     return normal_vec * v_normal
\ No newline at end of file
@@ -1,16 +1,29 @@
+import contextvars
+from types import SimpleNamespace
+
 import numpy as np
-from scipy.constants import e
-from scipy.special import erf
-from scipy.optimize import minimize_scalar
 import minitopsim.parameters as par
 
+# elementary charge [C], exact value of the SI (as scipy.constants.e);
+# scipy.special and scipy.optimize are imported where needed, importing
+# scipy takes longer than short simulations
+e = 1.602176634e-19
+
+# beam of the last init() call
 beam_obj = None
 
+# beam and flux cache of the current context (see parameters.activate())
+_beam = contextvars.ContextVar('beam', default=None)
+_flux_cache = contextvars.ContextVar('flux_cache', default=None)
+
 def init():
     """Initialize the beam object based on user-defined parameters.
 
     This function initializes a global beam object based on the BEAM_TYPE parameter.
     It supports three types of beams: 'constant', 'Gaussian', and 'error function'.
+    The beam is also set as the beam of the current context (see get_beam()),
+    non-constant beams get a FluxCache with BEAM_FLUX_TOLERANCE. If
+    BEAM_TABLE_POINTS is set, they are tabulated from XMIN to XMAX.
     """
     global beam_obj
     if(par.BEAM_TYPE == 'constant'):
@@ -21,20 +34,144 @@ def init():
     elif(par.BEAM_TYPE == 'error function'):
         beam_obj = erf_beam(par.BEAM_CURRENT, par.SCAN_WIDTH, par.BEAM_CENTER,
                             par.FWHM, par.ERF_BEAM_WIDTH)
+    if par.BEAM_TABLE_POINTS > 0:
+        beam_obj = beam_obj.tabulate(par.XMIN, par.XMAX,
+                                     par.BEAM_TABLE_POINTS)
+    _beam.set(beam_obj)
+    if isinstance(beam_obj, constant_beam):
+        _flux_cache.set(None)
+    else:
+        _flux_cache.set(FluxCache(beam_obj, par.BEAM_FLUX_TOLERANCE))
+
+def get_beam():
+    """Return the beam initialized in the current context (or None)."""
+    return _beam.get()
+
+def get_flux_cache():
+    """Return the flux cache of the current context (or None)."""
+    return _flux_cache.get()
+
+def get_flux(x):
+    """Calculate the beam flux density at the points of a surface.
+
+    Uses the beam (and flux cache) of the current context. If init() was
+    not called, the beam is constant with BEAM_CURRENT_DENSITY.
+
+    Parameters:
+        x (ndarray): The x-coordinates of the points in nm.
+
+    Returns:
+        float, ndarray: The beam flux density in atoms/(cm^2 s), a float
+        for constant beams.
+    """
+    flux_cache = _flux_cache.get()
+    if flux_cache is not None:
+        return flux_cache.flux(x)
+    beam_obj = _beam.get()
+    if beam_obj is None:
+        return par.BEAM_CURRENT_DENSITY / e
+    return beam_obj(x)
+
+class FluxCache:
+    """
+    Cache for the beam flux density at the points of a surface.
+
+    The flux of a point is reused as long as its x-coordinate moved by
+    at most the tolerance since its calculation. If the number of points
+    changes, the flux of all points is calculated.
+
+    Attributes:
+        beam (beam): The beam profile.
+        tolerance (float): Displacement in x (nm) up to which the cached
+            flux is reused.
+        x (array(float)): x-coordinates at the last calculation.
+        values (array(float)): The cached flux densities.
+        hits (int): Number of calls returning the cached flux as is.
+        misses (int): Number of calls calculating the flux of all points.
+        updates (int): Number of calls recalculating some points.
+        updated_nodes (int): Total number of recalculated points.
+    """
+    def __init__(self, beam, tolerance=0.):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+            beam (beam): The beam profile.
+            tolerance (float): Displacement in x (nm) up to which the
+                cached flux is reused.
+        """
+        self.beam = beam
+        self.tolerance = tolerance
+        self.x = None
+        self.values = None
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.updated_nodes = 0
+
+    def __str__(self):
+        return (f'{self.hits} hits, {self.misses} misses, '
+                f'{self.updates} updates ({self.updated_nodes} nodes)')
+
+    def flux(self, x):
+        """
+        Returns the flux density at x, reusing cached values if possible.
+
+        Parameters:
+            x (ndarray): The x-coordinates of the points in nm.
+
+        Returns:
+            ndarray: The flux densities in atoms/(cm^2 s). The array is
+            owned by the cache and must not be modified.
+        """
+        if self.values is None or self.values.size != x.size:
+            self.x = np.array(x, dtype=float)
+            self.values = np.broadcast_to(self.beam(self.x),
+                                          self.x.shape).copy()
+            self.misses += 1
+            return self.values
+
+        moved = np.abs(x - self.x) > self.tolerance
+        if not np.any(moved):
+            self.hits += 1
+            return self.values
+
+        self.x[moved] = x[moved]
+        self.values[moved] = self.beam(self.x[moved])
+        self.updates += 1
+        self.updated_nodes += np.count_nonzero(moved)
+        return self.values
 
 class beam():
     def find_maxima(self, x0):
-        """Find the maximum value of the beam function.
+        """Find the maximum value of the beam function numerically.
+
+        Used for beams without an analytic maximum.
 
         Parameters:
             x0 (float): Initial guess for the maximization problem.
         Returns:
-            object: The result of the maximization problem.
+            object: The result of the maximization problem, the position
+            in x and the maximum value in fun.
         """
-        res = minimize_scalar(lambda x: -self(x0))
+        from scipy.optimize import minimize_scalar
+
+        res = minimize_scalar(lambda x: -self(x), bracket=(x0 - 1., x0 + 1.))
         res.fun = res.fun * (-1)
         return res
-    
+
+    def tabulate(self, xmin, xmax, points):
+        """Sample the beam onto a lookup table.
+
+        Parameters:
+            xmin (float): The lower end of the table in nm.
+            xmax (float): The upper end of the table in nm.
+            points (int): The number of points of the table.
+        Returns:
+            tabulated_beam: The beam evaluated by linear interpolation.
+        """
+        return tabulated_beam(self, xmin, xmax, points)
+
 class constant_beam(beam):
 
     def __init__(self, beam_current):
@@ -58,11 +195,27 @@ class constant_beam(beam):
         """
         return self.beam_current / e
 
+    def find_maxima(self, x0=0.):
+        """Return the maximum value of the beam (equal everywhere).
+
+        Parameters:
+            x0 (float): Position returned as the maximum.
+        Returns:
+            SimpleNamespace: The position in x and the maximum value in fun.
+        """
+        return SimpleNamespace(x=x0, fun=self.beam_current / e)
+
+    def tabulate(self, xmin, xmax, points):
+        """Return the beam itself, a constant needs no table."""
+        return self
+
 class gaussian_beam(beam):
     
     def __init__(self, beam_current, scan_width, beam_center, FWHM):
         """Initialize an Gaussian beam.
 
+        The constants of the profile are calculated once here.
+
         Parameters:
             beam_current (float): The current of the beam.
             scan_width (float): The scanwidth of the beam in z-direction.
@@ -73,6 +226,12 @@ class gaussian_beam(beam):
         self.scan_width = scan_width
         self.beam_center = beam_center
         self.FWHM = FWHM
+
+        sigma = (self.FWHM / np.sqrt(8*np.log(2)))
+        # flux at the center, 1e14 from nm to cm
+        self._amplitude = (self.beam_current * 1e14 /
+                           (e*np.sqrt(2*np.pi)*sigma*self.scan_width))
+        self._exponent = -1 / (2*sigma**2)
     
     def __call__(self, x):
         """Calculate the beam value at a given point for a Gaussian beam.
@@ -85,16 +244,26 @@ class gaussian_beam(beam):
             float: The beam flux density value at the given point(s)
             in atoms/(cm^2 s).
         """
-        sigma = (self.FWHM / np.sqrt(8*np.log(2)))
-        const = (self.beam_current / (e*np.sqrt(2*np.pi)*sigma*self.scan_width))
-        const1 = 2*sigma**2
-        return const*np.exp(-(x - self.beam_center)**2/const1) * 1e14 #from nm to cm 
+        dx = x - self.beam_center
+        return self._amplitude * np.exp(self._exponent * dx * dx)
+
+    def find_maxima(self, x0=0.):
+        """Return the maximum of the beam, which is at the beam center.
+
+        Parameters:
+            x0 (float): Not needed, the maximum is known analytically.
+        Returns:
+            SimpleNamespace: The position in x and the maximum value in fun.
+        """
+        return SimpleNamespace(x=self.beam_center, fun=self._amplitude)
 
 class erf_beam(beam):
 
     def __init__(self, beam_current, scan_width, beam_center, FWHM, erf_beam_width):
         """Initialize an error function beam.
 
+        The constants of the profile are calculated once here.
+
         Parameters:
             beam_current (float): The current of the beam.
             scan_width (float): The scanwidth of the beam in z-direction.
@@ -103,12 +272,23 @@ class erf_beam(beam):
             erf_beam_width (float): The scan width of the error function beam
             in x-direction.
         """
+        from scipy.special import erf
+
         self.beam_current = beam_current
         self.scan_width = scan_width
         self.beam_center = beam_center
         self.FWHM = FWHM
         self.erf_beam_width = erf_beam_width
 
+        self._erf = erf
+        self._x1 = self.beam_center - self.erf_beam_width/2
+        self._x2 = self.beam_center + self.erf_beam_width/2
+        sigma = (self.FWHM / np.sqrt(8*np.log(2)))
+        # 1e14 from nm to cm
+        self._amplitude = (self.beam_current * 1e14 /
+                           (e*2*self.scan_width*self.erf_beam_width))
+        self._scale = 1 / (np.sqrt(2)*sigma)
+
     def __call__(self, x): 
         """Calculate the beam value at a given point for an error function beam.
 
@@ -120,9 +300,70 @@ class erf_beam(beam):
             float: The beam flux density value at the given point(s)
             in atoms/(cm^2 s).
         """
-        x1 = self.beam_center - self.erf_beam_width/2
-        x2 = self.beam_center + self.erf_beam_width/2
-        sigma = (self.FWHM / np.sqrt(8*np.log(2)))
-        const = (self.beam_current / (e*2*self.scan_width*self.erf_beam_width))
-        const1 = np.sqrt(2)*sigma
-        return const*(erf(-(x-x2)/const1) - erf(-(x-x1)/const1)) * 1e14 #from nm to cm
\ No newline at end of file
+        return self._amplitude * (self._erf((self._x2 - x) * self._scale) -
+                                  self._erf((self._x1 - x) * self._scale))
+
+    def find_maxima(self, x0=0.):
+        """Return the maximum of the beam, which is at the beam center.
+
+        The profile is symmetric to the center and falls off from there.
+
+        Parameters:
+            x0 (float): Not needed, the maximum is known analytically.
+        Returns:
+            SimpleNamespace: The position in x and the maximum value in fun.
+        """
+        return SimpleNamespace(x=self.beam_center,
+                               fun=self(self.beam_center))
+
+class tabulated_beam(beam):
+
+    def __init__(self, profile, xmin, xmax, points):
+        """Initialize a beam evaluated from a lookup table.
+
+        The profile is sampled at equidistant points from xmin to xmax and
+        linearly interpolated in between. Outside of the table, the profile
+        itself is evaluated.
+
+        Parameters:
+            profile (beam): The beam to tabulate.
+            xmin (float): The lower end of the table in nm.
+            xmax (float): The upper end of the table in nm.
+            points (int): The number of points of the table.
+        """
+        self.profile = profile
+        self.xmin = xmin
+        self.xmax = xmax
+        self.x = np.linspace(xmin, xmax, points)
+        self.values = np.broadcast_to(profile(self.x), self.x.shape).copy()
+        # the table is equidistant, so the interval of a point is found
+        # directly instead of by a search as in np.interp
+        self._inverse_dx = (points - 1) / (xmax - xmin)
+        self._slopes = np.append(np.diff(self.values), 0.)
+
+    def __call__(self, x):
+        """Calculate the beam value by interpolating the table.
+
+        Parameters:
+            x (float, ndarray): The point(s) in nm at which to calculate
+            the beam value.
+
+        Returns:
+            float: The beam flux density value at the given point(s)
+            in atoms/(cm^2 s).
+        """
+        x = np.asarray(x, dtype=float)
+        position = (x - self.xmin) * self._inverse_dx
+        index = np.clip(position.astype(np.intp), 0, self.x.size - 1)
+        position = position - index
+        flux = self.values[index] + position * self._slopes[index]
+        outside = (x < self.xmin) | (x > self.xmax)
+        if np.any(outside):
+            if flux.ndim == 0:
+                return self.profile(x)
+            flux[outside] = self.profile(x[outside])
+        return flux
+
+    def find_maxima(self, x0=0.):
+        """Return the maximum of the tabulated profile."""
+        return self.profile.find_maxima(x0)
@@ -0,0 +1,340 @@
+"""
+Module for benchmarking the kernels of miniTopSim.
+
+The benchmarks time the surface kernels (normal_vector, get_shadows,
+deloop, view_factor), the output (write_surface, read_surface), one
+time step (advance) and a full simulation (minitopsim) for numbers of
+points from 100 to 100000. advance and minitopsim are run for every
+configuration of CONFIGS. Every benchmark runs in its own context with
+the default parameters (see parameters.activate()), so the parameters of
+the calling process are not used.
+
+Results are stored as JSON with the machine (see timing.machine_info()),
+appended to a history file with one run per line, and compared against
+a baseline to find regressions.
+
+Functions:
+    run_benchmarks(): Runs the benchmarks.
+    write_results(): Writes results as JSON file.
+    read_results(): Reads results from a JSON file.
+    append_history(): Appends results to a history file.
+    find_regressions(): Compares results against a baseline.
+    format_results(): Formats results as table.
+"""
+import contextvars
+import json
+import os
+import tempfile
+import timeit
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import parameters as par
+from . import advance as adv
+from . import beam
+from . import redeposition as redep
+from . import timing
+from minitopsim.io_surface import read_surface, write_surface
+from minitopsim.simulation import Simulation
+from minitopsim.surface import Surface
+
+# numbers of points of the surfaces
+NODES = (100, 1000, 10000, 100000)
+
+# parameters of the configurations of advance and minitopsim
+CONFIGS = {
+    'etching': dict(ETCHING=True),
+    'sputtering': dict(ETCHING=False),
+    'interpolation': dict(ETCHING=False, INTERPOLATION=True),
+    'redep': dict(ETCHING=False, REDEP=True),
+}
+
+# benchmarks growing with the number of points squared are only run up
+# to this number of points (a view factor of 10000 points takes seconds)
+MAX_NODES_QUADRATIC = 10000
+
+# simulated time of the minitopsim benchmark (TIME_STEP = 1 s)
+TOTAL_TIME = 5.
+
+# runs of a benchmark, the fastest counts
+REPEAT = 3
+
+# a benchmark is slower than its baseline above this relative difference
+THRESHOLD = 0.25
+
+
+def run_benchmarks(nodes=NODES, kernels=None, configs=None, min_time=0.2,
+                   repeat=REPEAT, log=None):
+    """
+    Runs the benchmarks.
+
+    A benchmark is called as often as needed to take at least min_time
+    (doubling the calls), this is repeated repeat times and the
+    fastest time per call is taken.
+
+    Args:
+        nodes (tuple(int)): The numbers of points.
+        kernels (list(str)): The benchmarks to run (default: all, see
+            _BENCHMARKS).
+        configs (list(str)): The configurations of advance and
+            minitopsim (default: all of CONFIGS).
+        min_time (float): The minimum time of a measurement [s].
+        repeat (int): The number of measurements.
+        log (file): Where the results are printed to while running
+            (None: sys.stdout).
+
+    Returns:
+        list(dict): The results with the keys benchmark, config (None
+            for benchmarks without configuration), nodes and time (the
+            time of one call [s]).
+
+    Raises:
+        KeyError: An unknown benchmark or configuration.
+    """
+    kernels = list(_BENCHMARKS) if kernels is None else kernels
+    configs = list(CONFIGS) if configs is None else configs
+    for name in kernels:
+        if name not in _BENCHMARKS:
+            raise KeyError(f'Unknown benchmark {name}!')
+    for name in configs:
+        if name not in CONFIGS:
+            raise KeyError(f'Unknown configuration {name}!')
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in kernels:
+            setup, uses_config, quadratic = _BENCHMARKS[name]
+            for config_name in (configs if uses_config else [None]):
+                values = CONFIGS[config_name] if config_name else dict()
+                max_nodes = (MAX_NODES_QUADRATIC
+                             if quadratic or values.get('REDEP') else None)
+                for n in nodes:
+                    if max_nodes is not None and n > max_nodes:
+                        continue
+                    result = dict(benchmark=name, config=config_name,
+                                  nodes=n)
+                    result['time'] = _measure(setup, n, values, directory,
+                                              min_time, repeat)
+                    print(_format_row(result), file=log)
+                    results.append(result)
+    return results
+
+
+def write_results(filename, results):
+    """
+    Writes results with the machine and the date as JSON file.
+
+    Args:
+        filename (str): The JSON file.
+        results (list(dict)): The results (see run_benchmarks()).
+    """
+    with open(filename, 'w') as file:
+        json.dump(_record(results), file, indent=2)
+        file.write('\n')
+
+
+def read_results(filename):
+    """
+    Reads results from a JSON file.
+
+    Args:
+        filename (str): The JSON file (see write_results()).
+
+    Returns:
+        dict: The results (under 'results'), the machine and the date.
+    """
+    with open(filename) as file:
+        return json.load(file)
+
+
+def append_history(filename, results):
+    """
+    Appends results as one line of JSON to a history file.
+
+    Args:
+        filename (str): The history file.
+        results (list(dict)): The results (see run_benchmarks()).
+    """
+    with open(filename, 'a') as file:
+        file.write(json.dumps(_record(results)) + '\n')
+
+
+def find_regressions(results, baseline, threshold=THRESHOLD):
+    """
+    Compares results against a baseline.
+
+    Args:
+        results (list(dict)): The results (see run_benchmarks()).
+        baseline (list(dict)): The results of the baseline.
+        threshold (float): The relative difference in time from which a
+            benchmark is slower.
+
+    Returns:
+        list(dict): The results slower than their baseline, with the
+            time of the baseline (baseline) and the ratio of the times
+            (ratio) added. Results without baseline are left out.
+    """
+    baseline_times = {_key(result): result['time'] for result in baseline}
+    regressions = []
+    for result in results:
+        baseline_time = baseline_times.get(_key(result))
+        if baseline_time is None:
+            continue
+        ratio = result['time'] / baseline_time
+        if ratio > 1 + threshold:
+            regressions.append(dict(result, baseline=baseline_time,
+                                    ratio=ratio))
+    return regressions
+
+
+def format_results(results):
+    """Formats results as table with one line per benchmark."""
+    lines = [_format_row(dict(benchmark='benchmark', config='config',
+                              nodes='nodes', time='time [s]'))]
+    lines += [_format_row(result) for result in results]
+    return '\n'.join(lines) + '\n'
+
+
+def _format_row(result):
+    """Formats a result as line of the table."""
+    time = result['time']
+    if isinstance(time, float):
+        time = f'{time:.4g}'
+    line = (f'{result["benchmark"]:<14}  {result["config"] or "-":<13}  '
+            f'{result["nodes"]:>7}  {time:>10}')
+    if 'ratio' in result:
+        line += f'  (baseline {result["baseline"]:.4g}, ' \
+                f'x{result["ratio"]:.2f})'
+    return line
+
+
+def _key(result):
+    """The benchmark, configuration and number of points of a result."""
+    return result['benchmark'], result['config'], result['nodes']
+
+
+def _record(results):
+    """Adds the machine and the date to results."""
+    return {
+        'machine': timing.machine_info(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'results': results,
+    }
+
+
+def _measure(setup, n, values, directory, min_time, repeat):
+    """Times a benchmark in a new context with the given parameters."""
+    def run():
+        par.activate(par.defaults().replace(
+            TOTAL_TIME=TOTAL_TIME, PLOT_SURFACE=False, **values))
+        beam.init()
+        redep.init()
+        timer = timeit.Timer(setup(n, directory))
+        number = _calls(timer, min_time)
+        return min(timer.repeat(repeat, number)) / number
+
+    return contextvars.Context().run(run)
+
+
+def _calls(timer, min_time):
+    """Number of calls of the timer taking at least min_time."""
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            return number
+        number *= 2
+
+
+def _loop_surface(n):
+    """
+    Surface of n points with loops and shadows.
+
+    A prolate cycloid with 20 loops from -50 to 50, about half of its
+    points are shadowed or in loops.
+    """
+    t = np.linspace(0., 1., n)
+    k = 2 * np.pi * 20
+    r = 1.5 * 100 / k
+    return Surface(100 * t - 50 + r * np.sin(k * t), r * np.cos(k * t))
+
+
+def _cosine_surface(n):
+    """The initial cosine surface (see init_surface()) with n points."""
+    x = np.linspace(par.XMIN, par.XMAX, n)
+    y = np.zeros_like(x)
+    mask = (par.FUN_XMIN < x) & (x < par.FUN_XMAX)
+    y[mask] = par.FUN_PEAK_TO_PEAK/2 * \
+        (1 + np.cos(2 * np.pi * x[mask] / (par.FUN_XMAX - par.FUN_XMIN)))
+    return Surface(x, y)
+
+
+def _normal_vector(n, directory):
+    surface = _cosine_surface(n)
+    return surface.normal_vector
+
+
+def _get_shadows(n, directory):
+    surface = _loop_surface(n)
+    return surface.get_shadows
+
+
+def _deloop(n, directory):
+    surface = _loop_surface(n)
+    return surface.deloop
+
+
+def _view_factor(n, directory):
+    # in blocks of rows as for the redeposition flux
+    surface = _cosine_surface(n)
+    blocks = redep._row_blocks(n, n)
+
+    def view_factor():
+        for rows in blocks:
+            surface.view_factor(rows)
+    return view_factor
+
+
+def _write_surface(n, directory):
+    surface = _cosine_surface(n)
+    filename = os.path.join(directory, f'write_{n}.srf')
+    return lambda: write_surface(surface, 0, filename)
+
+
+def _read_surface(n, directory):
+    filename = os.path.join(directory, f'read_{n}.srf')
+    write_surface(_cosine_surface(n), 0, filename)
+
+    def read():
+        with open(filename) as file:
+            return read_surface(file)
+    return read
+
+
+def _advance(n, directory):
+    surface = _cosine_surface(n)
+    return lambda: adv.advance(surface, par.TIME_STEP)
+
+
+def _minitopsim(n, directory):
+    config = par.current().replace(DELTA_X=(par.XMAX - par.XMIN) / (n - 1))
+    filename = os.path.join(directory, f'run_{n}')
+
+    def run():
+        with open(os.devnull, 'w') as log:
+            Simulation(config, filename, log=log).run()
+    return run
+
+
+# setup function returning the function to time, whether the benchmark
+# runs for every configuration, and whether it grows with n**2
+_BENCHMARKS = {
+    'normal_vector': (_normal_vector, False, False),
+    'get_shadows': (_get_shadows, False, False),
+    'deloop': (_deloop, False, False),
+    'view_factor': (_view_factor, False, True),
+    'write_surface': (_write_surface, False, False),
+    'read_surface': (_read_surface, False, False),
+    'advance': (_advance, True, False),
+    'minitopsim': (_minitopsim, True, False),
+}
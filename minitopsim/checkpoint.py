@@ -0,0 +1,92 @@
+"""
+Module for saving and restoring the state of a simulation.
+
+A checkpoint holds everything needed to continue a run: the surface, the
+simulation time, the next time step, the output counters, the state of
+the time step control and a snapshot of all parameters. It is stored as
+a .npz file, which is written to a temporary file first and then renamed,
+so an interrupted write never destroys the previous checkpoint.
+
+Functions:
+    write_checkpoint(): Saves the state of a simulation.
+    read_checkpoint(): Restores parameters and state of a simulation.
+"""
+import ast
+import os
+
+import numpy as np
+
+from minitopsim.surface import Surface
+from . import parameters as par
+from . import advance as adv
+
+# parameters taken from the .cfg file instead of the checkpoint, so a
+# finished run can be continued
+_RESTART_PARAMETERS = ('TOTAL_TIME',)
+
+
+def write_checkpoint(filename, surface, time, dt, step, t_output):
+    """
+    Saves the state of the simulation of the current context.
+
+    Args:
+        filename (str): The name of the checkpoint file.
+        surface (Surface): The current surface.
+        time (float): The current simulation time.
+        dt (float): The proposed size of the next time step (before it
+            is limited by TOTAL_TIME).
+        step (int): The number of time steps done.
+        t_output (float): The time of the next output (OUTPUT_INTERVAL).
+    """
+    parameters = par.current().as_dict()
+
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'wb') as file:
+        np.savez(file, x=surface.x, y=surface.y,
+                 state=np.array([time, dt, step, t_output,
+                                 adv._error_timestep.get()]),
+                 parameters=np.array(repr(parameters)))
+    os.replace(tmp_file, filename)
+
+
+def read_checkpoint(filename, cfg_file):
+    """
+    Restores parameters and state of a simulation.
+
+    The parameters start from the snapshot of the checkpoint, then the
+    .cfg file is applied, so values changed in the .cfg file take
+    effect. TOTAL_TIME is always taken from the .cfg file. Parameters
+    differing from the snapshot are printed.
+
+    Args:
+        filename (str): The name of the checkpoint file.
+        cfg_file (str): The .cfg file of the simulation.
+
+    Returns:
+        config (Config): The parameters of the simulation.
+        state (dict): The state to continue from, with the keys surface
+            (Surface), time, dt (the proposed size of the next time
+            step), step, t_output (the time of the next output) and
+            error_timestep (the time step proposed by the error
+            estimate).
+    """
+    with np.load(filename) as checkpoint:
+        x = checkpoint['x']
+        y = checkpoint['y']
+        time, dt, step, t_output, error_timestep = checkpoint['state']
+        parameters = ast.literal_eval(str(checkpoint['parameters']))
+
+    base = par.defaults().as_dict()
+    base.update((key, value) for key, value in parameters.items()
+                if key in base and key not in _RESTART_PARAMETERS)
+    config = par.read_config(cfg_file, par.Config(base))
+    for key, value in parameters.items():
+        if (key not in _RESTART_PARAMETERS and key in base and
+                getattr(config, key) != value):
+            print(f'{key} changed since the checkpoint: '
+                  f'{value} -> {getattr(config, key)}')
+
+    state = dict(surface=Surface(x, y), time=float(time), dt=float(dt),
+                 step=int(step), t_output=float(t_output),
+                 error_timestep=float(error_timestep))
+    return config, state
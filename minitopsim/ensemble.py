@@ -0,0 +1,375 @@
+"""
+Module for advancing an ensemble of simulations together.
+
+Parameter studies often run many small simulations which differ only in
+a few parameters. An Ensemble keeps the surfaces of its members with the
+same number of points as (K, n) arrays and calculates their normal
+vectors, sputter yields, beam fluxes and time integration in single
+numpy calls, so the Python overhead of a time step is paid once per
+batch instead of once per member. Shadows and loops are only handled for
+members whose x-coordinates do not increase (a surface with increasing
+x-coordinates has neither). A member whose number of points changes by
+delooping moves to the batch of its new number of points.
+
+Classes:
+    Ensemble: Simulations differing in MEMBER_PARAMETERS and the initial
+        surface, advanced together.
+"""
+import contextvars
+
+import numpy as np
+
+from . import parameters as par
+from . import advance as adv
+from . import sputtering as sput
+from minitopsim.io_surface import SurfaceWriter, TrajectoryWriter
+from minitopsim.surface import Shadow_Error, Surface
+from work.Aufgabe9_initial.init_surface import init_surface
+import minitopsim.beam as beam
+import minitopsim.timing as timing
+
+# parameters which may differ between the members, besides those of the
+# initial surface (section Initial Conditions of parameters.db)
+MEMBER_PARAMETERS = ('ETCH_RATE', 'SPUTTER_YIELD_0', 'SPUTTER_YIELD_F',
+                     'SPUTTER_YIELD_B', 'DENSITY', 'BEAM_CURRENT',
+                     'BEAM_CURRENT_DENSITY')
+
+# settings the ensemble does not support, which need a time step, a
+# number of points or a view factor matrix per member
+_UNSUPPORTED = (('REDEP', True), ('INTERPOLATION', True), ('REMESH', True),
+                ('ADAPTIVE_TIME_STEP', True), ('SURFACE_ENGINE', 'level set'))
+
+
+class Ensemble:
+    """
+    Simulations differing in MEMBER_PARAMETERS and the initial surface,
+    advanced together.
+
+    The shared parameters are active in the contextvars.Context of the
+    ensemble (as for Simulation), with the beam current set to 1, so the
+    beam flux of a member is its BEAM_CURRENT (BEAM_CURRENT_DENSITY for
+    constant beams) times the flux of this beam.
+
+    A member stops at its last surface if a Shadow_Error occurs or a
+    surface cannot be written, the others continue.
+
+    Attributes:
+        configs (list(Config)): The parameters of the members.
+        time (float): The simulation time.
+        times (list(float)): The simulation time of each member.
+        running (array(bool)): Members not stopped.
+        step (int): The number of time steps done.
+        log (file): Where messages are printed to (None: sys.stdout).
+        timers (StageTimers): The times of the stages.
+    """
+    def __init__(self, configs, log=None):
+        """
+        Initializes the surfaces of the members and the beam.
+
+        Args:
+            configs (list(Config)): The parameters of the members.
+            log (file): Where messages are printed to (None: sys.stdout).
+
+        Raises:
+            ValueError: The configurations differ in other parameters
+                than MEMBER_PARAMETERS and those of the initial surface,
+                or use settings not supported by the ensemble (REDEP,
+                INTERPOLATION, REMESH, ADAPTIVE_TIME_STEP or the level
+                set engine).
+        """
+        self.configs = list(configs)
+        self.log = log
+        _check(self.configs)
+        self._context = contextvars.Context()
+        self._context.run(self._init)
+
+    def surfaces(self):
+        """
+        Returns the current surfaces.
+
+        Returns:
+            list(Surface): The surface of each member.
+        """
+        surfaces = list(self._stopped)
+        for members, x, y in self._batches:
+            for member, x_member, y_member in zip(members, x, y):
+                surfaces[member] = Surface(x_member, y_member)
+        return surfaces
+
+    def advance(self, dtime):
+        """
+        Advances the running members by a time step.
+
+        Args:
+            dtime (float): The time step size.
+        """
+        self._context.run(self._advance, dtime)
+
+    def run(self, filenames):
+        """
+        Advances the members up to TOTAL_TIME and writes their surfaces.
+
+        The surfaces of a member are written to its filename with
+        extension .srf (.srfb for OUTPUT_FORMAT binary), as by
+        Simulation.run() (see OUTPUT_STRIDE, OUTPUT_INTERVAL), the last
+        one always. No checkpoints are written. If TIMING_REPORT is set,
+        the times of the stages are printed at the end.
+
+        Args:
+            filenames (list(str)): The name of the output file of each
+                member without extension.
+
+        Returns:
+            list(bool): False for members whose surfaces could not be
+                written, True otherwise.
+        """
+        return self._context.run(self._run, filenames)
+
+    def _init(self):
+        """Initializes the state in the context of the ensemble."""
+        par.activate(self.configs[0].replace(BEAM_CURRENT=1.,
+                                             BEAM_CURRENT_DENSITY=1.))
+        beam.init()
+        self.timers = timing.init()
+
+        size = len(self.configs)
+        self.time = 0
+        self.times = [self.time] * size
+        self.running = np.ones(size, dtype=bool)
+        self.step = 0
+        # (K, 1) arrays of the member parameters
+        self._values = {key: np.array([getattr(config, key)
+                                       for config in self.configs],
+                                      dtype=float)[:, None]
+                        for key in MEMBER_PARAMETERS}
+        self._flux_scale = self._values['BEAM_CURRENT_DENSITY'
+                                        if par.BEAM_TYPE == 'constant'
+                                        else 'BEAM_CURRENT']
+        # surfaces of the stopped members
+        self._stopped = [None] * size
+        self._failed = set()
+
+        surfaces = [contextvars.Context().run(_init_surface, config)
+                    for config in self.configs]
+        self._batches = _group([(np.array([member]), surface.x[None],
+                                 surface.y[None])
+                                for member, surface in enumerate(surfaces)])
+
+    def _run(self, filenames):
+        """Runs the ensemble in its context."""
+        size = len(self.configs)
+        writers = [_writer(filename) for filename in filenames]
+        success = np.ones(size, dtype=bool)
+        written = np.zeros(size, dtype=bool)
+
+        with timing.stage('run'):
+            self._write(writers, np.arange(size), success, written)
+            tend = par.TOTAL_TIME
+            t_output = par.OUTPUT_INTERVAL
+            dt = adv.timestep(par.TIME_STEP, self.time, tend)
+            try:
+                while dt > 0 and np.any(self.running):
+                    with timing.stage('advance'):
+                        self._advance(dt)
+                    written[self.running] = False
+                    if par.OUTPUT_INTERVAL > 0:
+                        # tolerance for the rounding of the summed up
+                        # time steps
+                        tolerance = 1e-9 * par.OUTPUT_INTERVAL
+                        output = self.time >= t_output - tolerance
+                        while t_output <= self.time + tolerance:
+                            t_output += par.OUTPUT_INTERVAL
+                    else:
+                        output = self.step % par.OUTPUT_STRIDE == 0
+                    if output:
+                        self._write(writers, np.flatnonzero(self.running),
+                                    success, written)
+                    print(f'time = {self.time}, dt = {dt}', file=self.log)
+                    dt = adv.timestep(par.TIME_STEP, self.time, tend)
+            finally:
+                # the final surfaces are always written
+                self._write(writers, np.flatnonzero(~written), success,
+                            written)
+                with timing.stage('output'):
+                    for writer in writers:
+                        writer.close()
+        if par.TIMING_REPORT:
+            print(self.timers, file=self.log)
+        return success.tolist()
+
+    def _write(self, writers, members, success, written):
+        """Writes the surfaces of members, stops those failing."""
+        if len(members) == 0:
+            return
+        surfaces = self.surfaces()
+        failed = []
+        with timing.stage('output'):
+            for member in members:
+                if not success[member]:
+                    continue
+                if writers[member].write(surfaces[member],
+                                         self.times[member]):
+                    written[member] = True
+                else:
+                    success[member] = False
+                    failed.append(member)
+        if failed:
+            self._stop(set(failed), surfaces)
+
+    def _advance(self, dtime):
+        """Advances the running members by a time step."""
+        batches = []
+        moved = False
+        for members, x, y in self._batches:
+            self._failed = set()
+            surface = Surface(x, y)
+
+            def velocities(stage_surface, members=members):
+                return self._velocities(members, stage_surface)
+
+            velocity = velocities(surface)
+            with timing.stage('integrate'):
+                x_new, y_new, _ = adv.integrate(surface, velocity, dtime,
+                                                velocities)
+            if self._failed:
+                # failed members stop at the surface before the step
+                keep = ~np.isin(members, list(self._failed))
+                for row in np.flatnonzero(~keep):
+                    self._stopped[members[row]] = Surface(x[row], y[row])
+                self.running[list(self._failed)] = False
+                members, x_new, y_new = (members[keep], x_new[keep],
+                                         y_new[keep])
+                moved = True
+
+            with timing.stage('deloop'):
+                for row in _not_increasing(x_new):
+                    x_row, y_row = Surface(x_new[row], y_new[row]).deloop()
+                    if x_row.size == x_new.shape[1]:
+                        x_new[row] = x_row
+                        y_new[row] = y_row
+                        continue
+                    # the member leaves the batch
+                    batches.append((members[[row]], x_row[None],
+                                    y_row[None]))
+                    members = members.copy()
+                    members[row] = -1
+                    moved = True
+            keep = members >= 0
+            if not np.all(keep):
+                members, x_new, y_new = (members[keep], x_new[keep],
+                                         y_new[keep])
+            if len(members):
+                batches.append((members, x_new, y_new))
+
+        self._batches = _group(batches) if moved else batches
+        self.time += dtime
+        for member in np.flatnonzero(self.running):
+            self.times[member] = self.time
+        self.step += 1
+
+    def _velocities(self, members, surface):
+        """
+        Calculates the velocities of members as advance.get_velocities().
+
+        Args:
+            members (array(int)): The members of the batch.
+            surface (Surface): Their surfaces as (K, n) arrays.
+
+        Returns:
+            array(float): (2, K, n) velocities in x- and y-direction.
+        """
+        with timing.stage('velocities'):
+            with timing.stage('normal_vector'):
+                normal_vec = surface.normal_vector()
+
+            if par.ETCHING:
+                v_normal = self._values['ETCH_RATE'][members] * \
+                    np.ones_like(surface.x)
+            else:
+                cos_theta = -normal_vec[1]
+                with timing.stage('sputter_yield'):
+                    if par.SPUTTER_YIELD_TYPE == 'Yamamura':
+                        Y_s = sput.get_yamamura_yield(
+                            cos_theta,
+                            self._values['SPUTTER_YIELD_0'][members],
+                            self._values['SPUTTER_YIELD_F'][members],
+                            self._values['SPUTTER_YIELD_B'][members])
+                    else:
+                        Y_s = sput.get_sputter_yield(cos_theta)
+                with timing.stage('beam_flux'):
+                    F_beam = self._flux_scale[members] * \
+                        beam.get_beam()(surface.x)
+                F_sput = F_beam * Y_s * cos_theta
+                v_normal = F_sput / self._values['DENSITY'][members] * 1e7
+
+            with timing.stage('shadows'):
+                for row in _not_increasing(surface.x):
+                    try:
+                        mask = Surface(surface.x[row],
+                                       surface.y[row]).get_shadows()
+                    except Shadow_Error as err_msg:
+                        print(f'Member {members[row]}: A Shadow_Error '
+                              f'occurred: {err_msg}', file=self.log)
+                        print(f'Member {members[row]} was stopped at '
+                              f'{self.time}s.', file=self.log)
+                        self._failed.add(int(members[row]))
+                        mask = slice(None)
+                    v_normal[row, mask] = 0
+
+        return normal_vec * v_normal
+
+    def _stop(self, members, surfaces):
+        """Stops members at their current surfaces."""
+        for member in members:
+            self._stopped[member] = surfaces[member]
+        self.running[list(members)] = False
+        batches = []
+        for batch_members, x, y in self._batches:
+            keep = ~np.isin(batch_members, list(members))
+            if np.any(keep):
+                batches.append((batch_members[keep], x[keep], y[keep]))
+        self._batches = batches
+
+
+def _check(configs):
+    """Raises a ValueError if configs cannot form an ensemble."""
+    if not configs:
+        raise ValueError('ERROR: an ensemble needs at least one member!')
+    first = configs[0].as_dict()
+    for key, value in _UNSUPPORTED:
+        if first[key] == value:
+            raise ValueError(f'ERROR: {key} = {value!r} is not supported '
+                             f'by ensembles!')
+    for config in configs[1:]:
+        for key, value in config.as_dict().items():
+            if (value != first[key] and key not in MEMBER_PARAMETERS and
+                    par._categories[key] != 'Initial Conditions'):
+                raise ValueError(f'ERROR: members of an ensemble differ '
+                                 f'in {key}!')
+
+
+def _init_surface(config):
+    """The initial surface of a member with its parameters."""
+    par.activate(config)
+    return init_surface()
+
+
+def _writer(filename):
+    """Opens the output file of a member (see Simulation.srf_file)."""
+    if par.OUTPUT_FORMAT == 'binary':
+        return TrajectoryWriter(filename + '.srfb')
+    return SurfaceWriter(filename + '.srf', int(par.OUTPUT_BUFFER * 2**20))
+
+
+def _not_increasing(x):
+    """Rows of x (K, n) whose values do not increase."""
+    return np.flatnonzero(np.any(np.diff(x) <= 0, axis=1))
+
+
+def _group(batches):
+    """Joins the batches (members, x, y) with the same number of points."""
+    groups = dict()
+    for batch in batches:
+        groups.setdefault(batch[1].shape[1], []).append(batch)
+    return [tuple(np.concatenate(arrays) for arrays in zip(*group))
+            for group in groups.values()]
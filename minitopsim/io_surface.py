@@ -3,12 +3,29 @@ File: io_surface.py
 
 Module cotaining functions for calculating a surface and writing it to
 a file and to read surface information from a file-like object.
+
+Besides the .srf text format, surfaces can be written to binary
+trajectory files (see TrajectoryWriter and TrajectoryReader).
 """
+import mmap
+import os
+import struct
+
 import minitopsim.parameters as par
 from minitopsim.surface import Surface
 
 import numpy as np
 
+# binary trajectory format: magic, frames (time, npoints, x, y), index
+# (times, offsets of the frames), footer (nframes, index offset, magic)
+_MAGIC = b'MTSTRJ01'
+_INDEX_MAGIC = b'MTSIDX01'
+_FRAME_HEADER = struct.Struct('<dq')
+_FOOTER = struct.Struct('<qq8s')
+
+# .srf files from this size (bytes) on get their index cached in a sidecar
+_INDEX_MIN_SIZE = 2**24
+
 
 def init_surface():
     """
@@ -63,10 +80,7 @@ def write_surface(surface, time, srf_fobject):
     try:
         mode = 'w' if time == 0 else 'a'
         with open(srf_fobject, mode) as file:
-            file.write(f'surface: {time} {len(surface.x)} x-positions '
-                       f'y-positions\n')
-            for i in range(len(surface.x)):
-                file.write(f"{surface.x[i]} {surface.y[i]}\n")
+            file.write(_format_srf_frame(surface, time))
     except Exception as e:
         print("An error occurred while writing the surface to the file:",
               str(e))
@@ -85,6 +99,9 @@ def read_surface(srf_fobj):
     Returns:
         tuple: A tuple containing a Surface object and the current time.
                If no surface information is available, returns (None, None).
+
+    The lines of the points are read first and then parsed together,
+    only the first two columns are used.
     """
     surface_info = srf_fobj.readline().split()
 
@@ -94,12 +111,529 @@ def read_surface(srf_fobj):
     current_time = float(surface_info[1])
     npoints = int(surface_info[2])
 
-    x_coords = np.zeros(npoints)
-    y_coords = np.zeros(npoints)
+    lines = [srf_fobj.readline() for _ in range(npoints)]
+    if npoints:
+        coords = np.loadtxt(lines, ndmin=2, usecols=(0, 1))
+    else:
+        coords = np.zeros((0, 2))
 
-    for i in range(npoints):
-        line = srf_fobj.readline().split()
-        x_coords[i] = float(line[0])
-        y_coords[i] = float(line[1])
+    x_coords = np.ascontiguousarray(coords[:, 0])
+    y_coords = np.ascontiguousarray(coords[:, 1])
 
     return Surface(x_coords, y_coords), current_time
+
+
+def _format_srf_frame(surface, time):
+    """Formats one surface in the .srf format.
+
+    The coordinates are written like str(float), i.e. with the shortest
+    representation that reads back to the same value.
+    """
+    x = map(repr, np.asarray(surface.x, dtype=float).tolist())
+    y = map(repr, np.asarray(surface.y, dtype=float).tolist())
+    points = '\n'.join(map(' '.join, zip(x, y)))
+    return (f'surface: {time} {len(surface.x)} x-positions y-positions\n'
+            f'{points}\n')
+
+
+class SurfaceWriter:
+    """
+    Writes surfaces to a .srf file that is kept open for the whole run.
+
+    The formatted surfaces are collected in memory and written to the
+    file as soon as they exceed buffer_size, when flush() is called or
+    when the writer is closed.
+
+    Attributes:
+        filename (str): The name of the .srf file.
+        buffer_size (int): Number of bytes collected before writing.
+    """
+    def __init__(self, filename, buffer_size=2**20, append=False):
+        """
+        Opens the .srf file for writing.
+
+        Args:
+            filename (str): The name of the .srf file.
+            buffer_size (int): Number of bytes collected before writing.
+            append (bool): If True, the surfaces are appended to the
+                file, otherwise the file is overwritten.
+        """
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self._file = open(filename, 'a' if append else 'w')
+        self._buffer = []
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, surface, time):
+        """
+        Adds the surface evaluated at a given time.
+
+        Args:
+            surface (Surface): The surface to be written.
+            time (float): The time that passed since initial evaluation.
+
+        Returns:
+            bool: True if the surface was written successfully,
+                False otherwise.
+        """
+        try:
+            frame = _format_srf_frame(surface, time)
+            self._buffer.append(frame)
+            self._buffered += len(frame)
+            if self._buffered >= self.buffer_size:
+                self.flush()
+        except Exception as e:
+            print("An error occurred while writing the surface to the file:",
+                  str(e))
+            return False
+
+        return True
+
+    def flush(self):
+        """Writes the collected surfaces to the file."""
+        self._file.write(''.join(self._buffer))
+        self._file.flush()
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        """Writes the collected surfaces and closes the file."""
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+
+class TrajectoryWriter:
+    """
+    Writes surfaces to a binary trajectory file.
+
+    The file starts with a magic number, followed by one frame per
+    surface: time (float64) and npoints (int64), then the x- and the
+    y-positions (npoints float64 each), all little-endian. Frames are
+    only appended. When the writer is closed, an index with the times
+    and file offsets of all frames is added at the end, so single
+    frames can be read without parsing the file. Files without index
+    (e.g. after a crash) are still readable.
+
+    Attributes:
+        filename (str): The name of the trajectory file.
+        times (list(float)): The times of the written frames.
+        offsets (list(int)): The file offsets of the written frames.
+    """
+    def __init__(self, filename, append=False):
+        """
+        Opens the trajectory file for writing.
+
+        Args:
+            filename (str): The name of the trajectory file.
+            append (bool): If True and the file exists, new frames are
+                appended to the existing ones, otherwise the file is
+                overwritten.
+        """
+        self.filename = filename
+        if append and os.path.isfile(filename):
+            self._file = open(filename, 'r+b')
+            self.times, self.offsets, end = _read_index(self._file)
+            self._file.seek(end)
+            self._file.truncate()
+        else:
+            self._file = open(filename, 'wb')
+            self._file.write(_MAGIC)
+            self.times = []
+            self.offsets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, surface, time):
+        """
+        Appends the surface evaluated at a given time.
+
+        Args:
+            surface (Surface): The surface to be written.
+            time (float): The time that passed since initial evaluation.
+
+        Returns:
+            bool: True if the surface was written successfully,
+                False otherwise.
+        """
+        try:
+            offset = self._file.tell()
+            self._file.write(_FRAME_HEADER.pack(time, len(surface.x)))
+            self._file.write(np.asarray(surface.x, dtype='<f8').tobytes())
+            self._file.write(np.asarray(surface.y, dtype='<f8').tobytes())
+        except Exception as e:
+            print("An error occurred while writing the surface to the file:",
+                  str(e))
+            return False
+
+        self.times.append(time)
+        self.offsets.append(offset)
+        return True
+
+    def flush(self):
+        """Writes the frames buffered by the file object to the file."""
+        self._file.flush()
+
+    def close(self):
+        """Writes the index and closes the file."""
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(np.asarray(self.times, dtype='<f8').tobytes())
+        self._file.write(np.asarray(self.offsets, dtype='<i8').tobytes())
+        self._file.write(_FOOTER.pack(len(self.times), index_offset,
+                                      _INDEX_MAGIC))
+        self._file.close()
+
+
+class TrajectoryReader:
+    """
+    Reads surfaces from a binary trajectory file (see TrajectoryWriter).
+
+    The frames can be accessed by their number, e.g. reader[-1] for the
+    last surface, or iterated over. Each frame is returned as a tuple
+    (Surface, time) like from read_surface().
+
+    Attributes:
+        filename (str): The name of the trajectory file.
+        times (array(float)): The times of the frames.
+        offsets (array(int)): The file offsets of the frames.
+    """
+    def __init__(self, filename):
+        """
+        Opens the trajectory file and reads its index.
+
+        Args:
+            filename (str): The name of the trajectory file.
+
+        Raises:
+            ValueError: The file is no binary trajectory file.
+        """
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        if self._file.read(len(_MAGIC)) != _MAGIC:
+            self._file.close()
+            raise ValueError(f'{filename} is no binary trajectory file.')
+        times, offsets, _ = _read_index(self._file)
+        self.times = np.asarray(times, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, frame):
+        """Returns frame number frame as tuple (Surface, time)."""
+        self._file.seek(self.offsets[frame])
+        time, npoints = _FRAME_HEADER.unpack(
+            self._file.read(_FRAME_HEADER.size))
+        xy = np.frombuffer(self._file.read(16 * npoints), dtype='<f8')
+        return (Surface(xy[:npoints].astype(float),
+                        xy[npoints:].astype(float)), time)
+
+    def __iter__(self):
+        for frame in range(len(self)):
+            yield self[frame]
+
+    def close(self):
+        """Closes the file."""
+        self._file.close()
+
+
+def _read_index(file):
+    """
+    Reads the index of an open binary trajectory file.
+
+    If the file has no index, the frames are found by walking through
+    the file, ignoring an incomplete frame at the end.
+
+    Returns:
+        times (list(float)): The times of the frames.
+        offsets (list(int)): The file offsets of the frames.
+        end (int): The file offset after the last frame.
+    """
+    size = file.seek(0, os.SEEK_END)
+    if size >= len(_MAGIC) + _FOOTER.size:
+        file.seek(size - _FOOTER.size)
+        nframes, index_offset, magic = _FOOTER.unpack(
+            file.read(_FOOTER.size))
+        if magic == _INDEX_MAGIC:
+            file.seek(index_offset)
+            times = np.frombuffer(file.read(8 * nframes), dtype='<f8')
+            offsets = np.frombuffer(file.read(8 * nframes), dtype='<i8')
+            return times.tolist(), offsets.tolist(), index_offset
+
+    times = []
+    offsets = []
+    offset = len(_MAGIC)
+    while offset + _FRAME_HEADER.size <= size:
+        file.seek(offset)
+        time, npoints = _FRAME_HEADER.unpack(file.read(_FRAME_HEADER.size))
+        end = offset + _FRAME_HEADER.size + 16 * npoints
+        if npoints < 0 or end > size:
+            break
+        times.append(time)
+        offsets.append(offset)
+        offset = end
+    return times, offsets, offset
+
+
+class SrfReader:
+    """
+    Random access to the surfaces of a .srf file.
+
+    The file is memory-mapped and scanned once for the 'surface:'
+    headers. For large files the resulting index is cached in the
+    sidecar file <filename>.idx, so opening the file again only scans
+    the part appended since. A frame is parsed only when it is
+    accessed, e.g. reader[-1] for the last surface. An incomplete frame
+    at the end of the file (still being written) is ignored.
+
+    Attributes:
+        filename (str): The name of the .srf file.
+        times (array(float)): The times of the frames.
+        npoints (array(int)): The number of points of the frames.
+        offsets (array(int)): The file offsets of the frame headers.
+    """
+    def __init__(self, filename):
+        """
+        Opens the .srf file and reads or builds its index.
+
+        Args:
+            filename (str): The name of the .srf file.
+        """
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._map = (mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+                     if stat.st_size else b'')
+
+        offsets, times, npoints, up_to_date = self._load_index(stat)
+        if not up_to_date:
+            # scan from the last indexed frame on, it may have grown
+            start = 0
+            if offsets:
+                start = offsets[-1]
+                del offsets[-1], times[-1], npoints[-1]
+            new_index = self._scan(start)
+            offsets += new_index[0]
+            times += new_index[1]
+            npoints += new_index[2]
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.times = np.array(times, dtype=float)
+        self.npoints = np.array(npoints, dtype=np.int64)
+
+        if not up_to_date and stat.st_size >= _INDEX_MIN_SIZE:
+            self._save_index(stat)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, frame):
+        """Returns frame number frame as tuple (Surface, time)."""
+        frame = range(len(self))[frame]
+        start = self._map.find(b'\n', self.offsets[frame]) + 1
+        end = (self.offsets[frame + 1] if frame + 1 < len(self)
+               else len(self._map))
+        npoints = self.npoints[frame]
+        values = np.array(self._map[start:end].split()[:2 * npoints],
+                          dtype=float)
+        return (Surface(values[0::2].copy(), values[1::2].copy()),
+                float(self.times[frame]))
+
+    def __iter__(self):
+        for frame in range(len(self)):
+            yield self[frame]
+
+    def frames_end(self):
+        """Returns the file offset after the last complete frame."""
+        if not len(self):
+            return 0
+        pos = self._map.find(b'\n', self.offsets[-1])
+        for _ in range(self.npoints[-1]):
+            pos = self._map.find(b'\n', pos + 1)
+        return pos + 1
+
+    def close(self):
+        """Closes the file."""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _scan(self, start):
+        """Finds the complete frames from file offset start on."""
+        data = self._map
+        offsets = []
+        times = []
+        npoints = []
+        pos = start
+        while True:
+            pos = data.find(b'surface:', pos)
+            if pos < 0:
+                break
+            end = data.find(b'\n', pos)
+            if end < 0:
+                break
+            if pos == 0 or data[pos - 1:pos] == b'\n':
+                header = data[pos:end].split()
+                offsets.append(pos)
+                times.append(float(header[1]))
+                npoints.append(int(header[2]))
+            pos = end
+
+        # the last frame is complete if all its lines are there
+        if offsets:
+            header_end = data.find(b'\n', offsets[-1]) + 1
+            if data[header_end:].count(b'\n') < npoints[-1]:
+                del offsets[-1], times[-1], npoints[-1]
+
+        return offsets, times, npoints
+
+    def _load_index(self, stat):
+        """Reads the cached index if it belongs to the current file.
+
+        The index is up to date if size and modification time of the file
+        did not change. If the file grew and still has the last indexed
+        header at the same offset, only the new part has to be scanned.
+        Otherwise an empty index is returned.
+
+        Returns:
+            offsets, times, npoints (list): The cached index.
+            up_to_date (bool): True if the file did not change.
+        """
+        try:
+            with np.load(self.filename + '.idx') as index:
+                offsets = index['offsets'].tolist()
+                times = index['times'].tolist()
+                npoints = index['npoints'].tolist()
+                size, mtime = index['stat'].tolist()
+        except (OSError, ValueError, KeyError):
+            return [], [], [], False
+
+        if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+            return offsets, times, npoints, True
+        if offsets and size < stat.st_size:
+            end = self._map.find(b'\n', offsets[-1])
+            header = self._map[offsets[-1]:end].split()
+            if (len(header) > 2 and header[0] == b'surface:'
+                    and float(header[1]) == times[-1]
+                    and int(header[2]) == npoints[-1]):
+                return offsets, times, npoints, False
+        return [], [], [], False
+
+    def _save_index(self, stat):
+        """Writes the index to the sidecar file, if possible."""
+        try:
+            with open(self.filename + '.idx', 'wb') as file:
+                np.savez(file, offsets=self.offsets, times=self.times,
+                         npoints=self.npoints,
+                         stat=np.array([stat.st_size, stat.st_mtime_ns]))
+        except OSError:
+            pass
+
+
+def is_trajectory(filename):
+    """Returns True if filename is a binary trajectory file."""
+    with open(filename, 'rb') as file:
+        return file.read(len(_MAGIC)) == _MAGIC
+
+
+def open_trajectory(filename):
+    """
+    Opens a .srf or a binary trajectory file for random access.
+
+    Args:
+        filename (str): The name of the file.
+
+    Returns:
+        SrfReader or TrajectoryReader: The reader, depending on the
+            format of the file.
+    """
+    if is_trajectory(filename):
+        return TrajectoryReader(filename)
+    return SrfReader(filename)
+
+
+def read_trajectory(filename):
+    """
+    Reads all surfaces from a .srf or a binary trajectory file.
+
+    Args:
+        filename (str): The name of the file.
+
+    Returns:
+        list: Tuples (Surface, time) of all surfaces in the file.
+    """
+    with open_trajectory(filename) as reader:
+        return list(reader)
+
+
+def truncate_trajectory(filename, time):
+    """
+    Removes the surfaces after a given time from a .srf or binary file.
+
+    Used when continuing a simulation from a checkpoint. An index of a
+    binary file is removed as well, it is rebuilt when appending.
+
+    Args:
+        filename (str): The name of the file.
+        time (float): The time of the last surface to keep.
+    """
+    with open_trajectory(filename) as reader:
+        later = np.nonzero(reader.times > time)[0]
+        if later.size:
+            end = int(reader.offsets[later[0]])
+        elif isinstance(reader, SrfReader):
+            # an incomplete frame at the end is removed as well
+            end = reader.frames_end()
+        else:
+            end = None
+    if end is not None:
+        with open(filename, 'r+b') as file:
+            file.truncate(end)
+
+
+def convert_trajectory(src, dst):
+    """
+    Converts a .srf file to a binary trajectory file or vice versa.
+
+    The direction is given by the format of src.
+
+    Args:
+        src (str): The name of the file to convert.
+        dst (str): The name of the converted file.
+    """
+    if is_trajectory(src):
+        with TrajectoryReader(src) as reader, SurfaceWriter(dst) as writer:
+            for surface, time in reader:
+                writer.write(surface, time)
+    else:
+        with SrfReader(src) as reader, TrajectoryWriter(dst) as writer:
+            for surface, time in reader:
+                writer.write(surface, time)
@@ -0,0 +1,470 @@
+"""
+Module containing the class LevelSet, a surface engine alternative to
+moving the points of a Surface.
+
+The surface is the zero level set of a signed distance function phi on
+a uniform grid, phi < 0 in the material. In a time step, phi is only
+updated in a narrow band around the surface with a first order upwind
+scheme, with the normal velocities of advance.get_velocities() at the
+points of the surface extracted from phi. Loops cannot form, so no
+delooping is needed.
+"""
+import numpy as np
+
+from minitopsim.surface import Surface
+from . import advance as adv
+from . import timing
+
+# largest part of a grid cell the surface moves in one sub step
+CFL_NUMBER = 0.5
+
+# segments of a cell (edges: 0 bottom, 1 right, 2 top, 3 left) by the
+# corners in the material (1 lower left, 2 lower right, 4 upper right,
+# 8 upper left), -1 for no segment. The saddles 5 and 10 have two
+# segments, their second one and the pairing depend on the cell center.
+_EDGE_A = np.array([-1, 3, 0, 3, 1, 3, 0, 3, 2, 0, 3, 1, 3, 0, 3, -1])
+_EDGE_B = np.array([-1, 0, 1, 1, 2, 0, 2, 2, 3, 2, 0, 2, 1, 1, 0, -1])
+
+
+class LevelSet:
+    """
+    Class representing a surface as level set on a uniform grid.
+
+    Attributes:
+        phi (array(float)): Signed distance (nm) to the surface at the
+            grid points (rows in y, columns in x), negative in the
+            material. Outside of the narrow band, only the sign is valid.
+        x0 (float): x-coordinate of the first grid column.
+        y0 (float): y-coordinate of the first grid row.
+        h (float): Grid spacing (nm).
+        band (int): Half width of the narrow band in grid cells.
+        reinit (int): Number of band updates between reinitializations
+            of phi to the distance to the surface.
+        updates (int): Number of band updates done.
+
+    The grid spans x from xmin to xmax, it grows in y if the surface
+    gets close to its lower or upper end. Closed contours (voids) are
+    kept in phi, but the extracted surface is the contour from the left
+    to the right end of the grid.
+    """
+    def __init__(self, surface, xmin, xmax, spacing, band=4, reinit=5):
+        """
+        Initializes phi with the signed distance to a surface.
+
+        Args:
+            surface (Surface): The surface from xmin to xmax.
+            xmin (float): x-coordinate of the left end of the grid.
+            xmax (float): x-coordinate of the right end of the grid.
+            spacing (float): Grid spacing (nm), rounded to divide
+                xmax - xmin.
+            band (int): Half width of the narrow band in grid cells
+                (at least 3).
+            reinit (int): Number of band updates between
+                reinitializations.
+        """
+        nx = max(int(round((xmax - xmin) / spacing)), 1) + 1
+        self.h = (xmax - xmin) / (nx - 1)
+        self.x0 = xmin
+        self.band = band
+        self.reinit = reinit
+        self.updates = 0
+
+        # continued beyond the ends, so the end columns are crossed
+        x, y = _refine(np.concatenate(([xmin - self.h], surface.x,
+                                       [xmax + self.h])),
+                       np.concatenate(([surface.y[0]], surface.y,
+                                       [surface.y[-1]])), self.h)
+        margin = (band + 2) * self.h
+        self.y0 = y.min() - margin
+        ny = int(np.ceil((y.max() - self.y0 + margin) / self.h)) + 1
+
+        inside = self._inside(x, y, nx, ny)
+        width = band * self.h
+        self.phi = np.where(inside, -width, width)
+        self._mask = np.zeros(self.phi.shape, dtype=bool)
+        # smallest distance found by _distance(), inf outside of it
+        self._nearest = np.full(self.phi.shape, np.inf)
+        self._band = np.zeros(0, dtype=np.intp)
+        self._voids = tuple(np.zeros(0) for _ in range(4))
+        band_points, distance, _ = self._distance(x, y, np.zeros_like(x),
+                                                  width)
+        self._set_band(band_points, distance, width, reinit=True)
+        self._surface = self._extract()
+
+    def surface(self):
+        """
+        Returns the surface, the zero level set from xmin to xmax.
+
+        Returns:
+            Surface: The points where the contour crosses the grid lines.
+        """
+        return self._surface
+
+    def advance(self, dtime):
+        """
+        Moves the surface by one time step.
+
+        The time step is split such that the surface moves by at most
+        band - 2 grid cells between updates of the band, so it stays
+        inside of the band. For each part,
+        the normal velocities at the points of the surface (see
+        advance.get_velocities()) are extended to the band as the
+        velocity of the closest point of the surface, and phi is moved
+        in sub steps of at most CFL_NUMBER grid cells. Every reinit band
+        updates, phi in the band is reset to the distance to the surface.
+
+        Args:
+            dtime (float): The time step size.
+
+        Returns:
+            Surface: The new surface.
+        """
+        remaining = dtime
+        while remaining > 0:
+            surface = self._surface
+            velocity = adv.get_velocities(surface)
+            # normal velocity into the material
+            speed = np.sum(velocity * surface.normal_vector(), axis=0)
+            max_speed = np.max(np.abs(speed), initial=0.)
+            dt = remaining
+            if max_speed * dt > (self.band - 2) * self.h:
+                dt = (self.band - 2) * self.h / max_speed
+            remaining = 0. if dt == remaining else remaining - dt
+            width = self.band * self.h
+
+            with timing.stage('redistance'):
+                self._extend(surface.y, width)
+                band, distance, band_speed = self._distance(
+                    surface.x, surface.y, speed, width)
+                self._set_band(band, distance, width,
+                               reinit=self.updates % self.reinit == 0)
+            self.updates += 1
+
+            with timing.stage('upwind'):
+                substeps = max(int(np.ceil(max_speed * dt /
+                                           (CFL_NUMBER * self.h))), 1)
+                # the outward normal velocity moves phi
+                self._upwind(-band_speed, dt / substeps, substeps)
+
+            with timing.stage('extract'):
+                self._surface = self._extract()
+        return self._surface
+
+    def _inside(self, x, y, nx, ny):
+        """
+        Finds the grid points in the material below a polyline.
+
+        A point is in the material if a ray upwards from it crosses the
+        polyline an odd number of times. Segments must not be longer
+        than h.
+        """
+        # grid column crossed by each segment (column in [u_a, u_b)),
+        # in grid units, so that neighboring segments agree on points at
+        # grid columns
+        u = (x - self.x0) / self.h
+        u_lo = np.minimum(u[:-1], u[1:])
+        u_hi = np.maximum(u[:-1], u[1:])
+        column = np.ceil(u_lo)
+        crossed = (column < u_hi) & (column >= 0) & (column < nx)
+        t = (column[crossed] - u[:-1][crossed]) / np.diff(u)[crossed]
+        column = column[crossed].astype(np.intp)
+        y_cross = y[:-1][crossed] + t * np.diff(y)[crossed]
+
+        # crossings above each point by rows below the crossings
+        y_grid = self.y0 + np.arange(ny) * self.h
+        rows = np.searchsorted(y_grid, y_cross)
+        counts = np.zeros((ny + 1, nx), dtype=np.intp)
+        np.add.at(counts, (rows, column), 1)
+        above = np.cumsum(counts[::-1], axis=0)[::-1][1:]
+        return above % 2 == 1
+
+    def _extend(self, y, width):
+        """Adds rows to the grid to keep the band inside of it."""
+        margin = width + 2 * self.h
+        ny, nx = self.phi.shape
+        below = int(np.ceil((self.y0 - (y.min() - margin)) / self.h))
+        above = int(np.ceil((y.max() + margin -
+                             (self.y0 + (ny - 1) * self.h)) / self.h))
+        below = max(below, 0)
+        above = max(above, 0)
+        if below == 0 and above == 0:
+            return
+
+        self.phi = np.vstack((np.full((below, nx), -width), self.phi,
+                              np.full((above, nx), width)))
+        self._mask = np.vstack((np.zeros((below, nx), dtype=bool),
+                                self._mask,
+                                np.zeros((above, nx), dtype=bool)))
+        self._nearest = np.full(self.phi.shape, np.inf)
+        self._band = self._band + below * nx
+        self.y0 -= below * self.h
+
+    def _distance(self, x, y, speed, width):
+        """
+        Calculates the distance to the surface in the narrow band.
+
+        The surface is a polyline, continued horizontally beyond its
+        ends, and the segments of closed contours (voids) found by
+        _extract(), which do not move. For each segment, the grid points
+        within width of it are found from its bounding box, so the work
+        grows with the number of points of the band.
+
+        Args:
+            x (array(float)): The x-coordinates of the polyline.
+            y (array(float)): The y-coordinates of the polyline.
+            speed (array(float)): Velocities at the points.
+            width (float): Half width of the band.
+
+        Returns:
+            band (array(int)): Flat indices of the grid points of the
+                band.
+            distance (array(float)): The distances of the points.
+            speed (array(float)): The velocity of the closest point of
+                the polyline, interpolated along its segment.
+        """
+        ny, nx = self.phi.shape
+        x = np.concatenate(([x[0] - width], x, [x[-1] + width]))
+        y = np.concatenate(([y[0]], y, [y[-1]]))
+        speed = np.concatenate(([speed[0]], speed, [speed[-1]]))
+        x, y, speed = _refine(x, y, self.h, speed)
+
+        # segments from (x, y) to (x + dx, y + dy)
+        void_xa, void_ya, void_xb, void_yb = self._voids
+        dx = np.concatenate((np.diff(x), void_xb - void_xa))
+        dy = np.concatenate((np.diff(y), void_yb - void_ya))
+        x = np.concatenate((x[:-1], void_xa))
+        y = np.concatenate((y[:-1], void_ya))
+        speed_a = np.concatenate((speed[:-1], np.zeros_like(void_xa)))
+        speed_b = np.concatenate((speed[1:], np.zeros_like(void_xa)))
+        length2 = np.maximum(dx**2 + dy**2, 1e-300)
+        i_lo = np.floor((np.minimum(x, x + dx) - width - self.x0)
+                        / self.h).astype(np.intp)
+        j_lo = np.floor((np.minimum(y, y + dy) - width - self.y0)
+                        / self.h).astype(np.intp)
+        size = int(np.ceil(2 * width / self.h)) + 3
+        offset_j, offset_i = np.divmod(np.arange(size * size), size)
+
+        # in chunks of segments to limit the memory
+        nearest = self._nearest.reshape(-1)
+        chunk = max(2**21 // (size * size), 1)
+        results = []
+        for start in range(0, len(dx), chunk):
+            s = slice(start, start + chunk)
+            i = i_lo[s, None] + offset_i
+            j = j_lo[s, None] + offset_j
+            px = self.x0 + i * self.h - x[s, None]
+            py = self.y0 + j * self.h - y[s, None]
+            t = np.clip((px * dx[s, None] + py * dy[s, None])
+                        / length2[s, None], 0., 1.)
+            d = np.hypot(px - t * dx[s, None], py - t * dy[s, None])
+            valid = ((d < width) & (i >= 0) & (i < nx) &
+                     (j >= 0) & (j < ny))
+            segment = np.broadcast_to(np.arange(len(dx))[s, None],
+                                      d.shape)[valid]
+            t = t[valid]
+            index = (j * nx + i)[valid]
+            d = d[valid]
+            np.minimum.at(nearest, index, d)
+            results.append((index, d, speed_a[segment] + t *
+                             (speed_b[segment] - speed_a[segment])))
+
+        # the closest segment of each point
+        index, d, speed = (np.concatenate(values) for values in zip(*results))
+        closest = d == nearest[index]
+        band, first = np.unique(index[closest], return_index=True)
+        distance = nearest[band]
+        nearest[band] = np.inf
+        return band, distance, speed[closest][first]
+
+    def _set_band(self, band, distance, width, reinit):
+        """
+        Sets the narrow band and the signed distance of its points.
+
+        Points leaving the band get +-width. Points entering it get their
+        signed distance, with reinit all points of the band.
+        """
+        phi = self.phi.reshape(-1)
+        mask = self._mask.reshape(-1)
+        was_in_band = mask[band]
+        mask[self._band] = False
+        mask[band] = True
+        leaving = self._band[~mask[self._band]]
+        phi[leaving] = np.copysign(width, phi[leaving])
+
+        signed = np.where(phi[band] < 0, -distance, distance)
+        if reinit:
+            phi[band] = signed
+        else:
+            phi[band[~was_in_band]] = signed[~was_in_band]
+        self._band = band
+
+    def _upwind(self, normal_speed, dtime, substeps):
+        """
+        Solves phi_t + F |grad phi| = 0 in the band (Godunov upwind).
+
+        Args:
+            normal_speed (array(float)): Velocity F at the points of the
+                band along the outward normal.
+            dtime (float): Size of a sub step.
+            substeps (int): Number of sub steps.
+        """
+        ny, nx = self.phi.shape
+        phi = self.phi.reshape(-1)
+        band = self._band
+        column = band % nx
+        row = band // nx
+        # at the ends of the grid, the gradient normal to it vanishes
+        left = band - (column > 0)
+        right = band + (column < nx - 1)
+        down = band - nx * (row > 0)
+        up = band + nx * (row < ny - 1)
+        positive = np.maximum(normal_speed, 0.) * dtime
+        negative = np.minimum(normal_speed, 0.) * dtime
+
+        for _ in range(substeps):
+            center = phi[band]
+            dmx = (center - phi[left]) / self.h
+            dpx = (phi[right] - center) / self.h
+            dmy = (center - phi[down]) / self.h
+            dpy = (phi[up] - center) / self.h
+            grad_plus = np.sqrt(np.maximum(dmx, 0)**2 +
+                                np.minimum(dpx, 0)**2 +
+                                np.maximum(dmy, 0)**2 +
+                                np.minimum(dpy, 0)**2)
+            grad_minus = np.sqrt(np.minimum(dmx, 0)**2 +
+                                 np.maximum(dpx, 0)**2 +
+                                 np.minimum(dmy, 0)**2 +
+                                 np.maximum(dpy, 0)**2)
+            phi[band] = center - positive * grad_plus - negative * grad_minus
+
+    def _extract(self):
+        """
+        Extracts the contour phi = 0 from the left to the right end.
+
+        The cells of the band with corners inside and outside of the
+        material give segments between the crossings of their edges
+        (marching squares), which are chained starting at the highest
+        crossing of the left end with the material below. The segments
+        not in the chain (closed contours) are kept for _distance().
+
+        Returns:
+            Surface: The crossings of the contour with the grid lines,
+                from left to right.
+
+        Raises:
+            ValueError: No contour reaches from the left to the right.
+        """
+        ny, nx = self.phi.shape
+        phi = self.phi.reshape(-1)
+        horizontal = ny * (nx - 1)
+
+        cells = self._band[(self._band % nx < nx - 1) &
+                           (self._band // nx < ny - 1)]
+        corners = phi[np.stack((cells, cells + 1, cells + nx + 1,
+                                cells + nx))] < 0
+        case = (corners[0] * 1 + corners[1] * 2 + corners[2] * 4 +
+                corners[3] * 8)
+        mixed = (case > 0) & (case < 15)
+        cells, case = cells[mixed], case[mixed]
+        row, column = np.divmod(cells, nx)
+        # global ids of the edges: bottom, right, top, left
+        edges = np.stack((row * (nx - 1) + column,
+                          horizontal + cells + 1,
+                          (row + 1) * (nx - 1) + column,
+                          horizontal + cells))
+
+        # saddles: a center in the material connects the material corners
+        center = phi[np.stack((cells, cells + 1, cells + nx + 1,
+                               cells + nx))].mean(axis=0) < 0
+        saddle = (case == 5) | (case == 10)
+        separate_lower_right = saddle & ((case == 5) == center)
+        edge_a = np.where(separate_lower_right, 0, _EDGE_A[case])
+        edge_b = np.where(separate_lower_right, 1, _EDGE_B[case])
+        second_a = np.where(separate_lower_right, 2, 1)[saddle]
+        second_b = np.where(separate_lower_right, 3, 2)[saddle]
+        index = np.arange(len(cells))
+        saddle_index = index[saddle]
+        segments = np.concatenate((
+            np.stack((edges[edge_a, index], edges[edge_b, index]), axis=1),
+            np.stack((edges[second_a, saddle_index],
+                      edges[second_b, saddle_index]), axis=1)))
+
+        # start at the highest crossing of the left end, material below
+        left_end = (column == 0) & corners[0][mixed] & ~corners[3][mixed]
+        if not np.any(left_end):
+            raise ValueError('ERROR: no surface from the left to the right '
+                             'end of the level set grid!')
+        start = edges[3, left_end][np.argmax(row[left_end])]
+
+        neighbors = dict()
+        for k, (a, b) in enumerate(segments.tolist()):
+            neighbors.setdefault(a, []).append((k, b))
+            neighbors.setdefault(b, []).append((k, a))
+        chain = [start]
+        used = []
+        previous = -1
+        edge = start
+        while True:
+            following = [(k, b) for k, b in neighbors[edge] if k != previous]
+            if not following:
+                break
+            previous, edge = following[0]
+            chain.append(edge)
+            used.append(previous)
+        chain = np.array(chain)
+        if chain[-1] < horizontal or (chain[-1] - horizontal) % nx != nx - 1:
+            raise ValueError('ERROR: no surface from the left to the right '
+                             'end of the level set grid!')
+
+        voids = np.ones(len(segments), dtype=bool)
+        voids[used] = False
+        self._voids = (self._crossings(segments[voids, 0]) +
+                       self._crossings(segments[voids, 1]))
+
+        x, y = self._crossings(chain)
+        # crossings at grid points appear on several edges
+        keep = np.concatenate(([True], np.hypot(np.diff(x), np.diff(y))
+                               > 1e-9 * self.h))
+        return Surface(x[keep], y[keep])
+
+    def _crossings(self, edges):
+        """The points phi = 0 on edges (ids as in _extract())."""
+        ny, nx = self.phi.shape
+        phi = self.phi.reshape(-1)
+        horizontal = ny * (nx - 1)
+        is_vertical = edges >= horizontal
+        row, column = np.where(is_vertical,
+                               np.divmod(edges - horizontal, nx),
+                               np.divmod(edges, nx - 1))
+        first = row * nx + column
+        second = np.where(is_vertical, first + nx, first + 1)
+        # linear interpolation along the edge
+        t = phi[first] / (phi[first] - phi[second])
+        x = self.x0 + (column + np.where(is_vertical, 0., t)) * self.h
+        y = self.y0 + (row + np.where(is_vertical, t, 0.)) * self.h
+        return x, y
+
+
+def _refine(x, y, max_length, values=None):
+    """
+    Splits the segments of a polyline into pieces up to max_length.
+
+    Args:
+        x (array(float)): The x-coordinates of the polyline.
+        y (array(float)): The y-coordinates of the polyline.
+        max_length (float): Maximum length of a segment.
+        values (array(float)): Values at the points, interpolated
+            linearly (optional).
+
+    Returns:
+        The x- and y-coordinates (and the values) of the new points.
+    """
+    pieces = np.maximum(np.ceil(np.hypot(np.diff(x), np.diff(y))
+                                / max_length), 1).astype(np.intp)
+    segment = np.repeat(np.arange(len(pieces)), pieces)
+    t = (np.arange(len(segment)) -
+         np.repeat(np.cumsum(pieces) - pieces, pieces)) / pieces[segment]
+    arrays = [x, y] if values is None else [x, y, values]
+    return tuple(np.append(a[segment] + t * (a[segment + 1] - a[segment]),
+                           a[-1]) for a in arrays)
+
@@ -2,61 +2,78 @@
 Main script and function to run miniTopSim.
 """
 from . import parameters as par
-from minitopsim.advance import advance, timestep
-from minitopsim.io_surface import write_surface
-from work.Aufgabe9_initial.init_surface import init_surface
-from minitopsim.plot import plot
-from minitopsim.surface import Shadow_Error
-from time import process_time
-import minitopsim.beam as beam
+from minitopsim.checkpoint import read_checkpoint
+from minitopsim.simulation import Simulation
 
 import sys
 import os
 
-def minitopsim():
-    par.load_parameters(sys.argv[1])
-    
-    time = 0
-    tend = par.TOTAL_TIME
-    dt = timestep(par.TIME_STEP, time, tend)
-    filename = sys.argv[1].replace('.cfg', '')
+def minitopsim(cfg_file=None, restart=False, profile=False):
+    """
+    Runs a simulation (see Simulation) and plots the result.
 
-    # Initialize the surface
-    surface = init_surface()
+    Args:
+        cfg_file (str): The .cfg file of the simulation. If None, it is
+            taken from the command line (first argument, with an
+            optional .srf file to compare with as second argument and
+            the options --restart and --profile). sys.argv is not
+            changed.
+        restart (bool): Continue from the checkpoint of the simulation.
+        profile (bool): Run the simulation with cProfile and write the
+            statistics to <cfg>.prof (see pstats), and the timing report
+            (see TIMING_REPORT) to <cfg>.timing.json.
 
-    # Write and plot initial surface
-    if not write_surface(surface, time, filename + '.srf'):
-        exit()
+    Returns:
+        bool: False if a surface could not be written, True otherwise.
+    """
+    compare_file = None
+    if cfg_file is None:
+        # with --restart, the run is continued from the last checkpoint
+        restart = '--restart' in sys.argv
+        profile = '--profile' in sys.argv
+        args = [arg for arg in sys.argv[1:]
+                if arg not in ('--restart', '--profile')]
+        cfg_file = args[0]
+        if len(args) >= 2:
+            compare_file = args[1]
 
-    t_start = process_time()   
+    filename = cfg_file.replace('.cfg', '')
 
-    # initialize beam
-    beam.init()
+    if restart:
+        config, state = read_checkpoint(filename + '.chk', cfg_file)
+        print(f'Continuing from the checkpoint at {state["time"]}s.')
+    else:
+        config, state = par.read_config(cfg_file), None
+    if profile:
+        config = config.replace(TIMING_REPORT=True)
+    simulation = Simulation(config, filename, state)
+    srf_file = simulation.srf_file
+
+    success = False
     try:
-        while dt > 0:
-            surface, dt = advance(surface, dt)
-            time += dt
-            if not write_surface(surface, time, filename + '.srf'):
-                exit()
-            print(f'time = {time}, dt = {dt}')
-            dt = timestep(par.TIME_STEP, time, tend)
-    except Shadow_Error as err_msg:
-        print(f"A Shadow_Error occurred: {err_msg}")
-        print(f"Simulation was stopped at {time}s.")
-        print(f"Please change xmin/xmax parameters and try again.")
+        if profile:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            success = profiler.runcall(simulation.run)
+            profiler.dump_stats(filename + '.prof')
+            print(f'Profile written to {filename}.prof, timing report to '
+                  f'{simulation.timing_file}')
+        else:
+            success = simulation.run()
     finally:
-        t_stop = process_time()
-        print("Calculation time:", t_stop - t_start, "s")
-        
-        if par.PLOT_SURFACE:
+        if config.PLOT_SURFACE:
+            # matplotlib is only imported for plotting
+            from minitopsim.plot import plot
+
             # Check if .srf_save is in directory
             if os.path.isfile(filename + '.srf_save'):
                 print(f".srf_save file is found and used")
-                plot(filename + '.srf', filename + '.srf_save')
+                plot(srf_file, filename + '.srf_save')
             # Check if other .srf is specified
-            elif len(sys.argv) >= 3:
-                plot(filename + '.srf', sys.argv[2])
+            elif compare_file is not None:
+                plot(srf_file, compare_file)
             else:
-                plot(filename + '.srf')
+                plot(srf_file)
 
-    return True
\ No newline at end of file
+    return success
@@ -1,8 +1,9 @@
 """Read config from file and propagate data as python variables.
 
 When the module is imported, the configuration is automatically loaded
-from parameters.db. load_parameters() MUST be called before variables
-are accessed.
+from parameters.db (parsed once and cached in __pycache__, with the
+conditions compiled). load_parameters() MUST be called before variables
+are accessed. Values in .cfg files have to be Python literals.
 Configuration variables can be accessed using 'parameters.<name>'.
 
 Variables:
@@ -13,20 +14,44 @@ Functions:
         Otherwise default values are used instead of values from the
         .cfg file (this may lead to wrong data, e.g. when only a type
         is specified as default value).
+    load_defaults(): Resets all variables to the default values.
+    defaults(): Returns the default values as a Config.
+    read_config(): Reads the parameters of a .cfg file into a Config.
+    activate(): Makes a Config the parameters of the current context.
+    current(): Returns the parameters of the current context.
 """
+import builtins
+import contextvars
+import marshal
 import os
+import sys
+import types
 
 import configparser
 
+# schema of parameters.db: section, default value and condition (source
+# and compiled) of each parameter
 _categories = dict()
+_defaults = dict()
+_conditions = dict()
 
+# data types allowed instead of a default value (mandatory parameters)
+_TYPES = {'bool': bool, 'float': float, 'int': int, 'str': str}
 
-def _check_and_set_attributes(new_values):
+# names usable in conditions besides the parameters
+_CONDITION_GLOBALS = {'__builtins__': {
+    name: getattr(builtins, name) for name in ('abs', 'len', 'max', 'min')}}
+
+
+def _check_and_set_attributes(new_values, values=None):
     """Check if new attributes meet conditions and set variables if so.
 
     Args:
         new_values(dict): the new values, which should be applied.
+        values(dict): the parameters to set, the module variables if None.
     """
+    if values is None:
+        values = globals()
     type_err = False
     val_err = False
     err_msg = ''
@@ -36,38 +61,37 @@ def _check_and_set_attributes(new_values):
             continue
 
         # check data type
-        if type(value) is int and type(globals()[key]) is float:
+        if type(value) is int and type(values[key]) is float:
             # original data type was float, new is int -> cast to float
             value = float(value)
-        elif type(globals()[key]) is type:
-            if type(value) is int and globals()[key] is float:
+        elif type(values[key]) is type:
+            if type(value) is int and values[key] is float:
                 # data type definition was float, new is int -> cast to float
                 value = float(value)
-            elif type(value) is not globals()[key]:
+            elif type(value) is not values[key]:
                 # data type was specified without default value and new data
                 # type is wrong
                 err_msg = f'{err_msg}ERROR: type of {key} '\
                     f'({type(value).__name__}) does '\
-                    f'not match {globals()[key]}!\n'
+                    f'not match {values[key]}!\n'
                 type_err = True
                 continue
-        elif type(value) is not type(globals()[key]):
+        elif type(value) is not type(values[key]):
             # new data type does not match original data type
             err_msg = f'{err_msg}ERROR: type of {key} '\
                 f'({type(value).__name__}) does not '\
-                f'match {type(globals()[key]).__name__}!'
+                f'match {type(values[key]).__name__}!'
             type_err = True
             continue
 
         # check condition
-        section = _categories[key]
-        condition = eval(_def_config[section].get(key))[1]
+        condition, code = _conditions[key]
         # has to be set before, otherwise condition is checked for default
         # value
-        globals()[key] = value
+        values[key] = value
 
         # if condition is None, eval(condition) is not executed
-        if condition is not None and not eval(condition):
+        if code is not None and not eval(code, _CONDITION_GLOBALS, values):
             err_msg = f'{err_msg}ERROR: Attribute {key} '\
                 f'({new_values[key]}) doesn\'t meet '\
                 f'condition {condition}!'
@@ -82,7 +106,7 @@ def _check_and_set_attributes(new_values):
         raise ValueError(err_msg)
 
     # raise an error if a variable still is not assigned
-    for key, value in globals().items():
+    for key, value in values.items():
         if key.isupper() and not key.startswith("_") and type(value) is type:
             raise ValueError(f'Attribute {key} is not assigned')
 
@@ -94,6 +118,30 @@ def load_parameters(file: object) -> object:
         file (string): the .cfg to load the configuration from. May be
             relative to minitopsim directory or absolute.
     """
+    _check_and_set_attributes(_read_cfg(file))
+
+
+def read_config(file, base=None):
+    """Read a Config from file, without changing the module variables.
+
+    The values are checked like in load_parameters().
+
+    Args:
+        file (string): the .cfg to load the configuration from. May be
+            relative to minitopsim directory or absolute.
+        base (Config): the values of parameters not in the file, the
+            defaults from parameters.db if None.
+
+    Returns:
+        Config: the parameters.
+    """
+    values = dict((defaults() if base is None else base)._values)
+    _check_and_set_attributes(_read_cfg(file), values)
+    return Config(values)
+
+
+def _read_cfg(file):
+    """Read the values of all parameters defined in a .cfg file."""
     # join directory if file is not absolute path
     if not os.path.isabs(file):
         file = os.path.join(os.getcwd(), file)
@@ -109,24 +157,203 @@ def load_parameters(file: object) -> object:
         for attribute in cfg_config[section]:
             attribute = attribute.upper()
 
-            if attribute in globals():
-                new_values[attribute] = eval(cfg_config[section]
-                                             .get(attribute))
+            if attribute in _categories:
+                new_values[attribute] = _literal(
+                    attribute, cfg_config[section].get(attribute))
             else:
                 raise KeyError(f'Attribute {attribute} not defined in '
                                f'default values!')
 
-    _check_and_set_attributes(new_values)
+    return new_values
+
+
+def _literal(key, text):
+    """Return the value of a .cfg entry, which has to be a Python literal."""
+    import ast  # only needed when reading files, not for importing
+
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        raise ValueError(f'ERROR: value of {key} ({text}) is no Python '
+                         f'literal!') from None
+
+
+def load_defaults():
+    """Set all parameters to the default values from parameters.db.
+
+    Used to start from a clean state when several simulations run one
+    after another in the same process.
+    """
+    globals().update(_defaults)
+
+
+def defaults():
+    """Return the default values from parameters.db as a Config.
+
+    Parameters without default value hold their data type.
+    """
+    return Config(_defaults)
+
+
+def _load_schema():
+    """Fill the schema from parameters.db.
+
+    The parsed schema, with the conditions compiled, is cached in
+    __pycache__ and only read again from parameters.db if that changed.
+    """
+    stat = os.stat(_file)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    try:
+        with open(_cache_file, 'rb') as file:
+            cache_stamp, entries = marshal.load(file)
+        if cache_stamp != stamp:
+            raise ValueError('parameters.db changed')
+    except (OSError, ValueError, EOFError, TypeError):
+        entries = _parse_schema()
+        # no cache is written if no .pyc files are written either
+        if not sys.dont_write_bytecode:
+            _save_schema(stamp, entries)
+
+    for name, section, default, is_type, condition, code in entries:
+        _categories[name] = section
+        _defaults[name] = _TYPES[default] if is_type else default
+        _conditions[name] = (condition, code)
+
+
+def _save_schema(stamp, entries):
+    """Write the parsed schema to the cache file, if possible."""
+    try:
+        os.makedirs(os.path.dirname(_cache_file), exist_ok=True)
+        with open(_cache_file + '.tmp', 'wb') as file:
+            marshal.dump((stamp, entries), file)
+        os.replace(_cache_file + '.tmp', _cache_file)
+    except OSError:
+        pass  # e.g. read-only installation
 
 
-# load default config from file
+def _parse_schema():
+    """Parse parameters.db without evaluating it.
+
+    Returns:
+        list(tuple): name, section, default value (name of the data type
+            for mandatory parameters), whether it is a data type, and the
+            condition as source and compiled code (None if there is none).
+    """
+    import ast
+
+    def_config = configparser.ConfigParser()
+    def_config.read(_file)
+
+    entries = []
+    for section in def_config.sections():
+        for attribute in def_config[section]:
+            name = attribute.upper()
+            default, condition = ast.parse(def_config[section][attribute],
+                                           mode='eval').body.elts[:2]
+            is_type = (isinstance(default, ast.Name) and
+                       default.id in _TYPES)
+            default = default.id if is_type else ast.literal_eval(default)
+            condition = ast.literal_eval(condition)
+            code = (None if condition is None else
+                    compile(condition, f'<{name} condition>', 'eval'))
+            entries.append((name, section, default, is_type, condition,
+                            code))
+    return entries
+
+
+class Config:
+    """Immutable set of parameters.
+
+    The parameters are attributes named like the module variables, e.g.
+    config.TIME_STEP. While a Config is active (see activate()), the
+    module variables return its values, so code reading par.TIME_STEP
+    works unchanged with several Configs in one process.
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        """Create a Config from a dict of all parameter values."""
+        object.__setattr__(self, '_values', types.MappingProxyType(dict(values)))
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(f'Attribute {name} not defined in '
+                                 f'default values!') from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Config is immutable, use replace()')
+
+    def __eq__(self, other):
+        return isinstance(other, Config) and self._values == other._values
+
+    def __repr__(self):
+        return f'Config({dict(self._values)!r})'
+
+    def as_dict(self):
+        """Return the values as a new dict."""
+        return dict(self._values)
+
+    def replace(self, **changes):
+        """Return a copy with some values changed (and checked)."""
+        values = dict(self._values)
+        _check_and_set_attributes(
+            {key.upper(): value for key, value in changes.items()}, values)
+        return Config(values)
+
+
+def activate(config):
+    """Make config the parameters of the current context.
+
+    The context is the current thread, or the contextvars.Context a
+    function runs in (see contextvars.Context.run()).
+
+    Args:
+        config (Config): the parameters, None to use the module variables
+            again.
+    """
+    _active.set(config)
+
+
+def current():
+    """Return the parameters of the current context as a Config."""
+    config = _active.get()
+    if config is not None:
+        return config
+    return Config({key: globals()[key] for key in _categories})
+
+
+class _ParameterModule(types.ModuleType):
+    """Module looking up the parameters in the active Config first."""
+
+    def __getattribute__(self, name):
+        config = _active.get()
+        if config is not None and name in config._values:
+            return config._values[name]
+        try:
+            # faster than the attribute lookup of the module
+            return _variables[name]
+        except KeyError:
+            return super().__getattribute__(name)
+
+    def __setattr__(self, name, value):
+        if _active.get() is not None and name in _categories:
+            raise AttributeError('parameters are read-only while a Config '
+                                 'is active')
+        super().__setattr__(name, value)
+
+
+_active = contextvars.ContextVar('config', default=None)
+_variables = globals()
+
 _file = os.path.join(os.path.dirname(__file__), "parameters.db")
-_def_config = configparser.ConfigParser()
-_def_config.read(_file)
+_cache_file = os.path.join(os.path.dirname(__file__), '__pycache__',
+                           f'parameters.db.{sys.implementation.cache_tag}'
+                           f'.schema')
 
 # get all attributes defined in the db file
-for _section in _def_config.sections():
-    for _attribute in _def_config[_section]:
-        _attribute = _attribute.upper()
-        _categories[_attribute] = _section
-        globals()[_attribute] = eval(_def_config[_section].get(_attribute))[0]
+_load_schema()
+load_defaults()
+
+sys.modules[__name__].__class__ = _ParameterModule
@@ -14,7 +14,7 @@ Functions:
 import matplotlib.pyplot as plt
 import os
 import matplotlib as mpl
-from minitopsim.io_surface import read_surface
+from minitopsim.io_surface import read_trajectory
 
 
 def plot(srf_file1, srf_file2=None):
@@ -88,21 +88,10 @@ class Surface_Plotter:
         self.update_plot()
 
     def read_surfaces(self):
-        with open(self.srf_file1, 'r') as file:
-            self.surface_data1 = []  # Clear existing surface data
-            while True:
-                current_surface, current_time = read_surface(file)
-                if current_surface is None or current_time is None:
-                    break
-                self.surface_data1.append((current_surface, current_time))
+        # .srf and binary trajectory files are both accepted
+        self.surface_data1 = read_trajectory(self.srf_file1)
         if self.srf_file2:
-            with open(self.srf_file2, 'r') as file:
-                self.surface_data2 = []  # Clear existing surface data
-                while True:
-                    current_surface, current_time = read_surface(file)
-                    if current_surface is None or current_time is None:
-                        break
-                    self.surface_data2.append((current_surface, current_time))
+            self.surface_data2 = read_trajectory(self.srf_file2)
 
     def on_key_press(self, event):
         """
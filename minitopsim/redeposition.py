@@ -0,0 +1,223 @@
+"""Module used for calculating the redeposition flux."""
+
+import contextvars
+
+import numpy as np
+from . import parameters as par
+from . import timing
+
+# arrays of the size of a view factor block held at the same time in
+# Surface.view_factor()
+_ARRAYS_PER_BLOCK = 6
+
+# floating point type of the view factor by VIEW_FACTOR_PRECISION
+_DTYPES = {'double': np.dtype(np.float64), 'single': np.dtype(np.float32),
+           'mixed': np.dtype(np.float32)}
+
+# view factor cache of the current context (see parameters.activate())
+_vf_cache = contextvars.ContextVar('vf_cache', default=None)
+
+
+def init():
+    """Initialize the view factor cache based on user-defined parameters.
+
+    The cache is only created if VIEW_FACTOR_CACHE is set, otherwise the
+    view factor is recalculated block by block for every flux.
+    """
+    if par.VIEW_FACTOR_CACHE:
+        _vf_cache.set(ViewFactorCache(par.VIEW_FACTOR_TOLERANCE,
+                                      _DTYPES[par.VIEW_FACTOR_PRECISION]))
+    else:
+        _vf_cache.set(None)
+
+
+def get_cache():
+    """Return the view factor cache of the current context (or None)."""
+    return _vf_cache.get()
+
+
+def get_redep_flux(surface, F_sput):
+    """Calculates the redeposition flux F_redep = VF @ F_sput.
+
+    Without cache, the view factor matrix VF is never held as a whole.
+    It is calculated in blocks of rows, with the block size chosen such
+    that the memory used for one block stays below VIEW_FACTOR_MEMORY.
+    If VISIBILITY is set, only points with a free line of sight
+    contribute. VF is calculated in float32 if VIEW_FACTOR_PRECISION is
+    'single' or 'mixed' (see _product() for the sums).
+
+    Args:
+        surface (Surface): surface for which to calculate the flux.
+        F_sput (array-like): sputter flux at the points of the surface.
+
+    Returns:
+        array-like: redeposition flux at the points of the surface.
+    """
+    vf_cache = _vf_cache.get()
+    if vf_cache is not None:
+        with timing.stage('view_factor'):
+            view_factor = vf_cache.view_factor(surface, par.VISIBILITY)
+        if view_factor.dtype == np.float64:
+            return view_factor @ F_sput
+        # in blocks, the float64 copies for 'mixed' stay small
+        F_redep = np.zeros(len(surface.x))
+        for rows in _row_blocks(*view_factor.shape):
+            F_redep[rows] = _product(view_factor[rows], F_sput)
+        return F_redep
+
+    n_nodes = len(surface.x)
+    F_redep = np.zeros(n_nodes)
+    dtype = _DTYPES[par.VIEW_FACTOR_PRECISION]
+
+    for rows in _row_blocks(n_nodes, n_nodes):
+        with timing.stage('view_factor'):
+            view_factor = surface.view_factor(rows,
+                                              visibility=par.VISIBILITY,
+                                              dtype=dtype)
+        F_redep[rows] = _product(view_factor, F_sput)
+
+    return F_redep
+
+
+def _product(view_factor, F_sput):
+    """Calculates view_factor @ F_sput with VIEW_FACTOR_PRECISION.
+
+    With 'single', F_sput is rounded to float32 and the products are
+    summed in float32. Otherwise they are summed in float64, a float32
+    view factor ('mixed') is converted to float64 for that.
+
+    Args:
+        view_factor (array-like): rows of the view factor matrix.
+        F_sput (array-like): sputter flux at the points of the surface.
+
+    Returns:
+        array-like: redeposition flux at the points of the rows (float64).
+    """
+    if par.VIEW_FACTOR_PRECISION == 'single':
+        return (view_factor @ F_sput.astype(np.float32)).astype(np.float64)
+    return view_factor @ F_sput
+
+
+class ViewFactorCache:
+    """
+    Cache for the view factor matrix between time steps.
+
+    The matrix is reused as long as the number of points does not
+    change. Only the rows and columns of points that moved by more than
+    the tolerance since their last calculation, and of their neighbours
+    (whose normal vectors and lengths depend on them), are recalculated.
+    Changes of the line of sight caused by moving points are not
+    detected for the other points.
+
+    Attributes:
+        tolerance (float): Displacement (nm) up to which cached rows and
+            columns are reused.
+        dtype (dtype): Floating point type of the matrix.
+        x (array(float)): x-coordinates at the last calculation.
+        y (array(float)): y-coordinates at the last calculation.
+        f (array(float)): The cached view factor matrix.
+        hits (int): Number of calls returning the cached matrix as is.
+        misses (int): Number of calls calculating the whole matrix.
+        updates (int): Number of calls recalculating rows and columns.
+        updated_nodes (int): Total number of recalculated rows/columns.
+    """
+    def __init__(self, tolerance=0., dtype=np.float64):
+        """
+        Initializes an empty cache.
+
+        Args:
+            tolerance (float): Displacement (nm) up to which cached rows
+                and columns are reused.
+            dtype (dtype): Floating point type of the matrix.
+        """
+        self.tolerance = tolerance
+        self.dtype = np.dtype(dtype)
+        self.x = None
+        self.y = None
+        self.f = None
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.updated_nodes = 0
+
+    def __str__(self):
+        return (f'{self.hits} hits, {self.misses} misses, '
+                f'{self.updates} updates ({self.updated_nodes} nodes)')
+
+    def view_factor(self, surface, visibility=False):
+        """
+        Returns the view factor matrix, reusing the cached one if possible.
+
+        Args:
+            surface (Surface): surface for which to return the matrix.
+            visibility (bool): Passed on to Surface.view_factor().
+
+        Returns:
+            array(float): The view factor matrix. It is owned by the
+                cache and must not be modified.
+        """
+        n_nodes = len(surface.x)
+        if self.f is None or self.f.shape[0] != n_nodes:
+            self._calculate(surface, visibility)
+            return self.f
+
+        moved = (np.hypot(surface.x - self.x, surface.y - self.y)
+                 > self.tolerance)
+        if not np.any(moved):
+            self.hits += 1
+            return self.f
+
+        nodes = moved.copy()
+        nodes[1:] |= moved[:-1]
+        nodes[:-1] |= moved[1:]
+        nodes = np.nonzero(nodes)[0]
+
+        if 2 * nodes.size > n_nodes:
+            # cheaper to calculate everything
+            self._calculate(surface, visibility)
+            return self.f
+
+        for block in _row_blocks(nodes.size, n_nodes):
+            rows = nodes[block]
+            self.f[rows, :] = surface.view_factor(rows,
+                                                  visibility=visibility,
+                                                  dtype=self.dtype)
+            self.f[:, rows] = surface.view_factor(columns=rows,
+                                                  visibility=visibility,
+                                                  dtype=self.dtype)
+        self.x[nodes] = surface.x[nodes]
+        self.y[nodes] = surface.y[nodes]
+        self.updates += 1
+        self.updated_nodes += nodes.size
+
+        return self.f
+
+    def _calculate(self, surface, visibility):
+        """Calculates the whole matrix block by block."""
+        n_nodes = len(surface.x)
+        self.f = np.zeros((n_nodes, n_nodes), dtype=self.dtype)
+        for rows in _row_blocks(n_nodes, n_nodes):
+            self.f[rows] = surface.view_factor(rows, visibility=visibility,
+                                               dtype=self.dtype)
+        self.x = np.array(surface.x, dtype=float)
+        self.y = np.array(surface.y, dtype=float)
+        self.misses += 1
+
+
+def _row_blocks(n_rows, n_columns):
+    """Splits the rows of an n_rows x n_columns matrix into blocks.
+
+    Args:
+        n_rows (int): number of rows of the matrix.
+        n_columns (int): number of columns of the matrix.
+
+    Returns:
+        list(slice): blocks of rows fitting into VIEW_FACTOR_MEMORY.
+    """
+    block_bytes = par.VIEW_FACTOR_MEMORY * 2**20
+    itemsize = _DTYPES[par.VIEW_FACTOR_PRECISION].itemsize
+    block_rows = int(block_bytes // (_ARRAYS_PER_BLOCK * itemsize *
+                                     max(n_columns, 1)))
+    block_rows = max(block_rows, 1)
+    return [slice(start, start + block_rows)
+            for start in range(0, n_rows, block_rows)]
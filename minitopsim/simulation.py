@@ -0,0 +1,233 @@
+"""
+Module for running a simulation with its own parameters.
+
+Classes:
+    Simulation: A simulation with its own parameters, surface, beam and
+        output.
+"""
+import contextvars
+from time import process_time, monotonic
+
+from . import parameters as par
+from . import advance as adv
+from minitopsim.checkpoint import write_checkpoint
+from minitopsim.io_surface import (SurfaceWriter, TrajectoryWriter,
+                                   truncate_trajectory)
+from minitopsim.levelset import LevelSet
+from minitopsim.surface import Shadow_Error
+from work.Aufgabe9_initial.init_surface import init_surface
+import minitopsim.beam as beam
+import minitopsim.redeposition as redep
+import minitopsim.timing as timing
+
+
+class Simulation:
+    """
+    A simulation with its own parameters, surface, beam and output.
+
+    The active parameters (see parameters.activate()), the beam, the
+    view factor cache, the stage timers and the state of the time step
+    control of a simulation live in its own contextvars.Context, in which all its
+    methods run. The module variables of minitopsim.parameters are not
+    used. Several simulations can thus exist in one process, be advanced
+    alternately or run in different threads (each simulation in one
+    thread at a time).
+
+    With SURFACE_ENGINE "level set", the surface is moved as level set
+    (see LevelSet), surface is the contour extracted from it. A restart
+    initializes the level set from the surface of the checkpoint.
+
+    Attributes:
+        config (Config): The parameters.
+        filename (str): The name of the output files without extension
+            (.srf or .srfb for the surfaces, .chk for checkpoints).
+        surface (Surface): The current surface.
+        time (float): The simulation time.
+        step (int): The number of time steps done.
+        log (file): Where messages are printed to (None: sys.stdout).
+        timers (StageTimers): The times of the stages of all runs.
+    """
+    def __init__(self, config, filename, state=None, log=None):
+        """
+        Initializes the surface (or the state of a checkpoint), the beam
+        and the view factor cache.
+
+        Args:
+            config (Config): The parameters.
+            filename (str): The name of the output files without
+                extension.
+            state (dict): State to continue from (see read_checkpoint()).
+                Surfaces written after its time are removed from the
+                output file, new ones are appended.
+            log (file): Where messages are printed to (None: sys.stdout).
+        """
+        self.config = config
+        self.filename = filename
+        self.log = log
+        self._context = contextvars.Context()
+        self._context.run(self._init, state)
+
+    @property
+    def srf_file(self):
+        """str: The output file of the surfaces."""
+        if self.config.OUTPUT_FORMAT == 'binary':
+            return self.filename + '.srfb'
+        return self.filename + '.srf'
+
+    @property
+    def timing_file(self):
+        """str: The JSON file of the timing report (see TIMING_REPORT)."""
+        return self.filename + '.timing.json'
+
+    def run(self):
+        """
+        Advances the surface up to TOTAL_TIME.
+
+        The surfaces are written to srf_file (see OUTPUT_STRIDE,
+        OUTPUT_INTERVAL), the last one always. If CHECKPOINT_INTERVAL is
+        set, checkpoints are written to filename.chk. A Shadow_Error
+        stops the simulation at the last surface. If TIMING_REPORT is
+        set, the times of the stages are printed at the end and written
+        to timing_file.
+
+        Returns:
+            bool: False if a surface could not be written, True otherwise.
+        """
+        return self._context.run(self._run)
+
+    def _init(self, state):
+        """Initializes the state in the context of the simulation."""
+        par.activate(self.config)
+        beam.init()
+        redep.init()
+        self.timers = timing.init()
+
+        self._restart = state is not None
+        if self._restart:
+            self.surface = state['surface']
+            self.time = state['time']
+            self.step = state['step']
+            self._dt_next = state['dt']
+            self._t_output = state['t_output']
+            adv._error_timestep.set(state['error_timestep'])
+        else:
+            self.surface = init_surface()
+            self.time = 0
+            self.step = 0
+            self._dt_next = par.TIME_STEP
+            self._t_output = par.OUTPUT_INTERVAL
+
+        self._level_set = None
+        if par.SURFACE_ENGINE == 'level set':
+            self._level_set = LevelSet(
+                self.surface, par.XMIN, par.XMAX,
+                par.LEVEL_SET_SPACING or par.DELTA_X,
+                band=par.LEVEL_SET_BAND, reinit=par.LEVEL_SET_REINIT)
+
+    def _run(self):
+        """Runs the simulation in its context."""
+        with timing.stage('run'):
+            success = self._advance()
+        if par.TIMING_REPORT:
+            print(self.timers, file=self.log)
+            self.timers.write_report(
+                self.timing_file, filename=self.filename, time=self.time,
+                steps=self.step, points=self.surface.x.size,
+                success=success)
+        return success
+
+    def _advance(self):
+        """Advances the surface up to TOTAL_TIME."""
+        chk_file = self.filename + '.chk'
+        srf_file = self.srf_file
+        tend = par.TOTAL_TIME
+        dt = adv.timestep(self._dt_next, self.time, tend)
+
+        # Open the output file, surfaces after the checkpoint are replaced
+        if self._restart:
+            truncate_trajectory(srf_file, self.time)
+        if par.OUTPUT_FORMAT == 'binary':
+            writer = TrajectoryWriter(srf_file, append=self._restart)
+        else:
+            writer = SurfaceWriter(srf_file, int(par.OUTPUT_BUFFER * 2**20),
+                                   append=self._restart)
+
+        # Write initial surface
+        if not self._restart and not self._write(writer):
+            writer.close()
+            return False
+        # later runs continue from here
+        self._restart = True
+        written = True
+        success = True
+
+        t_start = process_time()
+        t_checkpoint = monotonic()
+        try:
+            while dt > 0:
+                with timing.stage('advance'):
+                    self.surface, dt = self._step(dt)
+                self.time += dt
+                self.step += 1
+                written = False
+                if par.OUTPUT_INTERVAL > 0:
+                    # tolerance for the rounding of the summed up time steps
+                    tolerance = 1e-9 * par.OUTPUT_INTERVAL
+                    output = self.time >= self._t_output - tolerance
+                    while self._t_output <= self.time + tolerance:
+                        self._t_output += par.OUTPUT_INTERVAL
+                else:
+                    output = self.step % par.OUTPUT_STRIDE == 0
+                if output:
+                    if not self._write(writer):
+                        success = False
+                        break
+                    written = True
+                print(f'time = {self.time}, dt = {dt}', file=self.log)
+                self._dt_next = adv.next_timestep(dt)
+                if (par.CHECKPOINT_INTERVAL > 0 and monotonic() -
+                        t_checkpoint >= par.CHECKPOINT_INTERVAL):
+                    # the output file has to contain all surfaces up to now
+                    writer.flush()
+                    self._write_checkpoint(chk_file)
+                    t_checkpoint = monotonic()
+                dt = adv.timestep(self._dt_next, self.time, tend)
+        except Shadow_Error as err_msg:
+            print(f"A Shadow_Error occurred: {err_msg}", file=self.log)
+            print(f"Simulation was stopped at {self.time}s.", file=self.log)
+            print(f"Please change xmin/xmax parameters and try again.",
+                  file=self.log)
+        finally:
+            # the final surface is always written
+            if not written:
+                self._write(writer)
+            with timing.stage('output'):
+                writer.close()
+            if par.CHECKPOINT_INTERVAL > 0:
+                self._write_checkpoint(chk_file)
+            t_stop = process_time()
+            print("Calculation time:", t_stop - t_start, "s", file=self.log)
+            if par.TIMING_REPORT and redep.get_cache() is not None:
+                print("View factor cache:", redep.get_cache(), file=self.log)
+            if par.TIMING_REPORT and beam.get_flux_cache() is not None:
+                print("Beam flux cache:", beam.get_flux_cache(),
+                      file=self.log)
+
+        return success
+
+    def _step(self, dt):
+        """Advances the surface (or the level set) by a time step."""
+        if self._level_set is not None:
+            return self._level_set.advance(dt), dt
+        return adv.advance(self.surface, dt)
+
+    def _write(self, writer):
+        """Writes the current surface in the stage 'output'."""
+        with timing.stage('output'):
+            return writer.write(self.surface, self.time)
+
+    def _write_checkpoint(self, chk_file):
+        """Writes the current state to the checkpoint file."""
+        with timing.stage('checkpoint'):
+            write_checkpoint(chk_file, self.surface, self.time,
+                             self._dt_next, self.step, self._t_output)
@@ -1,22 +1,128 @@
-"""Module used for calculating sputtering yield."""
+"""Module used for calculating sputtering yield.
+
+The yield is either calculated with the Yamamura function or looked up
+in a table of yields over the tilt angle (SPUTTER_YIELD_TYPE), by
+default minitopsim/tables/syield.dat.
+"""
+
+import os
+from functools import lru_cache
 
 import numpy as np
 from . import parameters as par
 
+# table shipped with miniTopSim, used if SPUTTER_YIELD_FILE is empty
+DEFAULT_TABLE = os.path.join(os.path.dirname(__file__), 'tables',
+                             'syield.dat')
+
+# number of points of the interpolation grid over cos(theta) in [0, 1]
+GRID_POINTS = 4001
+
 def get_sputter_yield(cos_theta):
+    """Calculates the sputtering yield with the model SPUTTER_YIELD_TYPE.
+
+    Points with cos_theta <= 0 (grazing incidence or facing away from the
+    beam) have no yield.
+
+    Args:
+        cos_theta (array-like): cosine of tilt angle theta
+
+    Returns:
+        array-like: the sputtering yield
+    """
+    if par.SPUTTER_YIELD_TYPE == 'Table':
+        table = load_table(par.SPUTTER_YIELD_FILE or DEFAULT_TABLE)
+        return table(cos_theta)
+    return get_yamamura_yield(cos_theta)
+
+def get_yamamura_yield(cos_theta, y0=None, f=None, b=None):
     """Calculates Sputtering Yield according to Yamamura Function.
 
     Evaluates the yamamura function using the parameters from parameters.py.
+    inf and NaN at cos_theta <= 0 are replaced (by np.nan_to_num()).
 
     Args:
         cos_theta (array-like): cosine of tilt angle theta
+        y0, f, b (array-like): coefficients broadcast against cos_theta
+            (default: SPUTTER_YIELD_0, SPUTTER_YIELD_F, SPUTTER_YIELD_B)
 
     Returns:
         array-like: value of the yamamura function
     """
-    y0 = par.SPUTTER_YIELD_0
-    f = par.SPUTTER_YIELD_F
-    b = par.SPUTTER_YIELD_B
+    y0 = par.SPUTTER_YIELD_0 if y0 is None else y0
+    f = par.SPUTTER_YIELD_F if f is None else f
+    b = par.SPUTTER_YIELD_B if b is None else b
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        sputter_yield = y0 * cos_theta**(-f) * np.exp(b*(1-1/cos_theta))
+    return np.nan_to_num(sputter_yield)    #prevents wierd behavoir from loops
+
+@lru_cache(maxsize=None)
+def load_table(filename):
+    """Loads a yield table (once per file).
+
+    Args:
+        filename (str): file with the tilt angle (degrees) and the yield in
+            the first two columns, lines starting with # are comments.
+
+    Returns:
+        YieldTable: the table interpolated on GRID_POINTS.
+    """
+    data = np.loadtxt(filename, ndmin=2)
+    return YieldTable(data[:, 0], data[:, 1])
+
+class YieldTable:
+    """Sputtering yield looked up from a table over the tilt angle.
+
+    The table is interpolated once onto an equidistant grid over
+    cos(theta), from which the yield is interpolated linearly. If the
+    table ends before 90 degrees, the yield goes to 0 there. At 90
+    degrees and beyond (cos(theta) <= 0), the yield is 0.
+
+    Attributes:
+        tilt (array(float)): tilt angles (degrees) of the table.
+        sputter_yield (array(float)): the yields at the tilt angles.
+    """
+    def __init__(self, tilt, sputter_yield, points=GRID_POINTS):
+        """Builds the interpolation grid.
+
+        Args:
+            tilt (array-like): increasing tilt angles (degrees) in [0, 90].
+            sputter_yield (array-like): the yields at the tilt angles.
+            points (int): number of points of the grid over cos(theta).
+
+        Raises:
+            ValueError: the tilt angles are not increasing or not in
+                [0, 90].
+        """
+        tilt = np.asarray(tilt, dtype=float)
+        sputter_yield = np.asarray(sputter_yield, dtype=float)
+        if np.any(np.diff(tilt) <= 0) or tilt[0] < 0 or tilt[-1] > 90:
+            raise ValueError('ERROR: tilt angles of the yield table have to '
+                             'increase from 0 to 90 degrees!')
+        if tilt[-1] < 90:
+            tilt = np.append(tilt, 90.)
+            sputter_yield = np.append(sputter_yield, 0.)
+        self.tilt = tilt
+        self.sputter_yield = sputter_yield
+
+        cos_grid = np.linspace(0., 1., points)
+        self._values = np.interp(np.degrees(np.arccos(cos_grid)),
+                                 tilt, sputter_yield)
+        self._slopes = np.append(np.diff(self._values), 0.)
+        self._scale = points - 1
+
+    def __call__(self, cos_theta):
+        """Looks up the yield.
+
+        Args:
+            cos_theta (array-like): cosine of tilt angle theta
 
-    sputter_yield = y0 * cos_theta**(-f) * np.exp(b*(1-1/cos_theta))
-    return sputter_yield
\ No newline at end of file
+        Returns:
+            array-like: the interpolated yield, 0 for cos_theta <= 0
+        """
+        position = np.clip(cos_theta, 0., 1.) * self._scale
+        index = position.astype(np.intp)
+        sputter_yield = (self._values[index] +
+                         (position - index) * self._slopes[index])
+        return np.where(np.asarray(cos_theta) > 0., sputter_yield, 0.)
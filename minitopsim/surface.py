@@ -3,6 +3,8 @@ Module containing the class Surface.
 """
 import numpy as np
 
+from minitopsim.visibility import SegmentTree
+
 
 class Shadow_Error(Exception):
     """Error during Shadow calculation in Surface Class"""
@@ -35,8 +37,12 @@ class Surface:
         """
         Calculates the normal vectors of the surface pointing inwards.
 
+        x and y may also be (K, n) arrays of K surfaces with n points
+        each, which are handled at once.
+
         Returns:
-            array(float): The normal vectors of the surface.
+            array(float): The normal vectors of the surface, (2, n) or
+                (2, K, n).
 
         """
         x = self.x
@@ -52,14 +58,15 @@ class Surface:
         dx /= magnitude
         dy /= magnitude
 
-        dx = dx[:-1] + dx[1:]
-        dy = dy[:-1] + dy[1:]
+        dx = dx[..., :-1] + dx[..., 1:]
+        dy = dy[..., :-1] + dy[..., 1:]
 
-        dx = np.concatenate(((1,), dx, (1,)))
-        dy = np.concatenate(((0,), dy, (0,)))
+        ends = np.ones(np.shape(x)[:-1] + (1,))
+        dx = np.concatenate((ends, dx, ends), axis=-1)
+        dy = np.concatenate((0 * ends, dy, 0 * ends), axis=-1)
 
         # Calculate the normal vectors between the points
-        normal_vecs = np.vstack((dy, -dx))
+        normal_vecs = np.stack((dy, -dx))
 
         # Normalize the normal vectors
         # Vektornorm stimmt nicht
@@ -76,6 +83,12 @@ class Surface:
 
         Important only use mask if Surface.has_shadows().
 
+        A point is potentially shadowed if it lies left of a previous
+        point (or right of a following point). It is shadowed if it
+        lies below the closest previous (following) segment covering
+        its x-value. All points are handled at once, the covering
+        segments are looked up with _covering_segments().
+
         Typical Usage:
             mask = surface.get_shadows()
             surface.x[mask]     #shadowed x-values
@@ -84,55 +97,34 @@ class Surface:
         Raises:
             Shadow_Error: Shadow before/after the first/final Surface point.
         """
-        shadows_mask = np.full_like(self.x, False, dtype=bool)
-
-        firstx = self.x[0]
-        finalx = self.x[-1]
-
-        for i, (x, y) in enumerate(zip(self.x[1:], self.y[1:]), 1):
-            if x <= np.max(self.x[:i]):
-                if x < firstx:
-                    msg = "Shadow is before the first point of Surface."
-                    raise Shadow_Error(msg)
-                for j in range(i-1, -1, -1):
-                    if self.x[j] == x:
-                        interp_y = self.y[j]    # no interpolation needed
-                        break
-                    elif self.x[j] < x < self.x[j+1]:
-                        xp = self.x[j:j+2]
-                        yp = self.y[j:j+2]
-                        interp_y = np.interp(x, xp, yp)
-                        break
-                    elif self.x[j] > x > self.x[j+1]:
-                        xp = self.x[j+1:j-1:-1]
-                        yp = self.y[j+1:j-1:-1]
-                        interp_y = np.interp(x, xp, yp)
-                        break
-                # potentially shadowed point
-                shadows_mask[i] = (y <= interp_y)
-
-        for i, (x, y) in reversed(list(enumerate(zip(self.x[:-1],
-                                                     self.y[:-1])))):
-            if x >= np.min(self.x[i+1:]):
-                if x > finalx:
-                    msg = "Shadow is after the final point of Surface."
-                    raise Shadow_Error(msg)
-                for j in range(i+1, self.x.size):
-                    if self.x[j] == x:
-                        interp_y = self.y[j]    # no interpolation needed
-                        break
-                    elif self.x[j-1] < x < self.x[j]:
-                        xp = self.x[j-1:j+1]
-                        yp = self.y[j-1:j+1]
-                        interp_y = np.interp(x, xp, yp)
-                        break
-                    elif self.x[j-1] > x > self.x[j]:
-                        xp = self.x[j:j-2:-1]
-                        yp = self.y[j:j-2:-1]
-                        interp_y = np.interp(x, xp, yp)
-                        break
-                # potentially shadowed point
-                shadows_mask[i] = shadows_mask[i] or (y <= interp_y)
+        x = self.x
+        y = self.y
+        n = x.size
+        shadows_mask = np.full_like(x, False, dtype=bool)
+
+        if np.any(x[1:] < x[0]):
+            msg = "Shadow is before the first point of Surface."
+            raise Shadow_Error(msg)
+        if np.any(x[:-1] > x[-1]):
+            msg = "Shadow is after the final point of Surface."
+            raise Shadow_Error(msg)
+
+        # shadows by previous points
+        i, j, on_point = _covering_segments(x)
+        interp_y = np.where(on_point, y[j],
+                            _interp_segments(x[i], x[j], y[j],
+                                             x[j+1], y[j+1]))
+        shadows_mask[i] = y[i] <= interp_y
+
+        # shadows by following points, same as above with the surface
+        # mirrored and reversed
+        i, j, on_point = _covering_segments(-x[::-1])
+        i = n - 1 - i
+        j = n - 1 - j
+        interp_y = np.where(on_point, y[j],
+                            _interp_segments(x[i], x[j], y[j],
+                                             x[j-1], y[j-1]))
+        shadows_mask[i] |= y[i] <= interp_y
 
         return shadows_mask
 
@@ -152,6 +144,11 @@ class Surface:
         """
         Calculates a new sequence of point coordinates by eliminating loops.
 
+        Segment pairs that may intersect are found with a uniform grid
+        over the segment bounding boxes (see _segment_pairs()), so only
+        close-by segments are tested for intersections. The tests
+        themselves are vectorized over all candidate pairs.
+
         Returns:
             x_delooped (array(float)): The x-coordinates of the points without loops.
             y_delooped (array(float)): The y-coordinates of the points without loops.
@@ -159,77 +156,386 @@ class Surface:
         """
         x = self.x
         y = self.y
-        x_local = x.tolist()
-        y_local = y.tolist()
-        k = 0
-        x_delooped = []
-        y_delooped = []
         dx = np.diff(x)
         dy = np.diff(y)
 
-        for i in range(dx.size-2):
-            for j in range(i+2, dx.size):
-                a = [[dx[j], -dx[i]], [dy[j], -dy[i]]]
-                b = [x[i] - x[j], y[i] - y[j]]              # create coefficient arrays
-                try:
-                    check_t, check_k = np.linalg.solve(a, b)      # trying to solve system of equations
-                except np.linalg.LinAlgError:
-                    check_t, check_k = [2, 2]
-                if ((check_t >= 0) & (check_t < 1) &
-                        (check_k >= 0) & (check_k < 1)):    # finding intersections
-                    t = check_t
-                    x_neu = x[j] + dx[j] * t
-                    y_neu = y[j] + dy[j] * t
-                    x_delooped = x_delooped + x_local[k: i + 1] + [x_neu]
-                    y_delooped = y_delooped + y_local[k: i + 1] + [y_neu]
-                    k = j + 1
-
-        x_delooped = x_delooped + x_local[k:dx.size + 1]
-        y_delooped = y_delooped + y_local[k:dy.size + 1]
-
-        x_delooped = np.array(x_delooped)
-        y_delooped = np.array(y_delooped)
+        i, j = _segment_pairs(x, y)
+
+        # solve x[i] + dx[i]*s = x[j] + dx[j]*t (same for y) with
+        # Cramer's rule, parallel segments cannot intersect
+        det = dx[i] * dy[j] - dx[j] * dy[i]
+        bx = x[i] - x[j]
+        by = y[i] - y[j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (dx[i] * by - dy[i] * bx) / det
+            s = (dx[j] * by - dy[j] * bx) / det
+        found = ((det != 0) & (t >= 0) & (t < 1) &
+                 (s >= 0) & (s < 1))                # finding intersections
+
+        x_delooped = []
+        y_delooped = []
+        k = 0
+        # pairs are sorted by i and then by j
+        for i_seg, j_seg, t_seg in zip(i[found], j[found], t[found]):
+            x_delooped += [x[k:i_seg + 1], [x[j_seg] + dx[j_seg] * t_seg]]
+            y_delooped += [y[k:i_seg + 1], [y[j_seg] + dy[j_seg] * t_seg]]
+            k = j_seg + 1
+
+        x_delooped = np.concatenate(x_delooped + [x[k:]]).astype(float)
+        y_delooped = np.concatenate(y_delooped + [y[k:]]).astype(float)
 
         return x_delooped, y_delooped
-    
-    def view_factor(self):
-       """Returns the view factor matrix of the surface.
-
-       Args:
-           none
-       """
-       n_nodes = len(self.x)
-       
-       # Calculate node distance matrix
-       d_x = np.tile(self.x, (n_nodes, 1)) - np.tile(self.x, (n_nodes, 1)).T
-       d_y = np.tile(self.y, (n_nodes, 1)) - np.tile(self.y, (n_nodes, 1)).T
-       d = np.sqrt(d_x**2 + d_y**2)
-           
-       # Calculate cos_beta matrix
-       cos_beta = np.zeros((n_nodes, n_nodes))
-       normal_vecs = -self.normal_vector()
-       for i in range(n_nodes):
-                   d_ij_vecs = np.array([d_x[i,:], d_y[i,:]])
-                   # Norm of normal vectors should be 1
-                   normal_vec_norm = np.linalg.norm(normal_vecs[:,i])
-                   cos_beta[i] = np.dot(normal_vecs[:,i], d_ij_vecs)/(d[i,:]*normal_vec_norm)          
-       
-       # Set the diagonal values to zero
-       np.fill_diagonal(cos_beta, 0)                        
-       
-       # Create a binary mask for valid indices
-       valid_mask = (cos_beta > 0) & (cos_beta.T > 0) & (~np.eye(n_nodes, dtype=bool))
-       
-       # transpose cos_beta_ji = cos_beta_ij
-       cos_b_X_b_T = np.matmul(cos_beta, cos_beta.T)
-       
-       # Calculate node distances
-       d_lj_1 =  np.roll(d, 1, axis=1)
-       d_lj_2 =  np.roll(d, -1, axis=1)
-       d_lj = d_lj_1 + d_lj_2/2
-       
-       # Calculate the view factor matrix f
-       f = np.zeros((n_nodes, n_nodes))
-       f = np.where(valid_mask, cos_b_X_b_T / (2 * d) * d_lj, 0)
-
-       return f
+
+    def remesh(self, min_length, max_length, max_angle):
+        """
+        Calculates a new sequence of point coordinates adapted to the shape.
+
+        Each point gets a target segment length (see _target_lengths()):
+        max_angle divided by the curvature, limited to min_length and
+        max_length. Points are removed as long as the new segment is
+        not longer than the targets of the points involved, or if one
+        of their segments is shorter than min_length (of two points
+        joined by a short segment, the one with the smaller angle is
+        removed). Then segments longer than the targets of their end
+        points are split, into pieces not shorter than min_length. The
+        first and final point are always kept.
+
+        Args:
+            min_length (float): Minimum segment length.
+            max_length (float): Maximum segment length.
+            max_angle (float): Angle (rad) between neighbouring segments
+                aimed for at each point.
+
+        Returns:
+            x_remeshed (array(float)): The x-coordinates of the new points.
+            y_remeshed (array(float)): The y-coordinates of the new points.
+        """
+        x = np.asarray(self.x, dtype=float)
+        y = np.asarray(self.y, dtype=float)
+
+        # coarsen, every pass removes at most every second point of a run
+        while x.size > 2:
+            angles = _segment_angles(x, y)
+            lengths = np.hypot(np.diff(x), np.diff(y))
+            target = _target_lengths(angles, lengths, min_length,
+                                     max_length, max_angle)
+            # the first and final point are never removed
+            angles[[0, -1]] = np.inf
+
+            chord = np.hypot(x[2:] - x[:-2], y[2:] - y[:-2])
+            coarse = chord <= np.minimum(
+                np.minimum(target[:-2], target[1:-1]), target[2:])
+            short = (((lengths[:-1] < min_length) &
+                      (angles[1:-1] <= angles[:-2])) |
+                     ((lengths[1:] < min_length) &
+                      (angles[1:-1] <= angles[2:]))) & (chord <= max_length)
+            candidate = np.concatenate(([False], coarse | short, [False]))
+            if not np.any(candidate):
+                break
+
+            # position of each candidate within its run of candidates
+            index = np.arange(x.size)
+            start = np.where(candidate & ~np.roll(candidate, 1), index, 0)
+            rank = index - np.maximum.accumulate(start)
+            keep = ~(candidate & (rank % 2 == 0))
+            x = x[keep]
+            y = y[keep]
+
+        # refine, splitting a segment reduces the targets next to it
+        while True:
+            lengths = np.hypot(np.diff(x), np.diff(y))
+            target = _target_lengths(_segment_angles(x, y), lengths,
+                                     min_length, max_length, max_angle)
+            pieces = np.ceil(lengths / np.minimum(target[:-1], target[1:]))
+            pieces = np.minimum(pieces, np.floor(lengths / min_length))
+            pieces = np.maximum(pieces, 1).astype(int)
+            if np.all(pieces == 1):
+                break
+
+            segment = np.repeat(np.arange(lengths.size), pieces)
+            fraction = ((np.arange(segment.size) -
+                         np.repeat(np.cumsum(pieces) - pieces, pieces)) /
+                        pieces[segment])
+            x = np.append(x[segment] + np.diff(x)[segment] * fraction, x[-1])
+            y = np.append(y[segment] + np.diff(y)[segment] * fraction, y[-1])
+
+        return x, y
+
+    def node_lengths(self):
+        """
+        Calculates the surface length belonging to each point.
+
+        Returns:
+            array(float): Half the length of the two adjacent segments
+                (of the one adjacent segment at the first/final point).
+        """
+        segment_lengths = np.hypot(np.diff(self.x), np.diff(self.y))
+        node_lengths = np.zeros_like(self.x, dtype=float)
+        node_lengths[:-1] += segment_lengths / 2
+        node_lengths[1:] += segment_lengths / 2
+        return node_lengths
+
+    def view_factor(self, rows=None, columns=None, visibility=False,
+                    dtype=np.float64):
+        """Returns the view factor matrix of the surface.
+
+        The view factor of point j seen from point i is
+            f_ij = cos(beta_ij) * cos(beta_ji) / (2 * d_ij) * l_j,
+        where d_ij is the distance between the points, beta_ij is the
+        angle between the outward normal at point i and the direction
+        to point j, and l_j is the length belonging to point j. It is
+        set to zero unless both points face each other.
+
+        Args:
+            rows (slice or array(int), optional): Rows of the matrix to
+                calculate, all rows if None. Computing the matrix in
+                blocks of rows keeps the memory usage at
+                O(len(rows) * n) instead of O(n**2).
+            columns (slice or array(int), optional): Columns of the
+                matrix to calculate, all columns if None.
+            visibility (bool, optional): If True, the view factor is
+                also set to zero if the line of sight between the
+                points is blocked by other parts of the surface.
+            dtype (dtype, optional): Floating point type of the matrix
+                and of its calculation. For other types than float64,
+                the points are first shifted to their mean in float64,
+                so the rounding does not depend on the position of the
+                surface.
+
+        Returns:
+            array(float): The view factor matrix (or the selected part).
+        """
+        nodes = np.arange(len(self.x))
+        rows = nodes[slice(None) if rows is None else rows]
+        columns = nodes[slice(None) if columns is None else columns]
+        normal_vecs = (-self.normal_vector()).astype(dtype, copy=False)
+        if np.dtype(dtype) == np.float64:
+            x = self.x
+            y = self.y
+        else:
+            x = (self.x - np.mean(self.x)).astype(dtype)
+            y = (self.y - np.mean(self.y)).astype(dtype)
+
+        # vectors from the points in rows to the points in columns
+        d_x = x[np.newaxis, columns] - x[rows, np.newaxis]
+        d_y = y[np.newaxis, columns] - y[rows, np.newaxis]
+        d = np.hypot(d_x, d_y)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_beta_ij = (normal_vecs[0, rows, np.newaxis] * d_x +
+                           normal_vecs[1, rows, np.newaxis] * d_y) / d
+            cos_beta_ji = -(normal_vecs[0, columns] * d_x +
+                            normal_vecs[1, columns] * d_y) / d
+
+            # the diagonal (d == 0) is nan and thus not valid
+            valid_mask = (cos_beta_ij > 0) & (cos_beta_ji > 0)
+            if visibility:
+                i, j = np.nonzero(valid_mask)
+                tree = SegmentTree(self.x, self.y)
+                valid_mask[i, j] = ~tree.is_blocked(rows[i], columns[j])
+
+            f = cos_beta_ij
+            f *= cos_beta_ji
+            f /= 2 * d
+            f *= self.node_lengths()[columns].astype(dtype, copy=False)
+            f[~valid_mask] = 0
+
+        return f
+
+
+def _segment_pairs(x, y):
+    """Finds the pairs of non-adjacent segments that may intersect.
+
+    The segment bounding boxes are sorted into a uniform grid. Only
+    segments sharing a grid cell are paired, and the pairs are then
+    filtered by bounding box overlap. The cell size starts at the mean
+    segment length and is doubled while long segments would occupy too
+    many cells.
+
+    Args:
+        x (array(float)): The x-coordinates of the points.
+        y (array(float)): The y-coordinates of the points.
+
+    Returns:
+        i (array(int)): Index of the first segment of each pair.
+        j (array(int)): Index of the second segment of each pair,
+            j >= i + 2. The pairs are sorted by i and then by j.
+    """
+    n_seg = x.size - 1
+    if n_seg < 3:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    xmin = np.minimum(x[:-1], x[1:])
+    xmax = np.maximum(x[:-1], x[1:])
+    ymin = np.minimum(y[:-1], y[1:])
+    ymax = np.maximum(y[:-1], y[1:])
+
+    cell = np.mean(np.hypot(xmax - xmin, ymax - ymin))
+    if not np.isfinite(cell) or cell <= 0:
+        cell = 1.
+    while True:
+        ix0 = np.floor((xmin - xmin.min()) / cell).astype(np.int64)
+        ix1 = np.floor((xmax - xmin.min()) / cell).astype(np.int64)
+        iy0 = np.floor((ymin - ymin.min()) / cell).astype(np.int64)
+        iy1 = np.floor((ymax - ymin.min()) / cell).astype(np.int64)
+        nx = ix1 - ix0 + 1
+        ny = iy1 - iy0 + 1
+        counts = nx * ny
+        if counts.sum() <= 4 * n_seg:
+            break
+        cell *= 2
+
+    # list all (cell, segment) entries, sorted by cell and then segment
+    seg = np.repeat(np.arange(n_seg), counts)
+    offset = np.arange(seg.size) - np.repeat(np.cumsum(counts) - counts,
+                                             counts)
+    cx = ix0[seg] + offset // ny[seg]
+    cy = iy0[seg] + offset % ny[seg]
+    key = cx * (iy1.max() + 1) + cy
+    order = np.lexsort((seg, key))
+    key = key[order]
+    seg = seg[order]
+
+    # pair each entry with the following entries of the same cell
+    codes = []
+    dist = 1
+    while dist < key.size:
+        same = key[dist:] == key[:-dist]
+        if not np.any(same):
+            break
+        codes.append(seg[:-dist][same] * n_seg + seg[dist:][same])
+        dist += 1
+    if not codes:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    codes = np.unique(np.concatenate(codes))
+    i, j = np.divmod(codes, n_seg)
+
+    keep = ((j - i >= 2) &
+            (xmin[i] <= xmax[j]) & (xmin[j] <= xmax[i]) &
+            (ymin[i] <= ymax[j]) & (ymin[j] <= ymax[i]))
+    return i[keep], j[keep]
+
+
+def _segment_angles(x, y):
+    """Calculates the angle between the two segments at each point.
+
+    Returns:
+        array(float): The angles (rad), 0 at the first and final point
+            and next to segments of zero length.
+    """
+    dx = np.diff(x)
+    dy = np.diff(y)
+    cross = dx[:-1] * dy[1:] - dy[:-1] * dx[1:]
+    dot = dx[:-1] * dx[1:] + dy[:-1] * dy[1:]
+    return np.concatenate(([0.], np.abs(np.arctan2(cross, dot)), [0.]))
+
+
+def _target_lengths(angles, lengths, min_length, max_length, max_angle):
+    """Calculates the segment length aimed for at each point.
+
+    The curvature at a point is its angle divided by the mean length of
+    its segments, the target length is max_angle divided by the
+    curvature, limited to min_length and max_length. Along the surface,
+    the targets grow by at most half the distance, so the segment
+    lengths are graded towards corners.
+
+    Returns:
+        array(float): The target lengths.
+    """
+    mean_lengths = np.concatenate(
+        (lengths[:1], (lengths[:-1] + lengths[1:]) / 2, lengths[-1:]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        target = max_angle * mean_lengths / angles
+    target = np.clip(np.nan_to_num(target, nan=max_length, posinf=max_length),
+                     min_length, max_length)
+
+    # target[i] <= target[j] + |s[i] - s[j]| / 2 with the arc length s
+    s = np.concatenate(([0.], np.cumsum(lengths))) / 2
+    forward = np.minimum.accumulate(target - s) + s
+    backward = np.minimum.accumulate((target + s)[::-1])[::-1] - s
+    return np.minimum(forward, backward)
+
+
+def _covering_segments(x):
+    """Finds the closest previous segment covering each potentially
+    shadowed point.
+
+    Point i is potentially shadowed if x[i] <= max(x[:i]). Walking back
+    from point i, the covering segment is the first segment (j, j+1)
+    with x[j] == x[i] or x[i] strictly between x[j] and x[j+1]. This is
+    the last j < i at which x - x[i] changes its sign, which is found
+    for all points at once by binary lifting over a sparse table of
+    range maxima.
+
+    Important: x[i] >= x[0] is assumed for all points.
+
+    Args:
+        x (array(float)): The x-coordinates of the points.
+
+    Returns:
+        i (array(int)): Indices of the potentially shadowed points.
+        j (array(int)): Indices of the first point of the covering
+            segments.
+        on_point (array(bool)): True where x[j] == x[i], i.e. no
+            interpolation is needed.
+    """
+    i = np.nonzero(x[1:] <= np.maximum.accumulate(x)[:-1])[0] + 1
+    x_i = x[i]
+    x_prev = x[i-1]
+
+    # moving right at point i: find the last j < i-1 with x[j] >= x[i],
+    # moving left: find the last j < i-1 with x[j] <= x[i]
+    right = x_prev < x_i
+    j_right = _last_greater_equal(x, i[right] - 1, x_i[right])
+    j_left = _last_greater_equal(-x, i[~right] - 1, -x_i[~right])
+
+    j = i - 1     # x[i-1] == x[i]
+    j[right] = j_right
+    j[~right & (x_prev != x_i)] = j_left[x_prev[~right] != x_i[~right]]
+
+    return i, j, x[j] == x_i
+
+
+def _last_greater_equal(a, end, value):
+    """Finds for each query the last index j < end with a[j] >= value.
+
+    Args:
+        a (array(float)): The array to search.
+        end (array(int)): Exclusive upper bounds of the searches.
+        value (array(float)): The values to compare with.
+
+    Returns:
+        array(int): The found indices (-1 if there is none).
+    """
+    # table[k][m] = max(a[m:m+2**k])
+    table = [a]
+    while 2**len(table) <= a.size:
+        prev = table[-1]
+        half = 2**(len(table) - 1)
+        table.append(np.maximum(prev[:-half], prev[half:]))
+
+    # skip blocks of values < value, from the largest block size down
+    pos = np.copy(end)
+    for k in range(len(table) - 1, -1, -1):
+        start = pos - 2**k
+        valid = start >= 0
+        skip = np.full_like(valid, False)
+        skip[valid] = table[k][start[valid]] < value[valid]
+        pos[skip] = start[skip]
+
+    return pos - 1
+
+
+def _interp_segments(x, xa, ya, xb, yb):
+    """Linear interpolation on the segments from (xa, ya) to (xb, yb).
+
+    Evaluated like np.interp, i.e. starting from the end point with the
+    smaller x-value.
+    """
+    swap = xb < xa
+    xa, xb = np.where(swap, xb, xa), np.where(swap, xa, xb)
+    ya, yb = np.where(swap, yb, ya), np.where(swap, ya, yb)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (yb - ya) / (xb - xa)
+        return slope * (x - xa) + ya
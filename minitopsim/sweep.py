@@ -0,0 +1,287 @@
+"""
+Module for running parameter sweeps in parallel.
+
+A sweep takes a base .cfg file and a grid of parameter values. For every
+combination of values, a .cfg file is written to the sweep directory and
+simulated (see Simulation) in a worker process of a ProcessPoolExecutor,
+or in a thread of a ThreadPoolExecutor, which saves starting processes
+for many small runs. Each Simulation has its own parameters, so the
+runs are independent. The output of a run (.srf, printed messages in
+.log) is written next to its .cfg file. The results are collected in a
+summary table.
+
+Runs differing only in the parameters an Ensemble allows to differ can
+instead be advanced together, one Ensemble per worker, which saves the
+Python overhead of the time steps for small surfaces.
+
+Functions:
+    parse_grid(): Reads a grid from command line arguments.
+    write_cfg(): Writes the .cfg file of one combination of values.
+    sweep(): Runs all combinations of parameter values.
+"""
+import ast
+import configparser
+import itertools
+import os
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+from time import perf_counter, thread_time
+
+from . import parameters as par
+from minitopsim.ensemble import Ensemble
+from minitopsim.simulation import Simulation
+
+# columns of the summary table following the parameters
+_COLUMNS = ('status', 'time', 'points', 'y_min', 'wall time', 'cpu time')
+
+
+def parse_grid(arguments):
+    """
+    Reads a parameter grid from arguments of the form KEY=value1,value2.
+
+    The values are Python literals, strings have to be quoted.
+
+    Args:
+        arguments (list(str)): The arguments.
+
+    Returns:
+        dict: The lists of values by (upper case) parameter name.
+
+    Raises:
+        KeyError: A parameter is not defined in parameters.db.
+        ValueError: An argument is no KEY=values assignment.
+    """
+    grid = dict()
+    for argument in arguments:
+        key, sep, values = argument.partition('=')
+        key = key.strip().upper()
+        if not sep:
+            raise ValueError(f'{argument} is no KEY=values assignment!')
+        if key not in par._categories:
+            raise KeyError(f'Attribute {key} not defined in default '
+                           f'values!')
+        grid[key] = list(ast.literal_eval(f'[{values}]'))
+    return grid
+
+
+def write_cfg(base_cfg, values, cfg_file):
+    """
+    Writes a .cfg file with some parameters of a base .cfg file replaced.
+
+    The replaced parameters are written to their section in
+    parameters.db. PLOT_SURFACE is always switched off.
+
+    Args:
+        base_cfg (str): The base .cfg file.
+        values (dict): The new values by parameter name.
+        cfg_file (str): The .cfg file to write.
+    """
+    config = configparser.ConfigParser()
+    config.read(base_cfg)
+
+    values = dict(values, PLOT_SURFACE=False)
+    for key, value in values.items():
+        for section in config.sections():
+            config.remove_option(section, key)
+        section = par._categories[key]
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, key, repr(value))
+
+    with open(cfg_file, 'w') as file:
+        config.write(file)
+
+
+def sweep(base_cfg, grid, workers=None, directory=None, threads=False,
+          ensemble=False):
+    """
+    Runs the simulations of all combinations of parameter values.
+
+    Args:
+        base_cfg (str): The .cfg file with the parameters not swept.
+        grid (dict): The lists of values by parameter name.
+        workers (int): Number of processes (default: number of CPUs).
+        directory (str): Directory for the files of the runs (default:
+            <base>_sweep next to the base .cfg file).
+        threads (bool): Run in threads instead of processes.
+        ensemble (bool): Split the runs into one Ensemble per worker
+            (see minitopsim.ensemble). If the runs cannot form an
+            Ensemble, they are run one by one. The wall and CPU time
+            of a run is then its share of the time of the ensemble.
+
+    Returns:
+        list(dict): The parameter values and the results of each run,
+            with the keys of the summary table. The table is also
+            written to summary.txt in the directory.
+    """
+    name = os.path.basename(base_cfg).replace('.cfg', '')
+    if directory is None:
+        directory = base_cfg.replace('.cfg', '') + '_sweep'
+    os.makedirs(directory, exist_ok=True)
+
+    keys = list(grid)
+    runs = [dict(zip(keys, combination))
+            for combination in itertools.product(*grid.values())]
+
+    t_start = perf_counter()
+    results = [None] * len(runs)
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    cfg_files = [os.path.join(directory, f'{name}_{i:04d}.cfg')
+                 for i in range(len(runs))]
+    for values, cfg_file in zip(runs, cfg_files):
+        write_cfg(base_cfg, values, cfg_file)
+    with pool(max_workers=workers) as executor:
+        futures = dict()
+        if ensemble:
+            chunks = min(workers or os.cpu_count() or 1, len(runs))
+            for chunk in range(chunks):
+                members = list(range(chunk, len(runs), chunks))
+                futures[executor.submit(
+                    _run_ensemble, [cfg_files[i] for i in members])] = members
+        else:
+            for i, cfg_file in enumerate(cfg_files):
+                futures[executor.submit(_run, cfg_file)] = [i]
+
+        done = 0
+        for future in as_completed(futures):
+            members = futures[future]
+            for i, result in zip(members, future.result()):
+                done += 1
+                results[i] = dict(runs[i], run=i, **result)
+                print(f'{done}/{len(runs)}: run {i} {results[i]["status"]}')
+    t_stop = perf_counter()
+
+    table = _format_table(results, keys)
+    with open(os.path.join(directory, 'summary.txt'), 'w') as file:
+        file.write(table)
+    print(table, end='')
+    print(f'{len(runs)} runs in {t_stop - t_start:.2f} s (sum of the run '
+          f'times {sum(r["wall time"] for r in results):.2f} s)')
+
+    return results
+
+
+def _run(cfg_file):
+    """
+    Runs one simulation in a worker.
+
+    Everything printed by the simulation goes to a .log file next to
+    the .cfg file.
+
+    Args:
+        cfg_file (str): The .cfg file of the run.
+
+    Returns:
+        list(dict): The results for the summary table.
+    """
+    result = dict.fromkeys(_COLUMNS)
+    log_file = cfg_file.replace('.cfg', '.log')
+
+    t_wall = perf_counter()
+    t_cpu = thread_time()
+    with open(log_file, 'w') as log:
+        try:
+            config = par.read_config(cfg_file)
+            simulation = Simulation(config, cfg_file.replace('.cfg', ''),
+                                    log=log)
+            if not simulation.run():
+                result['status'] = 'error: output'
+        except Exception as err:
+            result['status'] = f'error: {type(err).__name__}'
+            print(f'{type(err).__name__}: {err}', file=log)
+    result['wall time'] = perf_counter() - t_wall
+    result['cpu time'] = thread_time() - t_cpu
+
+    if result['status'] is None:
+        result['time'] = simulation.time
+        result['points'] = simulation.surface.x.size
+        result['y_min'] = float(simulation.surface.y.min())
+        # Shadow_Errors stop the simulation early
+        if simulation.time < config.TOTAL_TIME * (1 - 1e-9):
+            result['status'] = 'stopped'
+        else:
+            result['status'] = 'ok'
+
+    return [result]
+
+
+def _run_ensemble(cfg_files):
+    """
+    Runs simulations as one Ensemble in a worker.
+
+    Everything printed by the ensemble goes to the .log file of its
+    first run. If the runs cannot form an Ensemble, e.g. because a .cfg
+    file has invalid values, they are run one by one (see _run()).
+
+    Args:
+        cfg_files (list(str)): The .cfg files of the runs.
+
+    Returns:
+        list(dict): The results of the runs for the summary table.
+    """
+    filenames = [cfg_file.replace('.cfg', '') for cfg_file in cfg_files]
+    results = [dict.fromkeys(_COLUMNS) for _ in cfg_files]
+
+    t_wall = perf_counter()
+    t_cpu = thread_time()
+    with open(filenames[0] + '.log', 'w') as log:
+        try:
+            configs = [par.read_config(cfg_file) for cfg_file in cfg_files]
+            ensemble = Ensemble(configs, log=log)
+        except ValueError as err:
+            print(f'Runs one by one: {err}', file=log)
+            ensemble = None
+        if ensemble is not None:
+            try:
+                success = ensemble.run(filenames)
+            except Exception as err:
+                print(f'{type(err).__name__}: {err}', file=log)
+                success = f'error: {type(err).__name__}'
+    if ensemble is None:
+        return [result for cfg_file in cfg_files
+                for result in _run(cfg_file)]
+    wall = (perf_counter() - t_wall) / len(cfg_files)
+    cpu = (thread_time() - t_cpu) / len(cfg_files)
+
+    surfaces = ensemble.surfaces()
+    for k, result in enumerate(results):
+        result['wall time'] = wall
+        result['cpu time'] = cpu
+        if isinstance(success, str):
+            result['status'] = success
+        elif not success[k]:
+            result['status'] = 'error: output'
+        else:
+            result['time'] = float(ensemble.times[k])
+            result['points'] = surfaces[k].x.size
+            result['y_min'] = float(surfaces[k].y.min())
+            if not ensemble.running[k]:
+                result['status'] = 'stopped'
+            else:
+                result['status'] = 'ok'
+    return results
+
+
+def _format_table(results, keys):
+    """Formats the results as a table with one line per run."""
+    columns = ['run'] + keys + list(_COLUMNS)
+    cells = [[_format_cell(result[column]) for column in columns]
+             for result in results]
+    widths = [max(len(column), *(len(row[j]) for row in cells))
+              for j, column in enumerate(columns)]
+
+    lines = ['  '.join(column.rjust(width)
+                       for column, width in zip(columns, widths))]
+    for row in cells:
+        lines.append('  '.join(cell.rjust(width)
+                               for cell, width in zip(row, widths)))
+    return '\n'.join(lines) + '\n'
+
+
+def _format_cell(value):
+    """Formats a value of the summary table."""
+    if isinstance(value, float):
+        return f'{value:.6g}'
+    if value is None:
+        return '-'
+    return str(value)
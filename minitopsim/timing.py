@@ -0,0 +1,211 @@
+"""
+Module for timing the stages of a simulation.
+
+The stages of the time loop (velocities, view factors, shadows,
+delooping, output, ...) are timed with stage() and counted with count()
+into the StageTimers of the current context (see parameters.activate()),
+which Simulation sets up. Without StageTimers, stage() and count() do
+nothing. Stages can be nested, their times include the nested stages.
+
+Functions:
+    init(): Sets new StageTimers for the current context.
+    get_timers(): Returns the StageTimers of the current context.
+    stage(): Times a stage of the simulation.
+    count(): Adds a value to a histogram.
+    machine_info(): Describes the machine and the versions used.
+
+Classes:
+    StageTimers: Wall and CPU times and calls of stages, histograms.
+"""
+import contextvars
+import json
+import os
+import platform
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from time import perf_counter, thread_time
+
+import numpy as np
+
+# stage timers of the current context (see parameters.activate())
+_timers = contextvars.ContextVar('timers', default=None)
+
+
+def init():
+    """
+    Sets new StageTimers for the current context.
+
+    Returns:
+        StageTimers: The timers.
+    """
+    timers = StageTimers()
+    _timers.set(timers)
+    return timers
+
+
+def get_timers():
+    """Return the stage timers of the current context (or None)."""
+    return _timers.get()
+
+
+def stage(name):
+    """
+    Times a stage of the simulation.
+
+    Used as context manager: with timing.stage('deloop'): ...
+
+    Args:
+        name (str): The name of the stage.
+
+    Returns:
+        context manager: Adds the wall and CPU time of the with block to
+            the stage, does nothing without timers in the context.
+    """
+    timers = _timers.get()
+    if timers is None:
+        return _NO_STAGE
+    return _Stage(timers, name)
+
+
+def count(name, value):
+    """
+    Adds a value to a histogram (nothing without timers in the context).
+
+    Args:
+        name (str): The name of the histogram.
+        value (int): The value to count.
+    """
+    timers = _timers.get()
+    if timers is not None:
+        timers.histograms.setdefault(name, Counter())[value] += 1
+
+
+def machine_info():
+    """
+    Describes the machine and the versions of Python and numpy.
+
+    Returns:
+        dict: node, platform, processor, cpus, python and numpy.
+    """
+    return {
+        'node': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+    }
+
+
+class StageTimers:
+    """
+    Wall and CPU times and numbers of calls of the simulation stages.
+
+    The CPU time is the time of the calling thread, so simulations in
+    threads are timed separately.
+
+    Attributes:
+        stages (dict): [calls, wall time, CPU time] by stage name.
+        histograms (dict): Counter of the values by histogram name.
+    """
+    def __init__(self):
+        self.stages = dict()
+        self.histograms = dict()
+
+    def __str__(self):
+        """Formats the stages (by decreasing wall time) and histograms."""
+        width = max([5] + [len(name) for name in self.stages])
+        lines = [f'{"stage":<{width}}  {"calls":>8}  {"wall [s]":>10}  '
+                 f'{"cpu [s]":>10}']
+        stages = sorted(self.stages.items(), key=lambda item: -item[1][1])
+        for name, (calls, wall, cpu) in stages:
+            lines.append(f'{name:<{width}}  {calls:>8}  {wall:>10.4f}  '
+                         f'{cpu:>10.4f}')
+        for name, histogram in self.histograms.items():
+            values = ', '.join(f'{value}: {n}'
+                               for value, n in sorted(histogram.items()))
+            lines.append(f'{name}: {values}')
+        return '\n'.join(lines)
+
+    def add(self, name, wall, cpu):
+        """
+        Adds a call of a stage.
+
+        Args:
+            name (str): The name of the stage.
+            wall (float): The wall time of the call [s].
+            cpu (float): The CPU time of the call [s].
+        """
+        times = self.stages.get(name)
+        if times is None:
+            self.stages[name] = [1, wall, cpu]
+        else:
+            times[0] += 1
+            times[1] += wall
+            times[2] += cpu
+
+    def report(self, **info):
+        """
+        Collects the times with information on the run and the machine.
+
+        Args:
+            **info: Information on the run added to the report.
+
+        Returns:
+            dict: The report (see write_report()).
+        """
+        return {
+            'run': info,
+            'machine': machine_info(),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'stages': {name: {'calls': calls, 'wall': wall, 'cpu': cpu}
+                       for name, (calls, wall, cpu) in self.stages.items()},
+            'histograms': {name: {str(value): n for value, n
+                                  in sorted(histogram.items())}
+                           for name, histogram in self.histograms.items()},
+        }
+
+    def write_report(self, report_file, **info):
+        """
+        Writes the report as JSON file.
+
+        Args:
+            report_file (str): The JSON file.
+            **info: Information on the run added to the report (under
+                'run', with 'machine', 'date', 'stages' and 'histograms').
+        """
+        with open(report_file, 'w') as file:
+            json.dump(self.report(**info), file, indent=2)
+            file.write('\n')
+
+
+class _Stage:
+    """Context manager timing one call of a stage."""
+    __slots__ = ('timers', 'name', 'wall', 'cpu')
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.wall = perf_counter()
+        self.cpu = thread_time()
+
+    def __exit__(self, *exc):
+        self.timers.add(self.name, perf_counter() - self.wall,
+                        thread_time() - self.cpu)
+
+
+class _NoStage:
+    """Context manager doing nothing, if no timers are set."""
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
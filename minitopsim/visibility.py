@@ -0,0 +1,143 @@
+"""
+Module for checking the line of sight between points of a surface.
+
+Classes:
+    SegmentTree: Bounding volume hierarchy over the segments of a surface.
+"""
+import numpy as np
+
+# number of queries traversing the hierarchy at the same time
+_QUERY_CHUNK = 2**15
+
+# functions combining the bounds (xmin, xmax, ymin, ymax) of two boxes
+_REDUCE = (np.minimum, np.maximum, np.minimum, np.maximum)
+
+
+class SegmentTree:
+    """
+    Bounding volume hierarchy over the segments of a surface.
+
+    Neighbouring segments of a surface are close to each other, so the
+    hierarchy is built over index ranges instead of sorting the segments
+    in space: box k of level l bounds the segments k*2**l up to
+    (k+1)*2**l - 1. Level 0 holds the bounding boxes of the segments.
+
+    Attributes:
+        x (array(float)): The x-coordinates of the points.
+        y (array(float)): The y-coordinates of the points.
+        levels (list): Bounding boxes (xmin, xmax, ymin, ymax) of each
+            level, from the segments (level 0) up to the root.
+    """
+    def __init__(self, x, y):
+        """
+        Builds the hierarchy for the surface points x, y.
+
+        """
+        self.x = x
+        self.y = y
+
+        boxes = (np.minimum(x[:-1], x[1:]), np.maximum(x[:-1], x[1:]),
+                 np.minimum(y[:-1], y[1:]), np.maximum(y[:-1], y[1:]))
+        self.levels = [boxes]
+        while boxes[0].size > 1:
+            boxes = tuple(_merge_pairs(bound, reduce)
+                          for bound, reduce in zip(boxes, _REDUCE))
+            self.levels.append(boxes)
+
+    def is_blocked(self, i, j):
+        """
+        Checks if the lines of sight between points are blocked.
+
+        The line between points i and j is blocked if it crosses any
+        segment of the surface. Segments ending in point i or j are not
+        counted, nor are lines touching a segment only at their ends.
+
+        Args:
+            i (array(int)): Indices of the first points.
+            j (array(int)): Indices of the second points.
+
+        Returns:
+            array(bool): True where the line of sight is blocked.
+        """
+        blocked = np.full(np.size(i), False)
+        for start in range(0, np.size(i), _QUERY_CHUNK):
+            chunk = slice(start, start + _QUERY_CHUNK)
+            blocked[chunk] = self._is_blocked(i[chunk], j[chunk])
+        return blocked
+
+    def _is_blocked(self, i, j):
+        """Traverses the hierarchy for one chunk of queries."""
+        px, py = self.x[i], self.y[i]
+        qx, qy = self.x[j], self.y[j]
+        blocked = np.full(i.size, False)
+
+        # pairs of query and box of the current level
+        query = np.arange(i.size)
+        box = np.zeros(i.size, dtype=int)
+
+        for level in range(len(self.levels) - 1, -1, -1):
+            xmin, xmax, ymin, ymax = (bound[box]
+                                      for bound in self.levels[level])
+            hit = _line_hits_box(px[query], py[query], qx[query], qy[query],
+                                 xmin, xmax, ymin, ymax)
+            query = query[hit]
+            box = box[hit]
+            if level > 0:
+                # continue with both children of the boxes hit
+                n_children = self.levels[level - 1][0].size
+                query = np.repeat(query, 2)
+                box = np.repeat(2 * box, 2)
+                box[1::2] += 1
+                exists = box < n_children
+                query = query[exists]
+                box = box[exists]
+
+        # exact test for the segments hit
+        hit = _lines_cross(px[query], py[query], qx[query], qy[query],
+                           self.x[box], self.y[box],
+                           self.x[box + 1], self.y[box + 1])
+        blocked[query[hit]] = True
+
+        return blocked
+
+
+def _merge_pairs(bound, reduce):
+    """Combines the bounds of neighbouring boxes into the parent level."""
+    if bound.size % 2:
+        bound = np.append(bound, bound[-1])
+    return reduce(bound[0::2], bound[1::2])
+
+
+def _line_hits_box(px, py, qx, qy, xmin, xmax, ymin, ymax):
+    """Checks if the lines from p to q touch the boxes.
+
+    Separating axis test: the bounding boxes have to overlap and the box
+    corners may not all lie strictly on one side of the line.
+    """
+    overlap = ((np.minimum(px, qx) <= xmax) & (xmin <= np.maximum(px, qx)) &
+               (np.minimum(py, qy) <= ymax) & (ymin <= np.maximum(py, qy)))
+
+    dx = qx - px
+    dy = qy - py
+    side_1 = dx * (ymin - py) - dy * (xmin - px)
+    side_2 = dx * (ymin - py) - dy * (xmax - px)
+    side_3 = dx * (ymax - py) - dy * (xmin - px)
+    side_4 = dx * (ymax - py) - dy * (xmax - px)
+    low = np.minimum(np.minimum(side_1, side_2), np.minimum(side_3, side_4))
+    high = np.maximum(np.maximum(side_1, side_2), np.maximum(side_3, side_4))
+
+    return overlap & (low <= 0) & (high >= 0)
+
+
+def _lines_cross(px, py, qx, qy, ax, ay, bx, by):
+    """Checks if the lines from p to q cross the segments from a to b.
+
+    p and q have to lie strictly on different sides of the segment, a
+    and b must not lie strictly on the same side of the line.
+    """
+    side_a = (qx - px) * (ay - py) - (qy - py) * (ax - px)
+    side_b = (qx - px) * (by - py) - (qy - py) * (bx - px)
+    side_p = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+    side_q = (bx - ax) * (qy - ay) - (by - ay) * (qx - ax)
+
+    return (side_a * side_b <= 0) & (side_p * side_q < 0)
@@ -0,0 +1,23 @@
+import argparse
+
+from minitopsim.sweep import parse_grid, sweep
+
+
+parser = argparse.ArgumentParser(
+    description='Runs miniTopSim for all combinations of parameter values.')
+parser.add_argument('cfg_file', help='base .cfg file')
+parser.add_argument('grid', nargs='+', metavar='KEY=VALUES',
+                    help='comma separated values of a parameter')
+parser.add_argument('-j', '--workers', type=int, default=None,
+                    help='number of processes (default: number of CPUs)')
+parser.add_argument('-t', '--threads', action='store_true',
+                    help='run in threads instead of processes')
+parser.add_argument('-e', '--ensemble', action='store_true',
+                    help='advance the runs of a worker together (see '
+                         'minitopsim.ensemble)')
+parser.add_argument('-d', '--directory', default=None,
+                    help='directory for the runs (default: <cfg>_sweep)')
+args = parser.parse_args()
+
+sweep(args.cfg_file, parse_grid(args.grid), args.workers, args.directory,
+      args.threads, args.ensemble)
@@ -0,0 +1,190 @@
+"""
+Test cases for the surface output.
+
+tests:
+    convert_trajectory:
+        tests converting trench.srf to binary and back
+    trajectory_append:
+        tests appending to a trajectory with and without index
+    surface_writer:
+        tests the buffered .srf output against write_surface
+    read_surface:
+        tests the bulk parsing of read_surface
+    srf_reader:
+        tests the indexed .srf reader against read_surface
+    srf_reader_index:
+        tests the cached index of a growing .srf file
+"""
+import io as string_io
+import os
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import minitopsim.surface as srf
+import minitopsim.io_surface as io
+
+SRF_FILE = os.path.join(os.path.dirname(__file__), 'trench.srf')
+
+
+@pytest.mark.unittest
+def test_convert_trajectory(tmp_path):
+    """
+    test that the surfaces survive the conversion to binary and back
+
+    Args:
+        tmp_path(fixture): directory for the converted files
+    """
+    binary = str(tmp_path / 'trench.srfb')
+    text = str(tmp_path / 'trench.srf')
+
+    io.convert_trajectory(SRF_FILE, binary)
+    io.convert_trajectory(binary, text)
+
+    reference = io.read_trajectory(SRF_FILE)
+    assert io.is_trajectory(binary)
+    assert not io.is_trajectory(text)
+    for surfaces in (io.read_trajectory(binary), io.read_trajectory(text)):
+        assert len(surfaces) == len(reference)
+        for (surface, time), (ref_surface, ref_time) in zip(surfaces,
+                                                            reference):
+            assert time == ref_time
+            assert_array_equal(surface.x, ref_surface.x)
+            assert_array_equal(surface.y, ref_surface.y)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('close', [True, False])
+def test_trajectory_append(tmp_path, close):
+    """
+    test appending frames to an existing trajectory
+
+    Args:
+        tmp_path(fixture): directory for the trajectory
+        close(bool): if the first writer is closed, i.e. writes an index
+    """
+    filename = str(tmp_path / 'append.srfb')
+    surface = srf.Surface(np.linspace(0., 1., 5), np.zeros(5))
+
+    writer = io.TrajectoryWriter(filename)
+    writer.write(surface, 0.)
+    writer.write(srf.Surface(surface.x[:3], surface.y[:3] - 1.), 1.)
+    if close:
+        writer.close()
+    else:
+        writer._file.close()
+
+    with io.TrajectoryWriter(filename, append=True) as writer:
+        writer.write(srf.Surface(surface.x, surface.y - 2.), 2.)
+
+    with io.TrajectoryReader(filename) as reader:
+        assert_array_equal(reader.times, [0., 1., 2.])
+        last, time = reader[-1]
+        assert len(reader[1][0].x) == 3
+
+    assert time == 2.
+    assert_array_equal(last.y, surface.y - 2.)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_size', [1, 2**20])
+def test_surface_writer(tmp_path, buffer_size):
+    """
+    test that the buffered writer gives the same file as write_surface
+
+    Args:
+        tmp_path(fixture): directory for the .srf files
+        buffer_size(int): bytes collected before writing
+    """
+    filename = str(tmp_path / 'buffered.srf')
+    reference = str(tmp_path / 'reference.srf')
+    # write_surface starts a new file at time 0, trench.srf has two
+    surfaces = io.read_trajectory(SRF_FILE)[1:]
+
+    with io.SurfaceWriter(filename, buffer_size) as writer:
+        for surface, time in surfaces:
+            assert writer.write(surface, time)
+    for surface, time in surfaces:
+        io.write_surface(surface, time, reference)
+
+    with open(filename) as file, open(reference) as ref_file:
+        assert file.read() == ref_file.read()
+
+
+@pytest.mark.unittest
+def test_read_surface():
+    """
+    test read_surface for extra columns, a single point and end of file
+    """
+    file = string_io.StringIO('surface: 0.5 2 x-positions y-positions\n'
+                              '-1.5 2.0 7\n3.0 -4.25 8\n'
+                              'surface: 1 1 x-positions y-positions\n'
+                              '5 6\n')
+
+    surface, time = io.read_surface(file)
+    assert time == 0.5
+    assert_array_equal(surface.x, [-1.5, 3.])
+    assert_array_equal(surface.y, [2., -4.25])
+
+    surface, time = io.read_surface(file)
+    assert time == 1.
+    assert_array_equal(surface.x, [5.])
+    assert_array_equal(surface.y, [6.])
+
+    assert io.read_surface(file) == (None, None)
+
+
+@pytest.mark.unittest
+def test_srf_reader():
+    """
+    test that the indexed reader gives the surfaces of read_surface
+    """
+    reference = []
+    with open(SRF_FILE) as file:
+        while True:
+            surface, time = io.read_surface(file)
+            if surface is None:
+                break
+            reference.append((surface, time))
+
+    with io.SrfReader(SRF_FILE) as reader:
+        assert len(reader) == len(reference)
+        last, time = reader[-1]
+        assert time == reference[-1][1]
+        assert_array_equal(last.y, reference[-1][0].y)
+        for (surface, time), (ref_surface, ref_time) in zip(reader,
+                                                            reference):
+            assert time == ref_time
+            assert_array_equal(surface.x, ref_surface.x)
+            assert_array_equal(surface.y, ref_surface.y)
+
+
+@pytest.mark.unittest
+def test_srf_reader_index(monkeypatch, tmp_path):
+    """
+    test the sidecar index while the .srf file is being written
+
+    Args:
+        monkeypatch(fixture): to cache the index of small files
+        tmp_path(fixture): directory for the .srf file
+    """
+    monkeypatch.setattr(io, '_INDEX_MIN_SIZE', 0)
+    filename = str(tmp_path / 'growing.srf')
+    surface = srf.Surface(np.linspace(0., 1., 5), np.zeros(5))
+
+    with io.SurfaceWriter(filename) as writer:
+        writer.write(surface, 0.)
+        writer.write(surface, 1.)
+    # incomplete frame at the end
+    with open(filename, 'a') as file:
+        file.write('surface: 2.0 5 x-positions y-positions\n0.0 2.0\n')
+
+    with io.SrfReader(filename) as reader:
+        assert_array_equal(reader.times, [0., 1.])
+    assert os.path.isfile(filename + '.idx')
+
+    with open(filename, 'a') as file:
+        file.write('0.25 2.0\n0.5 2.0\n0.75 2.0\n1.0 2.0\n')
+    with io.SrfReader(filename) as reader:
+        assert_array_equal(reader.times, [0., 1., 2.])
+        assert_array_equal(reader[2][0].y, np.full(5, 2.))
@@ -0,0 +1,58 @@
+"""
+Test cases for the shadow calculation of the surface class.
+
+tests:
+    get_shadows:
+        tests the shadow masks of the surfaces from check_shadows
+    get_shadows_error:
+        tests the Shadow_Error for shadows outside of the surface
+"""
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import minitopsim.surface as srf
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('x, y, shadowed', [
+    ([0, 1, 2, 2, 0, 1, 3, 5, 6, 4, 4, 5, 6],
+     [0, 0, 0, -1, -2, -2, -2, -2, -2, -1, 0, 0, 0],
+     [3, 4, 5, 7, 8, 9]),
+    ([0, 1, 2, 3, 4, 3, 5, 4, 3, 5, 6],
+     [0, -0.5, 0.5, 0, 0, 1, 1, -1, -2, -2, -1],
+     [3, 4, 7, 8, 9]),
+    ([0, 2, 1, 3, 5, 4, 4.25, 4.5, 6],
+     [0, -2, -1.5, -3.5, -2.5, -2.5, -2.75, -3, -3.5],
+     [2, 6, 7]),
+])
+def test_get_shadows(x, y, shadowed):
+    """
+    test surface.get_shadows() for the surfaces from check_shadows
+
+    Args:
+        x(list): x-values of the surface
+        y(list): y-values of the surface
+        shadowed(list): indices of the shadowed points
+    """
+    surface = srf.Surface(np.array(x), np.array(y))
+    assert surface.has_shadows()
+
+    mask = surface.get_shadows()
+
+    assert_array_equal(np.nonzero(mask)[0], shadowed)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('x', [[0, -1, 10], [0, 11, 10]])
+def test_get_shadows_error(x):
+    """
+    test if shadows before/after the surface raise a Shadow_Error
+
+    Args:
+        x(list): x-values of the surface
+    """
+    surface = srf.Surface(np.array(x), np.arange(3))
+
+    with pytest.raises(srf.Shadow_Error):
+        surface.get_shadows()
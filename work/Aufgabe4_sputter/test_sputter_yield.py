@@ -0,0 +1,60 @@
+"""
+Test cases for the sputtering yield.
+
+tests:
+    yield_table:
+        tests the interpolated yield against the table syield.dat, and
+        that there is no yield at grazing incidence
+    yield_grazing:
+        tests that both models give finite yields at grazing incidence
+"""
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+import minitopsim.parameters as par
+import minitopsim.sputtering as sput
+
+
+@pytest.mark.unittest
+def test_yield_table():
+    """
+    test that the table is reproduced at its tilt angles
+    """
+    tilt, table_yield = np.loadtxt(sput.DEFAULT_TABLE, usecols=(0, 1),
+                                   unpack=True)
+    table = sput.load_table(sput.DEFAULT_TABLE)
+
+    assert sput.load_table(sput.DEFAULT_TABLE) is table
+    assert_allclose(table(np.cos(np.radians(tilt))), table_yield,
+                    rtol=0.02, atol=0.01)
+    assert_allclose(table(1.), table_yield[0])
+    with pytest.raises(ValueError):
+        sput.YieldTable([0., 50., 40.], [1., 2., 3.])
+
+    # no yield at and beyond 90 degrees, even if the table has one
+    table = sput.YieldTable([0., 45., 90.], [1., 2., 0.5])
+    assert_allclose(table(np.array([-0.5, 0., 1.])), [0., 0., 1.])
+    assert table(1e-3) > 0.4
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('yield_type', ['Yamamura', 'Table'])
+def test_yield_grazing(yield_type):
+    """
+    test that cos_theta at and beyond 0 gives no yield
+
+    Args:
+        yield_type(str): the model SPUTTER_YIELD_TYPE
+    """
+    par.SPUTTER_YIELD_TYPE = yield_type
+    cos_theta = np.array([-0.5, -1e-20, 0., 1e-20, 1e-3, 0.5, 1.])
+
+    try:
+        sputter_yield = sput.get_sputter_yield(cos_theta)
+    finally:
+        par.SPUTTER_YIELD_TYPE = 'Yamamura'
+
+    assert np.all(np.isfinite(sputter_yield))
+    assert_allclose(sputter_yield[:4], 0., atol=1e-12)
+    assert np.all(sputter_yield[4:] > 0.)
@@ -48,3 +48,33 @@ def test_deloop(set_surface1, set_surface2):
     assert_almost_equal(delooped_y1, delooped_y_muster1, decimal=3)
     assert_almost_equal(delooped_x2, delooped_x_muster2, decimal=3)
     assert_almost_equal(delooped_y2, delooped_y_muster2, decimal=3)
+
+
+@pytest.mark.unittest
+def test_deloop_repeated(set_surface1):
+    """
+    test surface.deloop() on many shifted copies of surface1
+
+    The copies only touch at their end points, so the delooped surface
+    must consist of the shifted copies of the delooped surface1.
+
+    Args:
+        set_surface1(fixture): to init a surface1
+    """
+    n_copies = 50
+    x = np.concatenate([set_surface1.x + 10*i for i in range(n_copies)])
+    y = np.tile(set_surface1.y, n_copies)
+    surface = srf.Surface(x, y)
+
+    # get test data
+    delooped_x, delooped_y = surface.deloop()
+
+    # define reference data
+    delooped_x1, delooped_y1 = set_surface1.deloop()
+    delooped_x_muster = np.concatenate([delooped_x1 + 10*i
+                                        for i in range(n_copies)])
+    delooped_y_muster = np.tile(delooped_y1, n_copies)
+
+    # Raises: AssertionError if arrays are not Equal up to the defined decimal
+    assert_almost_equal(delooped_x, delooped_x_muster, decimal=3)
+    assert_almost_equal(delooped_y, delooped_y_muster, decimal=3)
@@ -0,0 +1,65 @@
+"""
+Test cases for the remeshing of the surface class.
+
+tests:
+    remesh_flat:
+        tests the coarsening of a flat surface
+    remesh_corner:
+        tests the refinement next to a corner
+    remesh_short:
+        tests the removal of short segments
+"""
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+import minitopsim.surface as srf
+
+
+@pytest.mark.unittest
+def test_remesh_flat():
+    """
+    test that a flat surface is coarsened up to the maximum length
+    """
+    surface = srf.Surface(np.linspace(0., 10., 101), np.zeros(101))
+
+    x, y = surface.remesh(0.25, 2., np.radians(10.))
+    lengths = np.diff(x)
+
+    assert (x[0], x[-1]) == (0., 10.)
+    assert_allclose(y, 0.)
+    assert np.all(lengths <= 2.)
+    assert x.size <= 11
+
+
+@pytest.mark.unittest
+def test_remesh_corner():
+    """
+    test that segments get shorter towards the corner of a V-shape
+    """
+    x = np.linspace(-10., 10., 11)
+    surface = srf.Surface(x, -np.abs(x))
+
+    x, y = surface.remesh(0.25, 4., np.radians(10.))
+    lengths = np.hypot(np.diff(x), np.diff(y))
+    corner = np.nonzero(x == 0)[0]
+
+    assert corner.size == 1
+    assert_allclose(y, -np.abs(x))
+    assert np.all(lengths >= 0.25)
+    assert lengths[corner[0]] < lengths[-1] / 4
+
+
+@pytest.mark.unittest
+def test_remesh_short():
+    """
+    test that short segments are removed, keeping the first/final point
+    """
+    x = np.array([0., 0.01, 1., 1.01, 1.02, 2., 2.99, 3.])
+    surface = srf.Surface(x, np.zeros_like(x))
+
+    x, y = surface.remesh(0.25, 4., np.radians(10.))
+    lengths = np.diff(x)
+
+    assert (x[0], x[-1]) == (0., 3.)
+    assert np.all(lengths >= 0.25)
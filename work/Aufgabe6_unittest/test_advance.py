@@ -6,6 +6,14 @@ tests:
         tests direction of etching
     advance:
         tests the progression of etching
+    etch_velocity:
+        tests that the etch velocity is ETCH_RATE in nm/s
+    cfl_timestep:
+        tests the time step limit of adaptive time steps
+    adaptive_steps:
+        tests the number of adaptive time steps and their accuracy
+    integrators:
+        tests the time integrators for a flat etched surface
 
 fixtures:
     set_surface:
@@ -13,6 +21,8 @@ fixtures:
     set_advance_param:
         sets etching progression parameters
 """
+import os
+
 import pytest
 import numpy as np
 from numpy.testing import assert_almost_equal
@@ -20,6 +30,7 @@ from numpy.testing import assert_almost_equal
 import minitopsim.parameters as par
 import minitopsim.surface as srf
 import minitopsim.advance as adv
+from minitopsim.simulation import Simulation
 
 
 @pytest.fixture
@@ -84,3 +95,132 @@ def test_advance(set_advance_param, set_surface):
     # Raises: AssertionError if arrays are not Equal up to the defined decimal
     assert_almost_equal(x, x_ref, decimal=3)
     assert_almost_equal(y, y_ref, decimal=3)
+
+
+@pytest.mark.unittest
+def test_etch_velocity(monkeypatch, set_surface):
+    """
+    test that the points move with ETCH_RATE (nm/s) along the normal
+
+    Args:
+        monkeypatch(fixture): to set the parameters
+        set_surface(fixture): to init a surface
+    """
+    monkeypatch.setattr(par, 'ETCHING', True)
+    monkeypatch.setattr(par, 'ETCH_RATE', -2.)
+
+    velocity = adv.get_velocities(set_surface)
+
+    # no conversion from cm/s as for the sputter velocity
+    assert_almost_equal(velocity, -2. * set_surface.normal_vector())
+    assert_almost_equal(np.hypot(*velocity), np.full(3, 2.))
+
+
+@pytest.mark.unittest
+def test_cfl_timestep(monkeypatch, set_surface):
+    """
+    test the CFL time step for a moved and a deformed surface
+
+    Args:
+        monkeypatch(fixture): to set CFL_NUMBER
+        set_surface(fixture): to init a surface
+    """
+    monkeypatch.setattr(par, 'CFL_NUMBER', 0.5)
+
+    # moving as a whole does not limit the time step
+    velocity = np.array([[1., 1., 1.], [-2., -2., -2.]])
+    assert adv.cfl_timestep(set_surface, velocity) == np.inf
+
+    # middle point moves relative to its neighbours, shorter segment is 1
+    velocity = np.array([[0., 2., 0.], [0., 0., 0.]])
+    assert_almost_equal(adv.cfl_timestep(set_surface, velocity), 0.25)
+
+    # the shorter segment shrinks, collapsing after 0.5 s
+    velocity = np.array([[0., -2., 0.], [0., 0., 0.]])
+    assert_almost_equal(adv.cfl_timestep(set_surface, velocity), 0.25)
+    assert_almost_equal(adv.cfl_timestep(set_surface, velocity, 0.4), 0.25)
+    # collapsing within the time step, it is left to delooping
+    assert_almost_equal(adv.cfl_timestep(set_surface, velocity, 0.5),
+                        0.25 * np.sqrt(5.))
+
+
+def max_distance(surface, reference):
+    """
+    Calculates the largest distance between two surfaces.
+
+    Args:
+        surface (Surface): The first surface.
+        reference (Surface): The second surface.
+
+    Returns:
+        float: The largest distance of a point of one surface to the
+            segments of the other.
+    """
+    distances = []
+    for points, polyline in ((surface, reference), (reference, surface)):
+        x = points.x[:, np.newaxis]
+        y = points.y[:, np.newaxis]
+        dx = np.diff(polyline.x)
+        dy = np.diff(polyline.y)
+        # nearest position on each segment
+        t = np.clip(((x - polyline.x[:-1]) * dx + (y - polyline.y[:-1]) * dy)
+                    / (dx**2 + dy**2), 0., 1.)
+        distance = np.hypot(polyline.x[:-1] + t * dx - x,
+                            polyline.y[:-1] + t * dy - y)
+        distances.append(np.max(np.min(distance, axis=1)))
+    return max(distances)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('etching', [True, False])
+def test_adaptive_steps(tmp_path, etching):
+    """
+    test adaptive steps on the cosine surface against fixed steps
+
+    The adaptive run needs no more steps than the run with TIME_STEP and
+    stays within 2.5 nm (of a depth of 110 nm) of a run with small fixed
+    steps.
+
+    Args:
+        tmp_path(fixture): directory for the output files
+        etching(bool): ETCHING, etching or sputtering
+    """
+    config = par.defaults().replace(TOTAL_TIME=10., PLOT_SURFACE=False,
+                                    ETCHING=etching,
+                                    BEAM_CURRENT_DENSITY=0.00025)
+    runs = dict(fixed=config, adaptive=config.replace(ADAPTIVE_TIME_STEP=True),
+                reference=config.replace(TIME_STEP=0.05))
+    simulations = dict()
+    with open(os.devnull, 'w') as log:
+        for name, run_config in runs.items():
+            simulations[name] = Simulation(run_config, str(tmp_path / name),
+                                           log=log)
+            assert simulations[name].run()
+
+    assert simulations['fixed'].step == 10
+    assert simulations['adaptive'].step <= simulations['fixed'].step
+    assert max_distance(simulations['adaptive'].surface,
+                        simulations['reference'].surface) < 2.5
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('integrator', ['Euler', 'Heun', 'SSPRK3', 'RK4'])
+def test_integrators(monkeypatch, integrator):
+    """
+    test that all integrators move a flat surface by ETCH_RATE * dtime
+
+    Args:
+        monkeypatch(fixture): to set the parameters
+        integrator(str): the TIME_INTEGRATOR to test
+    """
+    monkeypatch.setattr(par, 'ETCHING', True)
+    monkeypatch.setattr(par, 'ETCH_RATE', -2.)
+    monkeypatch.setattr(par, 'TIME_INTEGRATOR', integrator)
+    surface = srf.Surface(np.linspace(-1., 1., 5), np.zeros(5))
+    velocity = adv.get_velocities(surface)
+
+    x, y, error = adv.integrate(surface, velocity, 0.5)
+
+    assert_almost_equal(x, surface.x)
+    assert_almost_equal(y, np.full(5, 1.))
+    assert error is None or error < 1e-12
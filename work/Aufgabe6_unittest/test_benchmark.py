@@ -0,0 +1,73 @@
+"""
+Test cases for the benchmark suite.
+
+tests:
+    run_benchmarks:
+        tests running a few benchmarks and storing the results
+    find_regressions:
+        tests the comparison against a baseline
+"""
+import os
+
+import pytest
+
+import minitopsim.parameters as par
+from minitopsim.benchmark import (run_benchmarks, write_results,
+                                  read_results, append_history,
+                                  find_regressions)
+
+
+@pytest.mark.unittest
+def test_run_benchmarks(tmp_path):
+    """
+    test that the benchmarks run for the numbers of points and
+    configurations, and that the results are stored
+
+    Args:
+        tmp_path(fixture): directory for the result files
+    """
+    etching = par.ETCHING
+    with open(os.devnull, 'w') as log:
+        results = run_benchmarks((100, 200), ['deloop', 'minitopsim'],
+                                 ['etching', 'redep'], min_time=0.,
+                                 repeat=1, log=log)
+
+    assert [(r['benchmark'], r['config'], r['nodes']) for r in results] == [
+        ('deloop', None, 100), ('deloop', None, 200),
+        ('minitopsim', 'etching', 100), ('minitopsim', 'etching', 200),
+        ('minitopsim', 'redep', 100), ('minitopsim', 'redep', 200)]
+    assert all(r['time'] > 0 for r in results)
+    # the parameters of the calling process are not changed
+    assert par.ETCHING == etching
+
+    write_results(tmp_path / 'results.json', results)
+    append_history(tmp_path / 'history.jsonl', results)
+    append_history(tmp_path / 'history.jsonl', results)
+    stored = read_results(tmp_path / 'results.json')
+    assert stored['results'] == results
+    assert 'numpy' in stored['machine']
+    assert len((tmp_path / 'history.jsonl').read_text().splitlines()) == 2
+
+    with pytest.raises(KeyError):
+        run_benchmarks((100,), ['no_benchmark'])
+
+
+@pytest.mark.unittest
+def test_find_regressions():
+    """
+    test that only results slower than the threshold are regressions
+    """
+    baseline = [dict(benchmark='deloop', config=None, nodes=100, time=1.),
+                dict(benchmark='advance', config='redep', nodes=100,
+                     time=2.)]
+    results = [dict(benchmark='deloop', config=None, nodes=100, time=1.2),
+               dict(benchmark='advance', config='redep', nodes=100,
+                    time=3.),
+               dict(benchmark='advance', config='etching', nodes=100,
+                    time=9.)]
+
+    regressions = find_regressions(results, baseline, threshold=0.25)
+
+    assert len(regressions) == 1
+    assert regressions[0]['config'] == 'redep'
+    assert regressions[0]['ratio'] == 1.5
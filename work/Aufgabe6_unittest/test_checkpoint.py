@@ -0,0 +1,86 @@
+"""
+Test cases for checkpoints and the restart of a simulation.
+
+tests:
+    checkpoint:
+        tests that a checkpoint restores surface, state and parameters
+    truncate_trajectory:
+        tests removing the surfaces after a checkpoint from a .srf file
+"""
+import contextvars
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import minitopsim.parameters as par
+import minitopsim.surface as srf
+import minitopsim.advance as adv
+import minitopsim.io_surface as io
+from minitopsim.checkpoint import write_checkpoint, read_checkpoint
+
+
+@pytest.mark.unittest
+def test_checkpoint(tmp_path, capsys):
+    """
+    test that a checkpoint restores the simulation, with the .cfg file
+    overriding the parameters of the checkpoint
+
+    Args:
+        tmp_path(fixture): directory for the files
+        capsys(fixture): to check the reported parameter changes
+    """
+    cfg_file = tmp_path / 'run.cfg'
+    cfg_file.write_text('[Setup]\nTOTAL_TIME = 20\n\n'
+                        '[Numerics]\nTIME_STEP = 0.5\n')
+    filename = str(tmp_path / 'run.chk')
+    surface = srf.Surface(np.linspace(-1., 1., 7), np.linspace(0., 3., 7))
+    config = par.defaults().replace(TOTAL_TIME=10., TIME_STEP=2.,
+                                    ETCH_RATE=-3.)
+
+    def write():
+        par.activate(config)
+        adv._error_timestep.set(0.25)
+        write_checkpoint(filename, surface, 4., 1.5, 3, 5.)
+
+    contextvars.Context().run(write)
+    restored, state = read_checkpoint(filename, str(cfg_file))
+
+    assert_array_equal(state['surface'].x, surface.x)
+    assert_array_equal(state['surface'].y, surface.y)
+    assert ((state['time'], state['dt'], state['step'], state['t_output'],
+             state['error_timestep']) == (4., 1.5, 3, 5., 0.25))
+    assert restored.ETCH_RATE == -3.
+    assert restored.TOTAL_TIME == 20
+    assert restored.TIME_STEP == 0.5
+    assert 'TIME_STEP changed since the checkpoint: 2.0 -> 0.5' in \
+        capsys.readouterr().out
+    # the module variables are not changed
+    assert par.ETCH_RATE != -3.
+
+
+@pytest.mark.unittest
+def test_truncate_trajectory(tmp_path):
+    """
+    test that surfaces after the checkpoint and an incomplete last
+    surface are removed
+
+    Args:
+        tmp_path(fixture): directory for the .srf file
+    """
+    filename = str(tmp_path / 'run.srf')
+    surface = srf.Surface(np.linspace(0., 1., 5), np.zeros(5))
+    with io.SurfaceWriter(filename) as writer:
+        for time in range(4):
+            writer.write(surface, float(time))
+    with open(filename, 'a') as file:
+        file.write('surface: 4.0 5 x-positions y-positions\n0.0 0.0\n')
+
+    io.truncate_trajectory(filename, 3.)
+    with io.SrfReader(filename) as reader:
+        assert len(reader) == 4
+        assert reader[-1][1] == 3.
+
+    io.truncate_trajectory(filename, 1.5)
+    with io.SrfReader(filename) as reader:
+        assert [time for _, time in reader] == [0., 1.]
@@ -0,0 +1,117 @@
+"""
+Test cases for advancing an ensemble of simulations together.
+
+tests:
+    ensemble:
+        tests that the members are advanced as by single simulations
+    stopped_members:
+        tests that members stop at a Shadow_Error as single simulations
+    incompatible_configs:
+        tests that configurations not forming an ensemble are refused
+"""
+import os
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+import minitopsim.parameters as par
+from minitopsim.ensemble import Ensemble
+from minitopsim.simulation import Simulation
+
+
+def run_both(configs, directory):
+    """
+    Runs the configurations as Ensemble and as single simulations.
+
+    Args:
+        configs (list(Config)): The parameters of the members.
+        directory (Path): Directory for the output files.
+
+    Returns:
+        ensemble (Ensemble): The ensemble after the run.
+        simulations (list(Simulation)): The simulations after the run.
+    """
+    with open(os.devnull, 'w') as log:
+        ensemble = Ensemble(configs, log=log)
+        assert all(ensemble.run([str(directory / f'member_{k}')
+                                 for k in range(len(configs))]))
+        simulations = [Simulation(config, str(directory / f'single_{k}'),
+                                  log=log)
+                       for k, config in enumerate(configs)]
+        for simulation in simulations:
+            simulation.run()
+    return ensemble, simulations
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('values', [
+    dict(ETCHING=False),
+    dict(ETCHING=True, TIME_INTEGRATOR='Heun'),
+])
+def test_ensemble(tmp_path, values):
+    """
+    test that the members are advanced as by single simulations
+
+    Args:
+        tmp_path(fixture): directory for the output files
+        values(dict): the parameters shared by the members
+    """
+    base = par.defaults().replace(TOTAL_TIME=5., PLOT_SURFACE=False,
+                                  **values)
+    configs = [base.replace(SPUTTER_YIELD_0=y0, ETCH_RATE=y0,
+                            FUN_PEAK_TO_PEAK=-20. * y0)
+               for y0 in (1., 1.5, 2., 3.)]
+
+    ensemble, simulations = run_both(configs, tmp_path)
+
+    assert ensemble.step == simulations[0].step == 5
+    for surface, simulation in zip(ensemble.surfaces(), simulations):
+        assert_allclose(surface.x, simulation.surface.x, atol=1e-9)
+        assert_allclose(surface.y, simulation.surface.y, atol=1e-9)
+    with open(tmp_path / 'member_3.srf') as member, \
+            open(tmp_path / 'single_3.srf') as single:
+        assert member.read() == single.read()
+
+
+@pytest.mark.unittest
+def test_stopped_members(tmp_path):
+    """
+    test that members stop at a Shadow_Error like single simulations
+
+    Args:
+        tmp_path(fixture): directory for the output files
+    """
+    base = par.defaults().replace(TOTAL_TIME=10., PLOT_SURFACE=False,
+                                  ETCHING=False, BEAM_TYPE='Gaussian',
+                                  FWHM=40.)
+    configs = [base.replace(BEAM_CURRENT=current)
+               for current in (1e-12, 1e-11, 1e-9)]
+
+    ensemble, simulations = run_both(configs, tmp_path)
+
+    assert_allclose(ensemble.times, [s.time for s in simulations])
+    assert ensemble.running.tolist() == [s.time == 10. for s in simulations]
+    assert not np.all(ensemble.running)
+    for surface, simulation in zip(ensemble.surfaces(), simulations):
+        assert_allclose(surface.y, simulation.surface.y, atol=1e-9)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('values, other', [
+    (dict(), dict(TIME_STEP=2.)),
+    (dict(REDEP=True), dict()),
+    (dict(ADAPTIVE_TIME_STEP=True), dict()),
+])
+def test_incompatible_configs(values, other):
+    """
+    test that configurations not forming an ensemble raise a ValueError
+
+    Args:
+        values(dict): the parameters of all members
+        other(dict): the parameters of the second member
+    """
+    config = par.defaults().replace(TOTAL_TIME=1., **values)
+
+    with pytest.raises(ValueError):
+        Ensemble([config, config.replace(**other)])
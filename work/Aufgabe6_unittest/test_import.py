@@ -0,0 +1,72 @@
+"""
+Test cases for the time needed to import miniTopSim.
+
+Short runs are dominated by the imports, so matplotlib and the scipy
+subpackages are only imported when they are needed.
+
+tests:
+    lazy_imports:
+        tests that a headless run does not import plotting or scipy
+    import_time:
+        benchmarks the import of minitopsim.main against numpy
+"""
+import subprocess
+import sys
+
+import pytest
+
+# modules not needed for running a simulation without plotting
+LAZY_MODULES = ('matplotlib', 'scipy')
+
+# import time of minitopsim.main allowed on top of numpy [s]
+IMPORT_TIME_BUDGET = 0.3
+
+
+def import_times(module):
+    """
+    Imports a module in a new interpreter.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        dict: Cumulative import time [s] by module name, the total time
+            of the import statement under None.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = {None: 0.}
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative) * 1e-6
+        # modules imported directly by the interpreter or the statement
+        if not name.startswith('  '):
+            times[None] += int(cumulative) * 1e-6
+    return times
+
+
+@pytest.mark.unittest
+def test_lazy_imports():
+    """
+    test that importing minitopsim.main does not import LAZY_MODULES
+    """
+    times = import_times('minitopsim.main')
+
+    assert 'minitopsim.main' in times
+    lazy = [name for name in times
+            if name is not None and name.split('.')[0] in LAZY_MODULES]
+    assert lazy == []
+
+
+@pytest.mark.unittest
+def test_import_time():
+    """
+    test that importing minitopsim.main takes at most IMPORT_TIME_BUDGET
+    longer than importing numpy (best of 3)
+    """
+    overhead = min(import_times('minitopsim.main')[None] -
+                   import_times('numpy')[None] for _ in range(3))
+
+    assert overhead < IMPORT_TIME_BUDGET, (
+        f'import minitopsim.main: {overhead:.3f} s on top of numpy')
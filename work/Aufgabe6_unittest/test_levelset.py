@@ -0,0 +1,119 @@
+"""
+Test cases for the level set surface engine.
+
+tests:
+    initial_surface:
+        tests that the extracted surface is the initial surface
+    etching:
+        tests that a flat surface is etched by ETCH_RATE * time
+    sputtering:
+        tests a sputtered cosine against the node engine
+    simulation:
+        tests a simulation with redeposition and the level set engine
+"""
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+import minitopsim.advance as adv
+import minitopsim.parameters as par
+import minitopsim.surface as srf
+from minitopsim.io_surface import read_surface
+from minitopsim.levelset import LevelSet
+from minitopsim.simulation import Simulation
+
+
+@pytest.fixture
+def cosine_surface():
+    """
+    initiate the default cosine surface from -50 to 50 nm
+    """
+    x = np.linspace(-50., 50., 101)
+    y = np.where(np.abs(x) < 25., -50. * (1 + np.cos(2 * np.pi * x / 50.)),
+                 0.)
+    return srf.Surface(x, y)
+
+
+@pytest.mark.unittest
+def test_initial_surface(cosine_surface):
+    """
+    test that the surface extracted from the level set is the initial one
+
+    Args:
+        cosine_surface(fixture): init a surface
+    """
+    level_set = LevelSet(cosine_surface, -50., 50., 1.)
+    surface = level_set.surface()
+
+    assert_allclose(surface.x[[0, -1]], [-50., 50.])
+    # the grid points between the polyline points are off by its chords
+    assert_allclose(np.interp(surface.x, cosine_surface.x, cosine_surface.y),
+                    surface.y, atol=0.1)
+
+
+@pytest.mark.unittest
+def test_etching(monkeypatch):
+    """
+    test that a flat surface moves by ETCH_RATE * time
+
+    Args:
+        monkeypatch(fixture): to set the parameters
+    """
+    monkeypatch.setattr(par, 'ETCHING', True)
+    monkeypatch.setattr(par, 'ETCH_RATE', 2.)
+    surface = srf.Surface(np.linspace(-10., 10., 21), np.zeros(21))
+    level_set = LevelSet(surface, -10., 10., 0.5)
+
+    for _ in range(5):
+        surface = level_set.advance(1.)
+
+    assert_allclose(surface.y, -10., atol=0.1)
+    assert level_set.updates == 10
+
+
+@pytest.mark.unittest
+def test_sputtering(monkeypatch, cosine_surface):
+    """
+    test that the level set sputters a cosine like the node engine
+
+    Args:
+        monkeypatch(fixture): to set the parameters
+        cosine_surface(fixture): init a surface
+    """
+    monkeypatch.setattr(par, 'ETCHING', False)
+    level_set = LevelSet(cosine_surface, -50., 50., 1.)
+    nodes = cosine_surface
+
+    for _ in range(10):
+        surface = level_set.advance(1.)
+        nodes, _ = adv.advance(nodes, 1.)
+
+    assert_allclose(surface.y.min(), nodes.y.min(), atol=1.)
+    assert_allclose(surface.x[[0, -1]], [-50., 50.])
+
+
+@pytest.mark.unittest
+def test_simulation(tmp_path):
+    """
+    test that a simulation with redeposition gives finite surfaces
+
+    Args:
+        tmp_path(fixture): directory for the output files
+    """
+    config = par.defaults().replace(
+        TOTAL_TIME=5., ETCHING=False, REDEP=True, PLOT_SURFACE=False,
+        SURFACE_ENGINE='level set', LEVEL_SET_SPACING=2.)
+    with open(tmp_path / 'run.log', 'w') as log:
+        simulation = Simulation(config, str(tmp_path / 'run'), log=log)
+        assert simulation.run()
+
+    surfaces = []
+    with open(simulation.srf_file) as file:
+        surface, _ = read_surface(file)
+        while surface is not None:
+            surfaces.append(surface)
+            surface, _ = read_surface(file)
+    assert len(surfaces) == 6
+    assert all(np.all(np.isfinite(surface.y)) for surface in surfaces)
+    assert surfaces[-1].y.min() < surfaces[0].y.min()
+    assert simulation.timers.stages['redistance'][0] >= 5
@@ -18,6 +18,9 @@ tests:
         checks if exceptions are raised for bad*.cfg files
         is parameterized
 
+    schema_cache:
+        checks the cached schema of parameters.db
+
 fixtures:
     _set_default_values_par:
         loads the default values form the database
@@ -26,6 +29,8 @@ import configparser
 import pytest
 import os
 import glob
+import marshal
+import sys
 
 import minitopsim.parameters as par
 
@@ -126,3 +131,37 @@ def test_load_bad_parameters(set_default_values_par, cfg_file):
     """
     with pytest.raises(Exception):
         par.load_parameters(cfg_file)
+
+
+@pytest.mark.unittest
+def test_schema_cache(monkeypatch, tmp_path):
+    """
+    checks that the cached schema equals the parsed one and is renewed
+    when parameters.db changed.
+
+    Args:
+        monkeypatch(fixture): to use a temporary cache file.
+        tmp_path(fixture): directory for the cache file.
+    """
+    cache_file = str(tmp_path / 'parameters.db.schema')
+    monkeypatch.setattr(par, '_cache_file', cache_file)
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    defaults = dict(par._defaults)
+    conditions = {key: condition for key, (condition, _)
+                  in par._conditions.items()}
+
+    # parsed and written, then read from the cache
+    for _ in range(2):
+        par._load_schema()
+        assert os.path.isfile(cache_file)
+        assert par._defaults == defaults
+        assert {key: condition for key, (condition, _)
+                in par._conditions.items()} == conditions
+
+    # an outdated cache is replaced
+    with open(cache_file, 'wb') as file:
+        marshal.dump(((0, 0), []), file)
+    par._load_schema()
+    assert par._defaults == defaults
+    with open(cache_file, 'rb') as file:
+        assert len(marshal.load(file)[1]) == len(defaults)
@@ -0,0 +1,90 @@
+"""
+Test cases for Config and Simulation.
+
+tests:
+    config:
+        tests reading, checking and replacing the values of a Config
+    simulations_in_threads:
+        tests that simulations in threads do not influence each other
+
+fixtures:
+    set_configs:
+        init two different sputter simulations
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import minitopsim.parameters as par
+from minitopsim.simulation import Simulation
+
+
+@pytest.fixture
+def set_configs():
+    """
+    init an Euler and an adaptive RK4 sputter simulation of a cosine.
+    """
+    config = par.defaults().replace(TOTAL_TIME=5., ETCHING=False,
+                                    OUTPUT_FORMAT='binary')
+    return [config,
+            config.replace(TIME_INTEGRATOR='RK4', ADAPTIVE_TIME_STEP=True,
+                           FUN_PEAK_TO_PEAK=80.)]
+
+
+@pytest.mark.unittest
+def test_config(tmp_path):
+    """
+    test that a Config is checked like the module variables, but does not
+    change them
+
+    Args:
+        tmp_path(fixture): directory for the .cfg file
+    """
+    cfg_file = tmp_path / 'run.cfg'
+    cfg_file.write_text('[Setup]\nTOTAL_TIME = 3\nETCH_RATE = -4.\n')
+
+    config = par.read_config(str(cfg_file))
+
+    assert config.TOTAL_TIME == 3. and type(config.TOTAL_TIME) is float
+    assert config.ETCH_RATE == -4.
+    assert par.ETCH_RATE != -4.
+    with pytest.raises(AttributeError):
+        config.TIME_STEP = 2.
+    with pytest.raises(ValueError):
+        config.replace(TOTAL_TIME=-1.)
+    assert config.replace(time_step=2.).TIME_STEP == 2.
+    assert config.TIME_STEP == par.TIME_STEP
+
+
+@pytest.mark.unittest
+def test_simulations_in_threads(set_configs, tmp_path):
+    """
+    test running simulations with different parameters in threads against
+    running them one after another
+
+    Args:
+        set_configs(fixture): the parameters of the simulations
+        tmp_path(fixture): directory for the output files
+    """
+    def run(i, config, name):
+        simulation = Simulation(config, str(tmp_path / f'{name}_{i}'),
+                                log=open(tmp_path / f'{name}_{i}.log', 'w'))
+        simulation.run()
+        simulation.log.close()
+        return simulation
+
+    serial = [run(i, config, 'serial')
+              for i, config in enumerate(set_configs)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        threaded = list(executor.map(run, range(8), set_configs * 4,
+                                     ['thread'] * 8))
+
+    assert serial[0].surface.y.min() != serial[1].surface.y.min()
+    for i, simulation in enumerate(threaded):
+        reference = serial[i % 2]
+        assert simulation.time == reference.time == 5.
+        assert simulation.step == reference.step
+        assert_array_equal(simulation.surface.x, reference.surface.x)
+        assert_array_equal(simulation.surface.y, reference.surface.y)
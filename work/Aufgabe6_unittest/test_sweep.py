@@ -0,0 +1,111 @@
+"""
+Test cases for parameter sweeps.
+
+tests:
+    parse_grid:
+        tests reading the parameter grid from command line arguments
+    sweep:
+        tests the results of a sweep over the etch rate
+    sweep_ensemble:
+        tests a sweep run as ensembles, and one by one as fallback
+    sweep_ensemble_error:
+        tests that an invalid run does not stop an ensemble sweep
+"""
+import pytest
+import numpy as np
+
+import minitopsim.parameters as par
+from minitopsim.sweep import parse_grid, sweep
+
+
+@pytest.mark.unittest
+def test_parse_grid():
+    """
+    test that values are read as literals for upper case parameter names
+    """
+    grid = parse_grid(['etch_rate=-1,-2.5', "BEAM_TYPE='Gaussian'"])
+
+    assert grid == {'ETCH_RATE': [-1, -2.5], 'BEAM_TYPE': ['Gaussian']}
+    with pytest.raises(KeyError):
+        parse_grid(['NO_PARAMETER=1'])
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('threads', [False, True])
+def test_sweep(tmp_path, threads):
+    """
+    test a sweep over the etch rate of a flat surface in two workers
+
+    Args:
+        tmp_path(fixture): directory for the runs
+        threads(bool): run in threads instead of processes
+    """
+    base_cfg = tmp_path / 'etch.cfg'
+    base_cfg.write_text('[Setup]\nETCHING = True\nETCH_RATE = -1.\n\n'
+                        '[Initial Conditions]\nFUN_PEAK_TO_PEAK = 0.\n\n'
+                        '[Beam]\nTOTAL_TIME = 4\n')
+    grid = {'ETCH_RATE': [-1., -2., -3.], 'TIME_STEP': [1., 2.]}
+
+    results = sweep(str(base_cfg), grid, workers=2, threads=threads)
+
+    assert len(results) == 6
+    for i, result in enumerate(results):
+        assert result['run'] == i
+        assert result['status'] == 'ok'
+        assert result['time'] == 4.
+        assert np.isclose(result['y_min'], -4. * result['ETCH_RATE'])
+    assert (tmp_path / 'etch_sweep' / 'summary.txt').is_file()
+    # the parameters of the calling process are not changed
+    assert par.ETCH_RATE != -3.
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('grid', [
+    {'ETCH_RATE': [-1., -2., -3.]},
+    {'ETCH_RATE': [-1., -2.], 'TIME_STEP': [1., 2.]},
+])
+def test_sweep_ensemble(tmp_path, grid):
+    """
+    test a sweep as one ensemble, runs differing in TIME_STEP one by one
+
+    Args:
+        tmp_path(fixture): directory for the runs
+        grid(dict): the swept parameters
+    """
+    base_cfg = tmp_path / 'etch.cfg'
+    base_cfg.write_text('[Setup]\nETCHING = True\nETCH_RATE = -1.\n\n'
+                        '[Initial Conditions]\nFUN_PEAK_TO_PEAK = 0.\n\n'
+                        '[Beam]\nTOTAL_TIME = 4\n')
+
+    results = sweep(str(base_cfg), grid, workers=1, threads=True,
+                    ensemble=True)
+
+    assert len(results) == len(grid['ETCH_RATE']) * len(grid.get(
+        'TIME_STEP', [1.]))
+    for i, result in enumerate(results):
+        assert result['run'] == i
+        assert result['status'] == 'ok'
+        assert result['time'] == 4.
+        assert np.isclose(result['y_min'], -4. * result['ETCH_RATE'])
+        assert (tmp_path / 'etch_sweep' / f'etch_{i:04d}.srf').is_file()
+
+
+@pytest.mark.unittest
+def test_sweep_ensemble_error(tmp_path):
+    """
+    test that a run with an invalid value fails alone in an ensemble sweep
+
+    Args:
+        tmp_path(fixture): directory for the runs
+    """
+    base_cfg = tmp_path / 'etch.cfg'
+    base_cfg.write_text('[Setup]\nETCHING = True\nETCH_RATE = -1.\n\n'
+                        '[Initial Conditions]\nFUN_PEAK_TO_PEAK = 0.\n\n'
+                        '[Beam]\nTOTAL_TIME = 4\n')
+
+    results = sweep(str(base_cfg), {'TIME_STEP': [1., -1.]}, workers=1,
+                    threads=True, ensemble=True)
+
+    assert [result['status'] for result in results] == [
+        'ok', 'error: ValueError']
+    assert results[0]['time'] == 4.
@@ -0,0 +1,78 @@
+"""
+Test cases for the stage timers of a simulation.
+
+tests:
+    timing_report:
+        tests the stages, the table and the JSON report of a sputter
+        simulation
+    no_timers:
+        tests that stages are not timed outside of a simulation
+"""
+import json
+
+import pytest
+
+import minitopsim.parameters as par
+import minitopsim.timing as timing
+from minitopsim.simulation import Simulation
+
+
+@pytest.mark.unittest
+def test_timing_report(tmp_path):
+    """
+    test that the report counts the stages of every time step
+
+    Args:
+        tmp_path(fixture): directory for the output files
+    """
+    config = par.defaults().replace(TOTAL_TIME=5., ETCHING=False,
+                                    REDEP=True, TIMING_REPORT=True)
+    simulation = Simulation(config, str(tmp_path / 'run'),
+                            log=open(tmp_path / 'run.log', 'w'))
+    simulation.run()
+    simulation.log.close()
+
+    with open(simulation.timing_file) as file:
+        report = json.load(file)
+    with open(tmp_path / 'run.log') as log:
+        assert 'wall [s]' in log.read()
+
+    assert report['run']['steps'] == simulation.step == 5
+    stages = report['stages']
+    assert stages['run']['calls'] == 1
+    assert stages['advance']['calls'] == 5
+    assert stages['velocities']['calls'] == 5
+    assert stages['view_factor']['calls'] >= 5
+    # the initial, every and the last surface, and closing the file
+    assert stages['output']['calls'] == 7
+    assert stages['advance']['wall'] <= stages['run']['wall']
+    assert report['histograms']['advance tries'] == {'1': 5}
+    assert 'numpy' in report['machine']
+
+    # without TIMING_REPORT, neither the table, the cache statistics nor
+    # the report are written
+    simulation = Simulation(config.replace(TIMING_REPORT=False,
+                                           VIEW_FACTOR_CACHE=True),
+                            str(tmp_path / 'quiet'),
+                            log=open(tmp_path / 'quiet.log', 'w'))
+    simulation.run()
+    simulation.log.close()
+
+    with open(tmp_path / 'quiet.log') as log:
+        text = log.read()
+    assert 'wall [s]' not in text
+    assert 'cache' not in text
+    assert not (tmp_path / 'quiet.timing.json').exists()
+
+
+@pytest.mark.unittest
+def test_no_timers():
+    """
+    test that stage() and count() do nothing without timers
+    """
+    assert timing.get_timers() is None
+
+    with timing.stage('deloop'):
+        timing.count('advance tries', 1)
+
+    assert timing.get_timers() is None
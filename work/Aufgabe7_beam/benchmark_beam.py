@@ -0,0 +1,64 @@
+"""
+Microbenchmark of the evaluation of the beam profiles.
+
+Evaluates the Gaussian and the error function beam of 'gauss.cfg' and
+'erf.cfg' directly and from lookup tables (see beam.tabulate()) on 1e6
+random points within [XMIN, XMAX] and prints the time per evaluation
+(best of REPEAT) and the maximum error of the tables relative to the
+maximum of the beam.
+
+Usage:
+    python benchmark_beam.py [points of the table ...]
+"""
+
+import os, sys
+from timeit import repeat
+
+filedir = os.path.dirname(__file__)
+codedir = os.path.join(filedir, '..', '..')
+sys.path.insert(0, codedir)
+
+import numpy as np
+import minitopsim.parameters as par
+import minitopsim.beam as beam
+
+POINTS = 10**6
+REPEAT = 5
+TABLE_POINTS = [1001, 10001, 100001]
+
+
+def benchmark(cfg_file, table_points):
+    """
+    Benchmarks one beam directly and from lookup tables.
+
+    Parameters:
+        cfg_file (str): The .cfg file of the beam.
+        table_points (list(int)): The numbers of points of the tables.
+    """
+    par.load_parameters(os.path.join(filedir, cfg_file))
+    par.BEAM_TABLE_POINTS = 0
+    beam.init()
+    profile = beam.get_beam()
+    x = np.random.default_rng(0).uniform(par.XMIN, par.XMAX, POINTS)
+    direct = profile(x)
+    maximum = profile.find_maxima().fun
+
+    time = min(repeat(lambda: profile(x), number=1, repeat=REPEAT))
+    print(f'{par.BEAM_TYPE:>15}  {"direct":>13}  {time*1e3:8.2f} ms')
+    for points in table_points:
+        t_table = min(repeat(lambda: profile.tabulate(par.XMIN, par.XMAX,
+                                                      points),
+                             number=1, repeat=REPEAT))
+        table = profile.tabulate(par.XMIN, par.XMAX, points)
+        time_table = min(repeat(lambda: table(x), number=1, repeat=REPEAT))
+        error = np.max(np.abs(table(x) - direct)) / maximum
+        print(f'{"":>15}  {points:>7} table  {time_table*1e3:8.2f} ms  '
+              f'(x{time/time_table:.1f}, setup {t_table*1e3:.2f} ms, '
+              f'max. error {error:.1e})')
+
+
+if __name__ == '__main__':
+    table_points = [int(arg) for arg in sys.argv[1:]] or TABLE_POINTS
+    print(f'Evaluation of {POINTS} points, best of {REPEAT}:')
+    for cfg_file in ('gauss.cfg', 'erf.cfg'):
+        benchmark(cfg_file, table_points)
@@ -4,10 +4,14 @@ import math
 filedir = os.path.dirname(__file__)
 codedir = os.path.join(filedir, '..', '..')
 sys.path.insert(0, codedir)
+import contextvars
+import numpy as np
 from minitopsim.main import minitopsim
 import minitopsim.parameters as par
 import minitopsim.beam as beam
-from numpy.testing import assert_almost_equal
+import minitopsim.advance as adv
+from minitopsim.surface import Surface
+from numpy.testing import assert_almost_equal, assert_allclose
 
 @pytest.fixture
 def set_gauss_beam():
@@ -112,3 +116,72 @@ def test_erf_beam_arbitrary_point(set_erf_beam):
     arbitrary_point = 500
     F_erf = set_erf_beam(arbitrary_point) / 10**exponent
     assert_almost_equal(F_analytic, F_erf, decimal=9)
+
+#test should pass
+def test_flux_cache(set_erf_beam):
+    """
+    Test that the flux cache only recalculates points moved beyond the
+    tolerance.
+
+    Parameters:
+    set_erf_beam (fixture): The error function beam fixture to test.
+    """
+    x = np.linspace(-800., 800., 161)
+    cache = beam.FluxCache(set_erf_beam, tolerance=0.5)
+    assert_allclose(cache.flux(x), set_erf_beam(x))
+
+    x_moved = x.copy()
+    x_moved[10] += 0.2
+    x_moved[[20, 21]] += 1.
+    flux = cache.flux(x_moved)
+    cache.flux(x_moved)
+
+    assert (cache.hits, cache.misses, cache.updates) == (1, 1, 1)
+    assert cache.updated_nodes == 2
+    assert flux[10] == set_erf_beam(x[10])
+    assert_allclose(flux[[20, 21]], set_erf_beam(x_moved[[20, 21]]))
+
+#test should pass
+def test_beam_profile_velocity():
+    """
+    Test that the sputter velocity of a flat surface follows the profile
+    of a Gaussian beam.
+    """
+    config = par.defaults().replace(TOTAL_TIME=1., ETCHING=False,
+                                    BEAM_TYPE='Gaussian', FWHM=50.)
+    surface = Surface(np.linspace(-200., 200., 81), np.zeros(81))
+
+    def velocity():
+        par.activate(config)
+        beam.init()
+        return adv.get_velocities(surface), beam.get_beam()(surface.x)
+
+    v, flux = contextvars.Context().run(velocity)
+
+    assert_allclose(v[0], 0., atol=1e-12)
+    assert np.all(v[1] < 0)
+    assert_allclose(v[1] / flux, v[1][40] / flux[40])
+
+#test should pass
+@pytest.mark.parametrize('set_beam', ['set_gauss_beam', 'set_erf_beam'])
+def test_tabulated_beam(set_beam, request):
+    """
+    Test the tabulated beam against the direct evaluation of the profile.
+
+    Inside the table, the linear interpolation is accurate to 1e-4 of the
+    maximum for 4001 points, outside the profile is evaluated.
+
+    Parameters:
+    set_beam (str): The name of the beam fixture to test.
+    """
+    profile = request.getfixturevalue(set_beam)
+    table = profile.tabulate(-800., 800., 4001)
+    x = np.linspace(-1000., 1000., 10001)
+    maximum = profile.find_maxima(0)
+
+    assert_allclose(table(x), profile(x), rtol=0,
+                    atol=1e-4 * maximum.fun)
+    assert table(x[0]) == profile(x[0])
+    assert_allclose(table(100.), profile(100.), rtol=1e-4)
+    assert table.find_maxima(0).fun == maximum.fun
+    assert profile(maximum.x) == maximum.fun
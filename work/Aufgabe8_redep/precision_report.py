@@ -0,0 +1,102 @@
+"""
+Accuracy report of the view factor precisions (VIEW_FACTOR_PRECISION).
+
+Runs the redeposition cases 'yamamura_interp_redep.cfg' and
+'yamamura_interp_redep_1.cfg' with the precisions 'double', 'single' and
+'mixed' and prints the run time, the maximum difference of the final
+surface to the run with 'double', and the maximum relative difference of
+the redeposition flux on the initial surface.
+
+Usage:
+    python precision_report.py [DELTA_X ...]
+"""
+
+import contextvars
+import os, sys
+import tempfile
+from time import perf_counter
+
+filedir = os.path.dirname(__file__)
+codedir = os.path.join(filedir, '..', '..')
+sys.path.insert(0, codedir)
+
+import numpy as np
+import minitopsim.parameters as par
+import minitopsim.redeposition as redep
+import minitopsim.sputtering as sput
+from minitopsim.beam import e
+from minitopsim.simulation import Simulation
+from work.Aufgabe9_initial.init_surface import init_surface
+
+CFG_FILES = ['yamamura_interp_redep.cfg', 'yamamura_interp_redep_1.cfg']
+PRECISIONS = ['double', 'single', 'mixed']
+
+
+def initial_flux(config):
+    """
+    Calculates the redeposition flux on the initial surface.
+
+    Parameters:
+        config (Config): The parameters.
+
+    Returns:
+        array(float): The redeposition flux at the points.
+    """
+    par.activate(config)
+    redep.init()
+    surface = init_surface()
+    cos_theta = -surface.normal_vector()[1]
+    F_sput = (par.BEAM_CURRENT_DENSITY / e * cos_theta *
+              sput.get_sputter_yield(cos_theta))
+    return redep.get_redep_flux(surface, F_sput)
+
+
+def report(cfg_file, delta_x, directory):
+    """
+    Runs one case with all precisions and prints the differences.
+
+    Parameters:
+        cfg_file (str): The .cfg file of the case.
+        delta_x (float): The distance of the points (None: from the
+            .cfg file).
+        directory (str): Directory for the output files.
+    """
+    config = par.read_config(os.path.join(filedir, cfg_file)).replace(
+        PLOT_SURFACE=False)
+    if delta_x is not None:
+        config = config.replace(DELTA_X=delta_x)
+    print(f'{cfg_file} (DELTA_X = {config.DELTA_X}):')
+
+    results = dict()
+    for precision in PRECISIONS:
+        run_config = config.replace(VIEW_FACTOR_PRECISION=precision)
+        flux = contextvars.Context().run(initial_flux, run_config)
+        with open(os.devnull, 'w') as log:
+            simulation = Simulation(run_config,
+                                    os.path.join(directory, precision),
+                                    log=log)
+            t_start = perf_counter()
+            simulation.run()
+            time = perf_counter() - t_start
+        results[precision] = (simulation.surface, flux, time)
+
+    surface, flux, time = results['double']
+    print(f'  {"double":>6}  {time:7.3f} s  {surface.x.size:>6} points')
+    for precision in PRECISIONS[1:]:
+        other, other_flux, other_time = results[precision]
+        if other.x.size != surface.x.size:
+            difference = 'number of points differs'
+        else:
+            difference = (f'max. |dy| {np.max(np.abs(other.y - surface.y)):.1e}'
+                          f' nm')
+        flux_error = np.max(np.abs(other_flux - flux)) / np.max(np.abs(flux))
+        print(f'  {precision:>6}  {other_time:7.3f} s  {difference}, '
+              f'flux rel. error {flux_error:.1e} (x{time/other_time:.2f})')
+
+
+if __name__ == '__main__':
+    deltas = [float(arg) for arg in sys.argv[1:]] or [None]
+    with tempfile.TemporaryDirectory() as directory:
+        for delta_x in deltas:
+            for cfg_file in CFG_FILES:
+                report(cfg_file, delta_x, directory)
@@ -3,14 +3,13 @@ Template for testing miniTopSim using pytest.
 
 """
 import pytest
-import sys
 import os
 from minitopsim.main import minitopsim
 import minitopsim.parameters as par
 
 def test_run(set_config):
     """Test running miniTopSim."""
-    success = minitopsim()
+    success = minitopsim(set_config)
     assert success, 'Error during executing miniTopSim.'
     
 def test_redep_1_surface_data():
@@ -30,5 +29,6 @@ def test_redep_1_surface_data():
 
 @pytest.fixture()
 def set_config():
-    # append config-file for test surface
-    sys.argv.append('yamamura_interp_redep_1.cfg')
+    # config-file for test surface, independent of the working directory
+    return os.path.join(os.path.dirname(__file__),
+                        'yamamura_interp_redep_1.cfg')
@@ -0,0 +1,163 @@
+"""
+Test cases for the view factor and the redeposition flux.
+
+tests:
+    view_factor_reciprocity:
+        tests f_ij * l_i == f_ji * l_j
+    redep_flux_blocks:
+        tests the blocked redeposition flux against the full matrix
+    visibility:
+        tests the line of sight check against testing all segments
+    view_factor_cache:
+        tests the update of the cached view factor matrix
+    precision:
+        tests the float32 view factor and redeposition flux
+
+fixtures:
+    set_surface:
+        init a cosine shaped trench
+"""
+import contextvars
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+import minitopsim.parameters as par
+import minitopsim.surface as srf
+import minitopsim.redeposition as redep
+import minitopsim.visibility as vis
+
+
+@pytest.fixture
+def set_surface():
+    """
+    initiate a cosine shaped trench with 101 points.
+    """
+    x = np.linspace(-50., 50., 101)
+    y = -50. * (1 + np.cos(2 * np.pi * x / 100.))
+    surface = srf.Surface(x, y)
+    return surface
+
+
+@pytest.mark.unittest
+def test_view_factor_reciprocity(set_surface):
+    """
+    test the reciprocity of the view factor matrix
+
+    Args:
+        set_surface(fixture): to init a surface
+    """
+    f = set_surface.view_factor()
+    lengths = set_surface.node_lengths()
+
+    assert np.all(np.diag(f) == 0)
+    assert_allclose(f * lengths[:, np.newaxis],
+                    (f * lengths[:, np.newaxis]).T, atol=1e-15)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('memory', [1e-3, 0.05, 64.])
+def test_redep_flux_blocks(monkeypatch, set_surface, memory):
+    """
+    test that the redeposition flux does not depend on the block size
+
+    Args:
+        monkeypatch(fixture): to set VIEW_FACTOR_MEMORY
+        set_surface(fixture): to init a surface
+        memory(float): memory for the view factor blocks (MB)
+    """
+    monkeypatch.setattr(par, 'VIEW_FACTOR_MEMORY', memory)
+    F_sput = np.linspace(1., 2., set_surface.x.size)
+
+    F_redep = redep.get_redep_flux(set_surface, F_sput)
+
+    assert_allclose(F_redep, set_surface.view_factor() @ F_sput,
+                    rtol=1e-12)
+
+
+@pytest.mark.unittest
+def test_visibility():
+    """
+    test the view factor with line of sight check for two trenches
+
+    Points in different trenches can face each other but cannot see
+    each other. The result is compared to testing each line of sight
+    against all segments.
+    """
+    x = np.linspace(-50., 50., 101)
+    y = -30. * (1 - np.cos(4 * np.pi * x / 100.))
+    surface = srf.Surface(x, y)
+
+    f = surface.view_factor()
+    f_visible = surface.view_factor(visibility=True)
+
+    # reference: check all segments for all pairs facing each other
+    i, j = np.nonzero(f)
+    segments = np.arange(x.size - 1)
+    blocked = [np.any(vis._lines_cross(x[a], y[a], x[b], y[b],
+                                       x[segments], y[segments],
+                                       x[segments+1], y[segments+1]))
+               for a, b in zip(i, j)]
+    f_ref = np.copy(f)
+    f_ref[i[blocked], j[blocked]] = 0
+
+    assert np.any(blocked)
+    assert_allclose(f_visible, f_ref)
+
+
+@pytest.mark.unittest
+def test_view_factor_cache(set_surface):
+    """
+    test that the cache recalculates the rows/columns of moved points
+
+    Args:
+        set_surface(fixture): to init a surface
+    """
+    cache = redep.ViewFactorCache(tolerance=0.)
+    cache.view_factor(set_surface)
+    cache.view_factor(set_surface)
+
+    y = np.copy(set_surface.y)
+    y[[10, 50, 51]] += 0.5
+    surface = srf.Surface(set_surface.x, y)
+    f = cache.view_factor(surface)
+
+    assert (cache.hits, cache.misses, cache.updates) == (1, 1, 1)
+    assert cache.updated_nodes == 7
+    assert_allclose(f, surface.view_factor())
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('precision', ['single', 'mixed'])
+@pytest.mark.parametrize('cache', [False, True])
+def test_precision(monkeypatch, set_surface, precision, cache):
+    """
+    test the float32 redeposition flux against float64
+
+    Args:
+        monkeypatch(fixture): to set the parameters
+        set_surface(fixture): to init a surface
+        precision(str): the VIEW_FACTOR_PRECISION to test
+        cache(bool): use a view factor cache
+    """
+    monkeypatch.setattr(par, 'VIEW_FACTOR_PRECISION', precision)
+    monkeypatch.setattr(par, 'VIEW_FACTOR_MEMORY', 0.05)
+    monkeypatch.setattr(par, 'VIEW_FACTOR_CACHE', cache)
+    # far from the origin, so float32 positions would lose digits
+    surface = srf.Surface(set_surface.x + 1e5, set_surface.y)
+    F_sput = np.linspace(1., 2., surface.x.size) * 1e16
+    f = surface.view_factor()
+
+    def redep_flux():
+        # the cache of redep.init() stays in this context
+        redep.init()
+        return redep.get_redep_flux(surface, F_sput)
+
+    f_single = surface.view_factor(dtype=np.float32)
+    F_redep = contextvars.copy_context().run(redep_flux)
+
+    assert f_single.dtype == np.float32
+    assert_allclose(f_single, f, rtol=1e-5, atol=1e-7 * f.max())
+    assert F_redep.dtype == np.float64
+    assert_allclose(F_redep, f @ F_sput, rtol=1e-5)
@@ -5,7 +5,7 @@ Module that initializes the surface depending on the specified dtructure in the
 """
 import minitopsim.parameters as par
 from minitopsim.surface import Surface
-from minitopsim.io_surface import read_surface
+from minitopsim.io_surface import open_trajectory
 
 import numpy as np
 
@@ -53,12 +53,9 @@ def init_surface():
     
     # Case: File surface (read from a file)
     elif par.INITIAL_SURFACE_TYPE == 'File':
-        with open(par.INITIAL_SURFACE_FILE) as file:
-            temp = 1
-            while temp is not None:
-                srf, temp = read_surface(file) # extract only last surface
-                if srf is not None:
-                    surface = srf
+        # .srf or binary trajectory file, only the last surface is read
+        with open_trajectory(par.INITIAL_SURFACE_FILE) as reader:
+            surface, _ = reader[-1]
         return surface
     
     # Case: Invalid surface type